@@ -0,0 +1,303 @@
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from hashlib import sha256
+from pathlib import Path
+
+import click
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+SERVICES = {
+    'shorturl': ROOT / 'services' / 'shorturl',
+    'todo': ROOT / 'services' / 'todo',
+}
+
+
+# Сценарии: список (операция, вес). Операции реализованы в классах нагрузки ниже
+SCENARIOS = {
+    'redirect-heavy': ('shorturl', [('redirect', 93), ('redirect_unknown', 3), ('shorten', 2), ('stats', 2)]),
+    'shorten-heavy': ('shorturl', [('shorten', 70), ('shorten_batch', 10), ('redirect', 20)]),
+    'todo-crud': ('todo', [('create', 25), ('get', 30), ('update', 25), ('delete', 10), ('list', 10)]),
+    'todo-list': ('todo', [('list', 90), ('get', 10)]),
+}
+
+
+def seed_shorturl(db_path: Path, rows: int) -> dict:
+    now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+    short_ids = [f'bm{i:07d}' for i in range(rows)]
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            'INSERT INTO short_urls (short_id, full_url, url_hash, created_at) VALUES (?, ?, ?, ?)',
+            (
+                (short_id, url, sha256(url.encode()).hexdigest(), now)
+                for short_id, url in ((short_id, f'https://example.com/{short_id}') for short_id in short_ids)
+            ),
+        )
+    return {'short_ids': short_ids}
+
+
+def seed_todo(db_path: Path, rows: int) -> dict:
+    now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat(sep=' ')
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            'INSERT INTO todo_items (title, description, completed, created_at, updated_at) VALUES (?, ?, ?, ?, ?)',
+            ((f'Task {i}', f'Description {i}', i % 3 == 0, now, now) for i in range(rows)),
+        )
+    return {'item_ids': list(range(1, rows + 1))}
+
+
+SEEDERS = {'shorturl': seed_shorturl, 'todo': seed_todo}
+
+
+class ShortUrlLoad:
+    def __init__(self, seed: dict):
+        self.short_ids = seed['short_ids']
+
+    async def redirect(self, client: httpx.AsyncClient):
+        return await client.get(f'/{random.choice(self.short_ids)}')
+
+    async def redirect_unknown(self, client: httpx.AsyncClient):
+        return await client.get(f'/zz{random.getrandbits(40):x}')
+
+    async def stats(self, client: httpx.AsyncClient):
+        return await client.get(f'/stats/{random.choice(self.short_ids)}')
+
+    async def shorten(self, client: httpx.AsyncClient):
+        return await client.post('/shorten', json={'url': f'https://example.org/{random.getrandbits(64):x}'})
+
+    async def shorten_batch(self, client: httpx.AsyncClient):
+        urls = [f'https://example.org/{random.getrandbits(64):x}' for _ in range(50)]
+        return await client.post('/shorten/batch', json={'urls': urls})
+
+
+class TodoLoad:
+    def __init__(self, seed: dict):
+        self.item_ids = seed['item_ids']
+
+    async def create(self, client: httpx.AsyncClient):
+        response = await client.post('/api/todo', json={'title': 'Benchmark task', 'description': 'Created by benchmark'})
+        if response.status_code == 201:
+            self.item_ids.append(response.json()['id'])
+        return response
+
+    async def get(self, client: httpx.AsyncClient):
+        return await client.get(f'/api/todo/{random.choice(self.item_ids)}')
+
+    async def update(self, client: httpx.AsyncClient):
+        return await client.put(f'/api/todo/{random.choice(self.item_ids)}', json={'completed': random.random() < 0.5})
+
+    async def delete(self, client: httpx.AsyncClient):
+        if len(self.item_ids) < 2:
+            return await self.get(client)
+        item_id = self.item_ids.pop(random.randrange(len(self.item_ids)))
+        return await client.delete(f'/api/todo/{item_id}')
+
+    async def list(self, client: httpx.AsyncClient):
+        return await client.get('/api/todo')
+
+
+LOADS = {'shorturl': ShortUrlLoad, 'todo': TodoLoad}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def service_env(db_path: Path, extra_env: dict) -> dict:
+    return {**os.environ, 'DATABASE_URL': f'sqlite:///{db_path}', **extra_env}
+
+
+def migrate_service(service: str, db_path: Path, extra_env: dict) -> None:
+    subprocess.run(
+        [sys.executable, '-c', 'import os, startup; startup.migrate(os.environ["DATABASE_URL"])'],
+        cwd=SERVICES[service], env=service_env(db_path, extra_env), check=True,
+    )
+
+
+def start_service(service: str, db_path: Path, port: int, workers: int, extra_env: dict) -> subprocess.Popen:
+    return subprocess.Popen(
+        [
+            sys.executable, 'main.py',
+            '--host', '127.0.0.1', '--port', str(port),
+            '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+        ],
+        cwd=SERVICES[service], env=service_env(db_path, extra_env),
+    )
+
+
+async def wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get('/openapi.json')).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f'Service at {base_url} did not start in {timeout}s')
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, statuses: dict, duration: float) -> dict:
+    latencies = sorted(latencies)
+    total = len(latencies)
+    errors = statuses.get('5xx', 0) + statuses.get('transport', 0)
+    return {
+        'requests': total,
+        'throughput_rps': round(total / duration, 1) if duration else 0.0,
+        'error_rate': round(errors / total, 4) if total else 0.0,
+        'statuses': dict(statuses),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 3),
+            'p95': round(percentile(latencies, 0.95) * 1000, 3),
+            'p99': round(percentile(latencies, 0.99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+    }
+
+
+async def drive(base_url: str, load, mix: list, concurrency: int, duration: float, warmup: float) -> dict:
+    operations = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    latencies = defaultdict(list)
+    statuses = defaultdict(lambda: defaultdict(int))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        started = time.monotonic()
+        measure_from = started + warmup
+        deadline = measure_from + duration
+
+        async def worker():
+            while (now := time.monotonic()) < deadline:
+                name = random.choices(operations, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await getattr(load, name)(client)
+                    status = f'{response.status_code // 100}xx'
+                except httpx.TransportError:
+                    status = 'transport'
+                elapsed = time.perf_counter() - start
+                if now >= measure_from:
+                    latencies[name].append(elapsed)
+                    statuses[name][status] += 1
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    all_statuses = defaultdict(int)
+    for per_operation in statuses.values():
+        for status, count in per_operation.items():
+            all_statuses[status] += count
+    return {
+        **summarize(all_latencies, all_statuses, duration),
+        'operations': {name: summarize(latencies[name], statuses[name], duration) for name in operations},
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    click.echo(f'\n{"scenario":<16}{"rps":>12}{"base rps":>12}{"delta":>9}{"p99 ms":>11}{"base p99":>11}{"delta":>9}')
+    for name, current in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        rps_delta = (current['throughput_rps'] / previous['throughput_rps'] - 1) if previous['throughput_rps'] else 0
+        p99, base_p99 = current['latency_ms']['p99'], previous['latency_ms']['p99']
+        p99_delta = (p99 / base_p99 - 1) if base_p99 else 0
+        click.echo(
+            f'{name:<16}{current["throughput_rps"]:>12}{previous["throughput_rps"]:>12}{rps_delta:>+9.1%}'
+            f'{p99:>11}{base_p99:>11}{p99_delta:>+9.1%}'
+        )
+        if rps_delta < -tolerance or p99_delta > tolerance:
+            regressions.append(name)
+    return regressions
+
+
+@click.command()
+@click.option('--scenario', 'scenarios', multiple=True, type=click.Choice(sorted(SCENARIOS)),
+              help='Scenario to run (repeatable). Defaults to all scenarios.')
+@click.option('--duration', default=10.0, show_default=True, help='Measured seconds per scenario.')
+@click.option('--warmup', default=2.0, show_default=True, help='Unmeasured warmup seconds per scenario.')
+@click.option('--concurrency', default=32, show_default=True, help='Concurrent client connections.')
+@click.option('--seed-rows', default=10000, show_default=True, help='Rows seeded into the database before the run.')
+@click.option('--workers', default=1, show_default=True, help='Service worker processes.')
+@click.option('--env', 'env_vars', multiple=True, metavar='KEY=VALUE', help='Extra environment for the service.')
+@click.option('--output', type=click.Path(dir_okay=False), default='benchmark-results.json', show_default=True)
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Previous results to compare with.')
+@click.option('--tolerance', default=0.1, show_default=True,
+              help='Allowed relative drop in throughput / growth in p99 before a scenario counts as a regression.')
+def main(scenarios, duration, warmup, concurrency, seed_rows, workers, env_vars, output, baseline, tolerance):
+    extra_env = dict(item.split('=', 1) for item in env_vars)
+    random.seed(42)
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'duration': duration, 'warmup': warmup, 'concurrency': concurrency,
+            'seed_rows': seed_rows, 'workers': workers, 'env': extra_env,
+        },
+        'scenarios': {},
+    }
+
+    for name in scenarios or sorted(SCENARIOS):
+        service, mix = SCENARIOS[name]
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = Path(tmp) / f'{service}.db'
+            # БД заполняется до запуска: фильтр Блума, общая таблица редиректов и пул
+            # идентификаторов строятся при старте и должны видеть все строки
+            migrate_service(service, db_path, extra_env)
+            seed = SEEDERS[service](db_path, seed_rows)
+            port = free_port()
+            process = start_service(service, db_path, port, workers, extra_env)
+            try:
+                base_url = f'http://127.0.0.1:{port}'
+                asyncio.run(wait_ready(base_url))
+                click.echo(f'Running {name} against {service} ({duration}s, {concurrency} connections)...')
+                result = asyncio.run(drive(base_url, LOADS[service](seed), mix, concurrency, duration, warmup))
+            finally:
+                process.terminate()
+                process.wait(timeout=30)
+        results['scenarios'][name] = result
+        click.echo(
+            f'  {result["throughput_rps"]} req/s, p50 {result["latency_ms"]["p50"]} ms, '
+            f'p95 {result["latency_ms"]["p95"]} ms, p99 {result["latency_ms"]["p99"]} ms, '
+            f'errors {result["error_rate"]:.2%}'
+        )
+
+    Path(output).write_text(json.dumps(results, indent=2))
+    click.echo(f'Results written to {output}')
+
+    if baseline:
+        regressions = compare(results, json.loads(Path(baseline).read_text()), tolerance)
+        if regressions:
+            click.echo(f'Regressions beyond {tolerance:.0%}: {", ".join(regressions)}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
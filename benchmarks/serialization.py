@@ -0,0 +1,103 @@
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List
+
+import click
+from fastapi import FastAPI
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / 'services' / 'todo'))
+
+from app.models import TodoItem  # noqa: E402
+from app.responses import FastSerializer  # noqa: E402
+from app.schemas import TodoItemResponse  # noqa: E402
+
+
+def make_items(count: int) -> list:
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return [
+        TodoItem(id=i, title=f'Task {i}', description=f'Description {i}', completed=i % 3 == 0,
+                 created_at=now, updated_at=now, version=1)
+        for i in range(1, count + 1)
+    ]
+
+
+def make_app(items: list) -> FastAPI:
+    # Те же маршруты, что GET /api/todo: ORM-объекты через response_model и быстрый путь
+    app = FastAPI()
+    serializer = FastSerializer(TodoItemResponse, enabled=True)
+
+    @app.get('/validated', response_model=List[TodoItemResponse])
+    async def validated():
+        return items
+
+    @app.get('/fast', response_model=List[TodoItemResponse])
+    async def fast():
+        return serializer.many(items)
+
+    return app
+
+
+async def call(app: FastAPI, path: str) -> bytes:
+    # ASGI-вызов без сети: измеряется только обработка запроса и сериализация
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+        'headers': [], 'client': ('127.0.0.1', 1), 'server': ('127.0.0.1', 80),
+    }
+    body = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        if message['type'] == 'http.response.body':
+            body.append(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return b''.join(body)
+
+
+async def measure(app: FastAPI, path: str, repeat: int) -> float:
+    await call(app, path)
+    start = time.process_time()
+    for _ in range(repeat):
+        await call(app, path)
+    return (time.process_time() - start) / repeat
+
+
+@click.command()
+@click.option('--items', 'sizes', multiple=True, type=int, default=(10, 100, 1000), show_default=True,
+              help='Items per response; repeat for several sizes.')
+@click.option('--repeat', default=200, show_default=True, help='Requests per measurement.')
+@click.option('--output', type=click.Path(dir_okay=False), help='Write results as JSON.')
+def main(sizes, repeat, output):
+    """Measure CPU per item of list responses: response_model validation vs the orjson fast path."""
+    results = {}
+    for size in sizes:
+        app = make_app(make_items(size))
+        assert asyncio.run(call(app, '/fast')) == asyncio.run(call(app, '/validated'))
+        validated = asyncio.run(measure(app, '/validated', repeat))
+        fast = asyncio.run(measure(app, '/fast', repeat))
+        results[size] = {
+            'validated_us_per_item': round(validated / size * 1e6, 2),
+            'fast_us_per_item': round(fast / size * 1e6, 2),
+            'saved_us_per_item': round((validated - fast) / size * 1e6, 2),
+            'speedup': round(validated / fast, 2) if fast else None,
+        }
+        click.echo(
+            f'{size:>6} items: validated {results[size]["validated_us_per_item"]} us/item, '
+            f'fast {results[size]["fast_us_per_item"]} us/item, '
+            f'saved {results[size]["saved_us_per_item"]} us/item (x{results[size]["speedup"]})'
+        )
+
+    if output:
+        Path(output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
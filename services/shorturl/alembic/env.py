@@ -5,7 +5,7 @@ from alembic import context
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
-from app.models import AbstractModel, ShortUrl  # noqa
+from app.models import AbstractModel, ShortUrl, ShortUrlClicks, IdSequence  # noqa
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,31 @@
+"""id sequences
+
+Revision ID: 002_id_sequences
+Revises: 001_initial
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "002_id_sequences"
+down_revision: Union[str, Sequence[str], None] = "001_initial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    id_sequences = op.create_table(
+        'id_sequences',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('next_hi', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.bulk_insert(id_sequences, [{'name': 'short_urls', 'next_hi': 0}])
+
+
+def downgrade() -> None:
+    op.drop_table('id_sequences')
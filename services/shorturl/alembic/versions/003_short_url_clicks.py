@@ -0,0 +1,31 @@
+"""short url clicks
+
+Revision ID: 003_short_url_clicks
+Revises: 002_id_sequences
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "003_short_url_clicks"
+down_revision: Union[str, Sequence[str], None] = "002_id_sequences"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'short_url_clicks',
+        sa.Column('short_id', sa.String(length=20), nullable=False),
+        sa.Column('clicks', sa.BigInteger(), nullable=False, server_default='0'),
+        sa.Column('last_accessed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('short_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('short_url_clicks')
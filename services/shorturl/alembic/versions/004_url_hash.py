@@ -0,0 +1,58 @@
+"""url hash
+
+Revision ID: 004_url_hash
+Revises: 003_short_url_clicks
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+import hashlib
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "004_url_hash"
+down_revision: Union[str, Sequence[str], None] = "003_short_url_clicks"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('short_urls') as batch_op:
+        batch_op.add_column(sa.Column('url_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_short_urls_url_hash'), 'short_urls', ['url_hash'], unique=False)
+
+    # Заполняем хеши существующих строк пачками по первичному ключу
+    short_urls = sa.table(
+        'short_urls',
+        sa.column('id', sa.Integer),
+        sa.column('full_url', sa.String),
+        sa.column('url_hash', sa.String),
+    )
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(short_urls.c.id, short_urls.c.full_url)
+            .where(short_urls.c.id > last_id)
+            .order_by(short_urls.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            short_urls.update()
+            .where(short_urls.c.id == sa.bindparam('row_id'))
+            .values(url_hash=sa.bindparam('digest')),
+            [{'row_id': row_id, 'digest': hashlib.sha256(full_url.encode()).hexdigest()} for row_id, full_url in rows],
+        )
+        last_id = rows[-1][0]
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_short_urls_url_hash'), table_name='short_urls')
+    with op.batch_alter_table('short_urls') as batch_op:
+        batch_op.drop_column('url_hash')
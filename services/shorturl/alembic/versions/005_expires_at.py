@@ -0,0 +1,29 @@
+"""expires at
+
+Revision ID: 005_expires_at
+Revises: 004_url_hash
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "005_expires_at"
+down_revision: Union[str, Sequence[str], None] = "004_url_hash"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table('short_urls') as batch_op:
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_short_urls_expires_at'), 'short_urls', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_short_urls_expires_at'), table_name='short_urls')
+    with op.batch_alter_table('short_urls') as batch_op:
+        batch_op.drop_column('expires_at')
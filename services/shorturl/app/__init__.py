@@ -1,39 +1,139 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
-from typing import Generator
+from functools import partial
+from typing import AsyncGenerator, Optional
 
 from fastapi import FastAPI
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 
+from app.metrics import METRICS_ENABLED, instrument_engine
 from app.models import AbstractModel
 
 database_url = os.getenv('DATABASE_URL', 'sqlite:////app/data/shorturl.db')
 
-engine = create_engine(
-    database_url,
-    echo=False,
-    connect_args={'check_same_thread': False} if 'sqlite' in database_url else {}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+DB_READ_POOL_SIZE = int(os.getenv('DB_READ_POOL_SIZE', 4))
+DB_WRITE_POOL_SIZE = int(os.getenv('DB_WRITE_POOL_SIZE', 1))
+SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+SQLITE_CACHE_SIZE = int(os.getenv('SQLITE_CACHE_SIZE', -64 * 1024))  # отрицательное значение - в KiB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
 
 
-def get_db() -> Generator[Session, None, None]:
+def to_async_url(url: str) -> str:
+    # Alembic работает с синхронным URL, приложению нужен async-драйвер
+    parsed = make_url(url)
+    if parsed.drivername == 'sqlite':
+        parsed = parsed.set(drivername='sqlite+aiosqlite')
+    return parsed.render_as_string(hide_password=False)
+
+
+def set_sqlite_pragmas(dbapi_connection, _connection_record, read_only: bool) -> None:
+    cursor = dbapi_connection.cursor()
+    if not read_only:
+        cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA synchronous={SQLITE_SYNCHRONOUS}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+    cursor.execute(f'PRAGMA cache_size={SQLITE_CACHE_SIZE}')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    if read_only:
+        cursor.execute('PRAGMA query_only=ON')
+    cursor.close()
+
+
+def build_engine(url: str, pool_size: int, read_only: bool) -> AsyncEngine:
+    parsed = make_url(url)
+    options = {}
+    if parsed.get_backend_name() != 'sqlite' or parsed.database not in (None, '', ':memory:'):
+        options = {'pool_size': pool_size, 'max_overflow': 0}
+    new_engine = create_async_engine(to_async_url(url), echo=False, **options)
+    if new_engine.dialect.name == 'sqlite':
+        event.listen(new_engine.sync_engine, 'connect', partial(set_sqlite_pragmas, read_only=read_only))
+    if METRICS_ENABLED:
+        instrument_engine(new_engine, 'read' if read_only else 'write')
+    return new_engine
+
+
+engine: Optional[AsyncEngine] = None
+read_engine: Optional[AsyncEngine] = None
+SessionLocal: Optional[async_sessionmaker] = None
+ReadSessionLocal: Optional[async_sessionmaker] = None
+
+
+def init_db() -> None:
+    # Движки создаются в lifespan или при первом запросе, то есть в каждом воркере отдельно:
+    # соединения и пулы не наследуются от родительского процесса.
+    # Записи сериализуются через небольшой пул писателя (в SQLite писатель всегда один),
+    # чтения идут через отдельный пул read-only соединений и в WAL не ждут писателя
+    global engine, read_engine, SessionLocal, ReadSessionLocal
+    engine = build_engine(database_url, DB_WRITE_POOL_SIZE, read_only=False)
+    read_engine = build_engine(database_url, DB_READ_POOL_SIZE, read_only=True)
+    SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    ReadSessionLocal = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False)
+
+
+async def close_db() -> None:
+    global engine, read_engine, SessionLocal, ReadSessionLocal
+    for db_engine in (engine, read_engine):
+        if db_engine is not None:
+            await db_engine.dispose()
+    engine = read_engine = SessionLocal = ReadSessionLocal = None
+
+
+async def get_db() -> AsyncGenerator[AsyncSession, None]:
     if SessionLocal is None:
-        raise RuntimeError('Database not initialized. Call create_app() first.')
+        init_db()
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await db.close()
+
+
+async def get_read_db() -> AsyncGenerator[AsyncSession, None]:
+    if ReadSessionLocal is None:
+        init_db()
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
 
 
 def create_app() -> FastAPI:
     @asynccontextmanager
     async def lifespan(_app: FastAPI):
-        # Миграции выполняются через Alembic в entrypoint.sh
+        # Миграции применяет main.py --migrate до запуска воркеров
+        from app.bloom import short_id_filter
+        from app.clicks import click_aggregator
+        from app.expiry import expiry_purger
+        from app.shared_table import SERVER_INSTANCE_ID, database_identity, redirect_table
+        from app.short_ids import PooledIdStrategy, id_strategy
+
+        init_db()
+        background_tasks = [asyncio.create_task(click_aggregator.run(engine))]
+        if short_id_filter.enabled:
+            background_tasks.append(asyncio.create_task(short_id_filter.run(read_engine)))
+        if expiry_purger.enabled:
+            background_tasks.append(asyncio.create_task(expiry_purger.run(engine)))
+        if redirect_table.enabled:
+            redirect_table.open(database_identity(database_url, SERVER_INSTANCE_ID))
+            background_tasks.append(asyncio.create_task(redirect_table.run(read_engine)))
+        id_pool = id_strategy if isinstance(id_strategy, PooledIdStrategy) else None
+        if id_pool is not None:
+            background_tasks.append(asyncio.create_task(id_pool.run(read_engine)))
         yield
-        engine.dispose()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        short_id_filter.reset()
+        redirect_table.close()
+        if id_pool is not None:
+            id_pool.clear()
+        await close_db()
 
     app = FastAPI(
         title="Short URL Service",
@@ -42,7 +142,37 @@ def create_app() -> FastAPI:
         lifespan=lifespan
     )
 
+    if METRICS_ENABLED:
+        from app.metrics import metrics_endpoint, pool_collector, registry, service_collector
+        # Регистрируется до роутера, иначе GET /metrics перехватит /{short_id}
+        app.add_route('/metrics', metrics_endpoint, methods=['GET'], include_in_schema=False)
+        registry.add_collector('pool', pool_collector(lambda: {'write': engine, 'read': read_engine}))
+        registry.add_collector('service', service_collector)
+
+    from app import admin
     from app.routes import router
+    app.include_router(admin.router)
     app.include_router(router)
 
+    from app.redirects import REDIRECT_FAST_PATH, RedirectFastPath, static_get_paths
+    if REDIRECT_FAST_PATH:
+        app.add_middleware(RedirectFastPath, reserved_paths=static_get_paths(app))
+
+    from app.admission import ADMISSION_ENABLED, AdmissionMiddleware, admission_collector, build_limiters
+    if ADMISSION_ENABLED:
+        # Снаружи быстрого пути: редиректы тоже проходят через бюджет чтений
+        app.state.admission_limiters = build_limiters()
+        app.add_middleware(
+            AdmissionMiddleware,
+            limiters=app.state.admission_limiters,
+            exempt_prefixes=('/metrics', '/admin/'),
+        )
+        if METRICS_ENABLED:
+            registry.add_collector('admission', admission_collector(app.state.admission_limiters))
+
+    if METRICS_ENABLED:
+        from app.metrics import MetricsMiddleware
+        # Добавляется последним, чтобы быть внешним слоем и видеть ответы быстрого пути
+        app.add_middleware(MetricsMiddleware)
+
     return app
@@ -0,0 +1,53 @@
+import os
+import secrets
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import get_db, get_read_db
+from app.transfer import FORMATS, MEDIA_TYPES, export_short_urls, import_short_urls, iter_lines
+
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN', '')
+
+
+def require_admin(request: Request) -> None:
+    # Без ADMIN_TOKEN административные маршруты выключены
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Not Found')
+    scheme, _, token = request.headers.get('authorization', '').partition(' ')
+    if scheme.lower() != 'bearer' or not secrets.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail='Invalid admin token',
+            headers={'WWW-Authenticate': 'Bearer'},
+        )
+
+
+router = APIRouter(prefix='/admin', dependencies=[Depends(require_admin)], include_in_schema=False)
+
+
+@router.get('/export')
+async def export_urls(
+    format: str = Query('ndjson', pattern=f'^({"|".join(FORMATS)})$'),
+    db: AsyncSession = Depends(get_read_db),
+):
+    # Поток читает через собственное соединение движка: сессия зависимости
+    # закрывается раньше, чем будет отдан ответ
+    return StreamingResponse(
+        export_short_urls(db.bind, format),
+        media_type=MEDIA_TYPES[format],
+        headers={'Content-Disposition': f'attachment; filename="short_urls.{format}"'},
+    )
+
+
+@router.post('/import')
+async def import_urls(
+    request: Request,
+    format: str = Query('ndjson', pattern=f'^({"|".join(FORMATS)})$'),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await import_short_urls(db.bind, iter_lines(request.stream()), format)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
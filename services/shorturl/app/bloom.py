@@ -0,0 +1,219 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.models import ShortUrl
+
+BLOOM_FILTER_ENABLED = os.getenv('BLOOM_FILTER_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+BLOOM_FILTER_CAPACITY = int(os.getenv('BLOOM_FILTER_CAPACITY', 1_000_000))
+BLOOM_FILTER_FP_RATE = float(os.getenv('BLOOM_FILTER_FP_RATE', 0.01))
+BLOOM_FILTER_MAX_BYTES = int(os.getenv('BLOOM_FILTER_MAX_BYTES', 16 * 1024 * 1024))
+BLOOM_FILTER_SYNC_INTERVAL = float(os.getenv('BLOOM_FILTER_SYNC_INTERVAL', 5))
+BLOOM_FILTER_GENERATION_PATH = os.getenv('BLOOM_FILTER_GENERATION_PATH', '/dev/shm/shorturl-bloom-generation')
+
+# Сколько последних id перечитывать при синхронизации: на случай вставок,
+# закоммиченных не в порядке выдачи id
+SYNC_OVERLAP = 1000
+LOAD_CHUNK_SIZE = 10000
+# Пауза между внеочередными синхронизациями, чтобы поток вставок не превращал их в непрерывный цикл
+MIN_SYNC_GAP = 0.05
+GENERATION = struct.Struct('<Q')
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, fp_rate: float, max_bytes: int):
+        if capacity <= 0 or not 0 < fp_rate < 1:
+            raise ValueError('Capacity must be positive and false positive rate in (0, 1)')
+        size = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.size = max(8, min(size, max_bytes * 8))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        # Двойное хеширование (Kirsch-Mitzenmacher): k позиций из одного дайджеста
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key: str) -> None:
+        for position in self._positions(key):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+    @property
+    def memory_bytes(self) -> int:
+        return len(self._bits)
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.hash_count * self.count / self.size)) ** self.hash_count
+
+
+class ShortIdFilter:
+    # Пока фильтр не построен, пропускаем все запросы в БД.
+    # Фильтр свой в каждом воркере и догоняет чужие вставки синхронизацией. Чтобы ответ "нет"
+    # не устаревал, воркеры считают вставки в общем файле-счетчике (поколение): если оно выросло
+    # с последней синхронизации, промах фильтра проверяется в БД, а синхронизация запускается сразу
+    def __init__(self, enabled: bool, capacity: int, fp_rate: float, max_bytes: int, sync_interval: float,
+                 generation_path: Optional[str] = None):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.max_bytes = max_bytes
+        self.sync_interval = sync_interval
+        self.generation_path = generation_path
+        self.bloom = None
+        self.ready = False
+        self.rejected = 0
+        self.stale = 0
+        self._last_id = 0
+        self._fd = None
+        self._generation = None
+        self._synced_generation = 0
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def open(self) -> None:
+        fd = os.open(self.generation_path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._fd = fd
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < GENERATION.size:
+                os.ftruncate(fd, GENERATION.size)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._generation = mmap.mmap(fd, GENERATION.size)
+
+    def current_generation(self) -> int:
+        return GENERATION.unpack_from(self._generation)[0] if self._generation is not None else 0
+
+    def might_contain(self, short_id: str) -> bool:
+        if not self.ready:
+            return True
+        if short_id in self.bloom:
+            return True
+        if self.current_generation() != self._synced_generation:
+            # Другой воркер мог создать этот id после нашей синхронизации
+            self.stale += 1
+            if self._wakeup is not None:
+                self._wakeup.set()
+            return True
+        self.rejected += 1
+        return False
+
+    def add(self, short_id: str) -> None:
+        # Вызывается после коммита вставки и до ответа клиенту
+        if self.bloom is not None:
+            self.bloom.add(short_id)
+        if self._generation is None:
+            return
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            generation = self.current_generation()
+            GENERATION.pack_into(self._generation, 0, generation + 1)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        # Своя вставка уже в фильтре: если чужих не было, фильтр остается актуальным
+        if generation == self._synced_generation:
+            self._synced_generation = generation + 1
+
+    def reset(self) -> None:
+        self.bloom = None
+        self.ready = False
+        self.rejected = 0
+        self.stale = 0
+        self._last_id = 0
+        self._synced_generation = 0
+        if self._generation is not None:
+            self._generation.close()
+            self._generation = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    async def _scan(self, engine: AsyncEngine, after_id: int) -> None:
+        # Читаются только id и short_id: SQLite отдает их из индекса ix_short_urls_short_id
+        async with engine.connect() as conn:
+            result = await conn.stream(
+                select(ShortUrl.id, ShortUrl.short_id)
+                .where(ShortUrl.id > after_id)
+                .execution_options(yield_per=LOAD_CHUNK_SIZE)
+            )
+            async for partition in result.partitions():
+                for row_id, short_id in partition:
+                    if short_id not in self.bloom:
+                        self.bloom.add(short_id)
+                    if row_id > self._last_id:
+                        self._last_id = row_id
+
+    async def load(self, engine: AsyncEngine) -> None:
+        self.bloom = BloomFilter(self.capacity, self.fp_rate, self.max_bytes)
+        self._last_id = 0
+        # Поколение читается до чтения строк: вставки, учтенные в нем, уже закоммичены
+        generation = self.current_generation()
+        await self._scan(engine, 0)
+        self._synced_generation = generation
+        self.ready = True
+        logger.info(
+            'Short ID filter loaded: %d ids, %d bytes, estimated false positive rate %.4f',
+            self.bloom.count, self.bloom.memory_bytes, self.bloom.estimated_fp_rate(),
+        )
+
+    async def sync(self, engine: AsyncEngine) -> None:
+        # Подтягиваем id, созданные другими процессами
+        generation = self.current_generation()
+        await self._scan(engine, max(0, self._last_id - SYNC_OVERLAP))
+        # Свои вставки во время чтения могли сдвинуть отметку дальше
+        self._synced_generation = max(self._synced_generation, generation)
+
+    async def run(self, engine: AsyncEngine) -> None:
+        if self.generation_path:
+            try:
+                self.open()
+            except OSError:
+                logger.warning(
+                    'Cannot open %s: short IDs created by other workers may be rejected until the next sync',
+                    self.generation_path, exc_info=True,
+                )
+        # Event создается здесь: он привязан к циклу событий, в котором ждет
+        self._wakeup = asyncio.Event()
+        try:
+            await self.load(engine)
+            while True:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.sync_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.sync(engine)
+                except Exception:
+                    logger.exception('Failed to sync short ID filter')
+                await asyncio.sleep(MIN_SYNC_GAP)
+        finally:
+            self._wakeup = None
+
+
+short_id_filter = ShortIdFilter(
+    enabled=BLOOM_FILTER_ENABLED,
+    capacity=BLOOM_FILTER_CAPACITY,
+    fp_rate=BLOOM_FILTER_FP_RATE,
+    max_bytes=BLOOM_FILTER_MAX_BYTES,
+    sync_interval=BLOOM_FILTER_SYNC_INTERVAL,
+    generation_path=BLOOM_FILTER_GENERATION_PATH,
+)
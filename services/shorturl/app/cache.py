@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+REDIRECT_CACHE_SIZE = int(os.getenv('REDIRECT_CACHE_SIZE', 10000))
+REDIRECT_CACHE_TTL = float(os.getenv('REDIRECT_CACHE_TTL', 300))
+REDIRECT_CACHE_NEGATIVE_TTL = float(os.getenv('REDIRECT_CACHE_NEGATIVE_TTL', 30))
+
+# Маркер промаха: None в кэше означает "short_id не существует" (негативное кэширование)
+MISS = object()
+
+
+class LRUCache:
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Any:
+        if self.max_size <= 0:
+            return MISS
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            if value is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        if self.max_size <= 0:
+            return
+        default_ttl = self.ttl if value is not None else self.negative_ttl
+        # Явный ttl может только сократить время жизни записи (например, до истечения ссылки)
+        ttl = default_ttl if ttl is None else min(ttl, default_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.negative_hits = self.misses = 0
+            self.evictions = self.expirations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+redirect_cache = LRUCache(
+    max_size=REDIRECT_CACHE_SIZE,
+    ttl=REDIRECT_CACHE_TTL,
+    negative_ttl=REDIRECT_CACHE_NEGATIVE_TTL,
+)
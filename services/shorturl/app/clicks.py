@@ -0,0 +1,132 @@
+import asyncio
+import logging
+import os
+from datetime import datetime
+from importlib import import_module
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.models import ShortUrlClicks, utcnow
+
+CLICK_FLUSH_INTERVAL_MS = int(os.getenv('CLICK_FLUSH_INTERVAL_MS', 1000))
+CLICK_FLUSH_MAX_EVENTS = int(os.getenv('CLICK_FLUSH_MAX_EVENTS', 1000))
+
+logger = logging.getLogger(__name__)
+
+# Диалекты импортируются при первом сбросе: модуль postgresql заметно
+# удлиняет старт, а нужен только одному из них
+UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+
+def upsert_clicks_statement(dialect_name: str):
+    if dialect_name not in UPSERT_DIALECTS:
+        raise RuntimeError(f'Click counting is not supported for dialect "{dialect_name}"')
+    stmt = import_module(f'sqlalchemy.dialects.{dialect_name}').insert(ShortUrlClicks)
+    return stmt.on_conflict_do_update(
+        index_elements=[ShortUrlClicks.short_id],
+        set_={
+            'clicks': ShortUrlClicks.clicks + stmt.excluded.clicks,
+            'last_accessed_at': stmt.excluded.last_accessed_at,
+        },
+    )
+
+
+class ClickAggregator:
+    # redirect_url только увеличивает счетчики в памяти; в БД они попадают
+    # одним пакетным UPSERT раз в interval или по накоплении max_events кликов
+    def __init__(self, interval: float, max_events: int):
+        self.interval = interval
+        self.max_events = max_events
+        self._pending: dict[str, list] = {}
+        self._events = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self.flushed_events = 0
+        self.failed_flushes = 0
+
+    def record(self, short_id: str) -> None:
+        # Как в БД: без часового пояса, иначе /stats отдавал бы время то с Z, то без
+        now = utcnow()
+        entry = self._pending.get(short_id)
+        if entry is None:
+            self._pending[short_id] = [1, now]
+        else:
+            entry[0] += 1
+            entry[1] = now
+        self._events += 1
+        if self._events >= self.max_events and self._wakeup is not None:
+            self._wakeup.set()
+
+    def pending(self, short_id: str) -> Optional[tuple[int, datetime]]:
+        entry = self._pending.get(short_id)
+        return (entry[0], entry[1]) if entry is not None else None
+
+    @property
+    def pending_events(self) -> int:
+        return self._events
+
+    def clear(self) -> None:
+        self._pending = {}
+        self._events = 0
+
+    def _restore(self, pending: dict[str, list]) -> None:
+        for short_id, (clicks, last_accessed_at) in pending.items():
+            entry = self._pending.get(short_id)
+            if entry is None:
+                self._pending[short_id] = [clicks, last_accessed_at]
+            else:
+                entry[0] += clicks
+                entry[1] = max(entry[1], last_accessed_at)
+            self._events += clicks
+
+    async def flush(self, engine: AsyncEngine) -> int:
+        pending, self._pending = self._pending, {}
+        events, self._events = self._events, 0
+        if not pending:
+            return 0
+        rows = [
+            {'short_id': short_id, 'clicks': clicks, 'last_accessed_at': last_accessed_at}
+            for short_id, (clicks, last_accessed_at) in pending.items()
+        ]
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(upsert_clicks_statement(engine.dialect.name), rows)
+        except Exception:
+            # Не теряем клики: вернем дельты и попробуем при следующем сбросе
+            self._restore(pending)
+            self.failed_flushes += 1
+            raise
+        self.flushed_events += events
+        return events
+
+    async def run(self, engine: AsyncEngine) -> None:
+        # Event создается внутри работающего цикла событий
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                # asyncio.timeout, а не wait_for: wait_for может проглотить отмену,
+                # если событие сработало одновременно с ней
+                try:
+                    async with asyncio.timeout(self.interval):
+                        await self._wakeup.wait()
+                except TimeoutError:
+                    pass
+                self._wakeup.clear()
+                try:
+                    await self.flush(engine)
+                except Exception:
+                    logger.exception('Failed to flush click counters')
+        except asyncio.CancelledError:
+            try:
+                await self.flush(engine)
+            except Exception:
+                logger.exception('Failed to flush click counters on shutdown')
+            raise
+        finally:
+            self._wakeup = None
+
+
+click_aggregator = ClickAggregator(
+    interval=CLICK_FLUSH_INTERVAL_MS / 1000,
+    max_events=CLICK_FLUSH_MAX_EVENTS,
+)
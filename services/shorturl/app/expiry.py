@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.cache import redirect_cache
+from app.models import ShortUrl, ShortUrlClicks, utcnow
+
+EXPIRY_PURGE_INTERVAL = float(os.getenv('EXPIRY_PURGE_INTERVAL', 60))
+EXPIRY_PURGE_BATCH_SIZE = int(os.getenv('EXPIRY_PURGE_BATCH_SIZE', 500))
+# Сколько секунд истекшие ссылки хранятся и отвечают 410, прежде чем удалиться
+EXPIRY_RETENTION = float(os.getenv('EXPIRY_RETENTION', 24 * 60 * 60))
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiryPurger:
+    # Истекшие строки удаляются короткими транзакциями по batch_size строк:
+    # единственный писатель SQLite освобождается между пачками
+    def __init__(self, interval: float, batch_size: int, retention: float):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.retention = retention
+        self.purged = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and self.batch_size > 0
+
+    async def purge_batch(self, engine: AsyncEngine) -> int:
+        cutoff = utcnow() - timedelta(seconds=self.retention)
+        async with engine.begin() as conn:
+            rows = (await conn.execute(
+                select(ShortUrl.id, ShortUrl.short_id)
+                .where(ShortUrl.expires_at <= cutoff)
+                .order_by(ShortUrl.expires_at)
+                .limit(self.batch_size)
+            )).all()
+            if not rows:
+                return 0
+            short_ids = [short_id for _, short_id in rows]
+            await conn.execute(delete(ShortUrlClicks).where(ShortUrlClicks.short_id.in_(short_ids)))
+            await conn.execute(delete(ShortUrl).where(ShortUrl.id.in_([row_id for row_id, _ in rows])))
+        for short_id in short_ids:
+            redirect_cache.invalidate(short_id)
+        self.purged += len(rows)
+        return len(rows)
+
+    async def purge(self, engine: AsyncEngine) -> int:
+        total = 0
+        while True:
+            purged = await self.purge_batch(engine)
+            total += purged
+            if purged < self.batch_size:
+                return total
+            # Между пачками пропускаем вперед запросы, ждущие соединение писателя
+            await asyncio.sleep(0)
+
+    async def run(self, engine: AsyncEngine) -> None:
+        while True:
+            try:
+                purged = await self.purge(engine)
+                if purged:
+                    logger.info('Purged %d expired short URLs', purged)
+            except Exception:
+                logger.exception('Failed to purge expired short URLs')
+            await asyncio.sleep(self.interval)
+
+
+expiry_purger = ExpiryPurger(
+    interval=EXPIRY_PURGE_INTERVAL,
+    batch_size=EXPIRY_PURGE_BATCH_SIZE,
+    retention=EXPIRY_RETENTION,
+)
@@ -0,0 +1,300 @@
+import os
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.requests import Request
+from starlette.responses import Response
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Реестр свой в каждом воркере uvicorn: метка pid разделяет их серии, иначе при
+# сборе с разных воркеров счетчики скачут и rate() считается неверно
+METRICS_PID_LABEL = os.getenv('METRICS_PID_LABEL', 'true').lower() in ('1', 'true', 'yes')
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+UNMATCHED_ROUTE = '<unmatched>'
+ROUTE_TEMPLATE_KEY = 'route_template'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Histogram:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    __slots__ = ('queries', 'query_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+# Статистика текущего запроса; SQLAlchemy копирует контекст в greenlet, где
+# выполняются события курсора, поэтому они видят объект своего запроса
+current_request: ContextVar[Optional[RequestStats]] = ContextVar('current_request', default=None)
+
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+class MetricsRegistry:
+    # Все изменения выполняются в потоке event loop, блокировки не нужны
+    def __init__(self, pid_label: bool = False):
+        self.pid_label = pid_label
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._gauges: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, Histogram]] = {}
+        self._buckets: dict[str, tuple] = {}
+        self._help: dict[str, str] = {}
+        self._collectors: dict[str, Callable[[], Iterable[tuple]]] = {}
+
+    def counter(self, name: str, help_text: str) -> dict:
+        self._help[name] = help_text
+        return self._counters.setdefault(name, {})
+
+    def gauge(self, name: str, help_text: str) -> dict:
+        self._help[name] = help_text
+        return self._gauges.setdefault(name, {})
+
+    def histogram(self, name: str, help_text: str, buckets: tuple) -> dict:
+        self._help[name] = help_text
+        self._buckets[name] = buckets
+        return self._histograms.setdefault(name, {})
+
+    def observe(self, name: str, labels: tuple, value: float) -> None:
+        series = self._histograms[name]
+        histogram = series.get(labels)
+        if histogram is None:
+            histogram = series[labels] = Histogram(self._buckets[name])
+        histogram.observe(value)
+
+    def add_collector(self, name: str, collector: Callable[[], Iterable[tuple]]) -> None:
+        # Коллектор возвращает (name, type, help, [(labels, value), ...]) на момент выгрузки;
+        # повторная регистрация под тем же именем заменяет предыдущий
+        self._collectors[name] = collector
+
+    def clear(self) -> None:
+        for series in (*self._counters.values(), *self._gauges.values(), *self._histograms.values()):
+            series.clear()
+
+    def render(self) -> str:
+        lines = []
+        base = (('pid', os.getpid()),) if self.pid_label else ()
+
+        def header(name: str, metric_type: str, help_text: str):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+
+        for metric_type, metrics in (('counter', self._counters), ('gauge', self._gauges)):
+            for name, series in metrics.items():
+                header(name, metric_type, self._help[name])
+                lines.extend(f'{name}{format_labels((*base, *labels))} {value}' for labels, value in series.items())
+
+        for name, series in self._histograms.items():
+            header(name, 'histogram', self._help[name])
+            for labels, histogram in series.items():
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels((*base, *labels, ("le", bound)))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels((*base, *labels))} {histogram.sum}')
+                lines.append(f'{name}_count{format_labels((*base, *labels))} {histogram.count}')
+
+        for collector in self._collectors.values():
+            for name, metric_type, help_text, samples in collector():
+                header(name, metric_type, help_text)
+                lines.extend(f'{name}{format_labels((*base, *labels))} {value}' for labels, value in samples)
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry(pid_label=METRICS_PID_LABEL)
+
+http_requests = registry.counter('http_requests_total', 'HTTP requests by route and status.')
+http_in_flight = registry.gauge('http_requests_in_flight', 'HTTP requests currently being processed.')
+registry.histogram('http_request_duration_seconds', 'HTTP request latency.', LATENCY_BUCKETS)
+registry.histogram('http_request_db_queries', 'SQL queries executed per HTTP request.', QUERY_COUNT_BUCKETS)
+registry.histogram('http_request_db_duration_seconds', 'Time spent in SQL per HTTP request.', LATENCY_BUCKETS)
+registry.histogram('db_query_duration_seconds', 'SQL statement execution time.', LATENCY_BUCKETS)
+registry.histogram('db_pool_checkout_duration_seconds', 'Time to obtain a pooled connection.', LATENCY_BUCKETS)
+
+
+def route_label(scope: dict) -> str:
+    # Шаблон пути вместо самого пути, чтобы число серий не зависело от short_id/item_id.
+    # Роутер кладет сработавший маршрут в scope; быстрые пути в обход роутера
+    # указывают шаблон в ROUTE_TEMPLATE_KEY
+    route = scope.get('route')
+    if route is not None:
+        return route.path
+    if ROUTE_TEMPLATE_KEY in scope:
+        return scope[ROUTE_TEMPLATE_KEY]
+    # Маршруты Starlette без параметров (/docs, /metrics) оставляют в scope только endpoint
+    return scope['path'] if 'endpoint' in scope else UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    # Внешний ASGI-слой: учитывает и ответы быстрых путей, минующих роутер
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        method = scope['method']
+        in_flight_key = (('method', method),)
+        http_in_flight[in_flight_key] = http_in_flight.get(in_flight_key, 0) + 1
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_request.reset(token)
+            http_in_flight[in_flight_key] -= 1
+            labels = (('method', method), ('route', route_label(scope)))
+            status_key = (*labels, ('status', status_code))
+            http_requests[status_key] = http_requests.get(status_key, 0) + 1
+            registry.observe('http_request_duration_seconds', labels, elapsed)
+            registry.observe('http_request_db_queries', labels, stats.queries)
+            registry.observe('http_request_db_duration_seconds', labels, stats.query_seconds)
+
+
+def instrument_engine(engine: AsyncEngine, role: str) -> None:
+    labels = (('engine', role),)
+    sync_engine = engine.sync_engine
+
+    def before_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+        registry.observe('db_query_duration_seconds', labels, elapsed)
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.query_seconds += elapsed
+
+    def handle_error(context):
+        starts = context.connection.info.get('query_start') if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+    event.listen(sync_engine, 'before_cursor_execute', before_cursor_execute)
+    event.listen(sync_engine, 'after_cursor_execute', after_cursor_execute)
+    event.listen(sync_engine, 'handle_error', handle_error)
+
+    # У пула нет события "начало выдачи соединения", поэтому оборачиваем сам connect()
+    pool = sync_engine.pool
+    pool_connect = pool.connect
+
+    def timed_connect():
+        start = time.perf_counter()
+        try:
+            return pool_connect()
+        finally:
+            registry.observe('db_pool_checkout_duration_seconds', labels, time.perf_counter() - start)
+
+    pool.connect = timed_connect
+
+
+def pool_collector(engines: Callable[[], dict]) -> Callable[[], Iterable[tuple]]:
+    def collect():
+        samples = [
+            ((('engine', role),), engine.sync_engine.pool.checkedout())
+            for role, engine in engines().items()
+            if engine is not None and hasattr(engine.sync_engine.pool, 'checkedout')
+        ]
+        yield 'db_pool_connections_in_use', 'gauge', 'Connections checked out of the pool.', samples
+    return collect
+
+
+async def metrics_endpoint(_request: Request) -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
+
+
+def service_collector():
+    from app.bloom import short_id_filter
+    from app.cache import redirect_cache
+    from app.clicks import click_aggregator
+    from app.expiry import expiry_purger
+    from app.shared_table import redirect_table
+    from app.short_ids import PooledIdStrategy, id_strategy
+
+    cache_stats = redirect_cache.stats()
+    for key in ('hits', 'negative_hits', 'misses', 'evictions', 'expirations'):
+        yield f'redirect_cache_{key}_total', 'counter', f'Redirect cache {key.replace("_", " ")}.', [((), cache_stats[key])]
+    yield 'redirect_cache_entries', 'gauge', 'Entries in the redirect cache.', [((), cache_stats['size'])]
+
+    if redirect_table.is_open:
+        yield 'shared_redirect_table_hits_total', 'counter', 'Redirects resolved from the shared table.', [
+            ((), redirect_table.hits),
+        ]
+        yield 'shared_redirect_table_misses_total', 'counter', 'Shared table lookups without a match.', [
+            ((), redirect_table.misses),
+        ]
+        yield 'shared_redirect_table_rejected_total', 'counter', 'Entries not added because the table is full.', [
+            ((), redirect_table.rejected),
+        ]
+        yield 'shared_redirect_table_entries', 'gauge', 'Entries in the shared redirect table.', [
+            ((), redirect_table.count),
+        ]
+        yield 'shared_redirect_table_heap_bytes', 'gauge', 'Bytes used by URLs in the shared table.', [
+            ((), redirect_table.heap_used),
+        ]
+
+    yield 'short_id_filter_rejected_total', 'counter', 'Lookups rejected by the short ID filter.', [
+        ((), short_id_filter.rejected),
+    ]
+    yield 'short_id_filter_stale_total', 'counter', 'Filter misses checked in the database after inserts elsewhere.', [
+        ((), short_id_filter.stale),
+    ]
+    if short_id_filter.bloom is not None:
+        yield 'short_id_filter_ids', 'gauge', 'Short IDs added to the filter.', [((), short_id_filter.bloom.count)]
+        yield 'short_id_filter_bytes', 'gauge', 'Memory used by the filter bit array.', [
+            ((), short_id_filter.bloom.memory_bytes),
+        ]
+
+    yield 'click_pending_events', 'gauge', 'Clicks recorded but not yet flushed.', [((), click_aggregator.pending_events)]
+    yield 'click_flushed_events_total', 'counter', 'Clicks flushed to the database.', [
+        ((), click_aggregator.flushed_events),
+    ]
+    yield 'click_failed_flushes_total', 'counter', 'Failed click flushes.', [((), click_aggregator.failed_flushes)]
+    yield 'expired_urls_purged_total', 'counter', 'Expired short URLs deleted by the purger.', [
+        ((), expiry_purger.purged),
+    ]
+    if isinstance(id_strategy, PooledIdStrategy):
+        yield 'short_id_pool_size', 'gauge', 'Pre-verified short IDs ready to use.', [((), len(id_strategy))]
+        yield 'short_id_pool_fallbacks_total', 'counter', 'Short IDs generated on the request path.', [
+            ((), id_strategy.fallbacks),
+        ]
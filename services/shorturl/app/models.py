@@ -1,6 +1,7 @@
+import hashlib
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -8,11 +9,36 @@ class AbstractModel(DeclarativeBase):
     pass
 
 
+def url_digest(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def utcnow() -> datetime:
+    # Время хранится в БД без часового пояса, в UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
 class ShortUrl(AbstractModel):
     __tablename__ = 'short_urls'
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     short_id = Column(String(20), unique=True, nullable=False, index=True)
     full_url = Column(String(2048), nullable=False)
+    url_hash = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    expires_at = Column(DateTime, nullable=True, index=True)
+
+
+class ShortUrlClicks(AbstractModel):
+    __tablename__ = 'short_url_clicks'
+
+    short_id = Column(String(20), primary_key=True)
+    clicks = Column(BigInteger, nullable=False, default=0)
+    last_accessed_at = Column(DateTime, nullable=True)
+
+
+class IdSequence(AbstractModel):
+    __tablename__ = 'id_sequences'
 
+    name = Column(String(50), primary_key=True)
+    next_hi = Column(BigInteger, nullable=False, default=0)
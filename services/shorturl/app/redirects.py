@@ -0,0 +1,134 @@
+import os
+import re
+from datetime import datetime
+from typing import Optional
+from urllib.parse import quote
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import app as app_module
+from app.bloom import short_id_filter
+from app.cache import redirect_cache, MISS
+from app.clicks import click_aggregator
+from app.metrics import ROUTE_TEMPLATE_KEY
+from app.models import ShortUrl, utcnow
+from app.shared_table import redirect_table
+from app.short_ids import SHORT_ID_PATTERN
+
+REDIRECT_FAST_PATH = os.getenv('REDIRECT_FAST_PATH', 'false').lower() in ('1', 'true', 'yes')
+# Без Cache-Control браузеры кэшируют 301 бессрочно. Пустое значение - не отправлять заголовок.
+# Переходы, обслуженные из кэша клиента или CDN, не попадают в статистику кликов
+REDIRECT_CACHE_CONTROL = os.getenv('REDIRECT_CACHE_CONTROL', 'public, max-age=60')
+
+MAX_AGE_PATTERN = re.compile(r'\b(max-age|s-maxage)=(\d+)')
+
+# Те же безопасные символы, что использует starlette.responses.RedirectResponse
+LOCATION_SAFE_CHARS = ":/%#?=@[]!$&'()*+,;"
+
+
+# Маркер в кэше и результат resolve_short_id: ссылка есть, но срок ее действия истек
+EXPIRED = object()
+
+
+class ExpiringUrl(str):
+    # full_url ссылки со сроком действия; срок ограничивает max-age редиректа
+    expires_at: datetime
+
+
+def cache_short_url(short_id: str, full_url: str, expires_at: Optional[datetime] = None):
+    # Запись в кэше живет не дольше самой ссылки. Бессрочные ссылки хранятся в общей
+    # таблице воркеров, если она подключена и не заполнена
+    if expires_at is None:
+        if not redirect_table.add(short_id, full_url):
+            redirect_cache.set(short_id, full_url)
+        return full_url
+    remaining = (expires_at - utcnow()).total_seconds()
+    if remaining <= 0:
+        redirect_cache.set(short_id, EXPIRED, ttl=redirect_cache.negative_ttl)
+        return EXPIRED
+    full_url = ExpiringUrl(full_url)
+    full_url.expires_at = expires_at
+    redirect_cache.set(short_id, full_url, ttl=remaining)
+    return full_url
+
+
+def redirect_cache_control(full_url: str) -> str:
+    if not REDIRECT_CACHE_CONTROL or not isinstance(full_url, ExpiringUrl):
+        return REDIRECT_CACHE_CONTROL
+    remaining = max(0, int((full_url.expires_at - utcnow()).total_seconds()))
+    return MAX_AGE_PATTERN.sub(
+        lambda match: f'{match.group(1)}={min(int(match.group(2)), remaining)}',
+        REDIRECT_CACHE_CONTROL,
+    )
+
+
+async def resolve_short_id(db: AsyncSession, short_id: str):
+    # Возвращает full_url, None (нет такой ссылки) или EXPIRED
+    full_url = redirect_table.get(short_id)
+    if full_url is not None:
+        return full_url
+    full_url = redirect_cache.get(short_id)
+    if full_url is MISS:
+        full_url = None
+        # Фильтр Блума отсекает заведомо несуществующие id без обращения к БД
+        if short_id_filter.might_contain(short_id):
+            result = await db.execute(
+                select(ShortUrl.full_url, ShortUrl.expires_at).where(ShortUrl.short_id == short_id)
+            )
+            row = result.first()
+            if row is None:
+                redirect_cache.set(short_id, None)
+            else:
+                full_url = cache_short_url(short_id, row.full_url, row.expires_at)
+    return full_url
+
+
+class RedirectFastPath:
+    # ASGI-обработчик перед роутером FastAPI: найденные short_id получают 301 без
+    # маршрутизации, DI и объектов Response. Все остальное, включая 404 и ошибки,
+    # уходит в обычное приложение
+    def __init__(self, app, reserved_paths: frozenset = frozenset()):
+        self.app = app
+        self.reserved_paths = reserved_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ('GET', 'HEAD'):
+            await self.app(scope, receive, send)
+            return
+
+        short_id = scope['path'][1:]
+        if short_id in self.reserved_paths or not SHORT_ID_PATTERN.fullmatch(short_id):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with app_module.ReadSessionLocal() as db:
+                full_url = await resolve_short_id(db, short_id)
+        except Exception:
+            full_url = None
+        # 404, 410 и ошибки формирует обычное приложение
+        if full_url is None or full_url is EXPIRED:
+            await self.app(scope, receive, send)
+            return
+
+        click_aggregator.record(short_id)
+        scope[ROUTE_TEMPLATE_KEY] = '/{short_id}'
+        headers = [
+            (b'location', quote(full_url, safe=LOCATION_SAFE_CHARS).encode('latin-1')),
+            (b'content-length', b'0'),
+        ]
+        cache_control = redirect_cache_control(full_url)
+        if cache_control:
+            headers.append((b'cache-control', cache_control.encode('latin-1')))
+        await send({'type': 'http.response.start', 'status': 301, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+
+
+def static_get_paths(app) -> frozenset:
+    # Одноуровневые GET-маршруты без параметров (/docs, /openapi.json, ...)
+    return frozenset(
+        route.path[1:]
+        for route in app.routes
+        if 'GET' in getattr(route, 'methods', ()) and '{' not in route.path and route.path.count('/') == 1
+    )
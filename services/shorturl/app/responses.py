@@ -0,0 +1,60 @@
+import os
+from typing import Any, Iterable, Optional
+
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+FAST_RESPONSES = os.getenv('FAST_RESPONSES', 'true').lower() in ('1', 'true', 'yes')
+
+# Даты как у pydantic: без пояса - как есть, UTC - с суффиксом Z
+ORJSON_OPTIONS = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+class FastSerializer:
+    # Ответ собирается из атрибутов ORM-объектов или строк результата и сразу
+    # сериализуется orjson, без повторной валидации через response_model.
+    # response_model у маршрута остается для схемы OpenAPI и для пути с выключенным
+    # FAST_RESPONSES (или enabled=False у отдельного маршрута)
+    def __init__(self, schema: type[BaseModel], enabled: bool = FAST_RESPONSES):
+        self.schema = schema
+        self.fields = tuple((name, field.get_default()) for name, field in schema.model_fields.items())
+        self.names = tuple(name for name, _ in self.fields)
+        self.name_set = frozenset(self.names)
+        self.list_adapter = TypeAdapter(list[schema])
+        self.enabled = enabled
+
+    def dump(self, obj) -> dict:
+        if isinstance(obj, dict):
+            return obj
+        if type(obj) is tuple:
+            return dict(zip(self.names, obj))
+        # Загруженные значения колонок ORM-объекта лежат в __dict__: чтение оттуда
+        # вдвое быстрее, чем через дескрипторы атрибутов
+        values = getattr(obj, '__dict__', None)
+        if values is not None and self.name_set <= values.keys():
+            return {name: values[name] for name in self.names}
+        return {name: getattr(obj, name, default) for name, default in self.fields}
+
+    def one(self, obj, status_code: int = 200, headers: Optional[dict] = None):
+        if not self.enabled:
+            if headers is None:
+                return obj
+            # Заголовки нужно вернуть вместе с ответом: валидируем здесь, как сделал бы FastAPI
+            content = self.schema.model_validate(obj, from_attributes=True).model_dump(mode='json')
+            return JSONResponse(content, status_code=status_code, headers=headers)
+        return ORJSONResponse(self.dump(obj), status_code=status_code, headers=headers)
+
+    def many(self, objs: Iterable, status_code: int = 200, headers: Optional[dict] = None):
+        if not self.enabled:
+            if headers is None:
+                return objs
+            items = self.list_adapter.validate_python(list(objs), from_attributes=True)
+            content = self.list_adapter.dump_python(items, mode='json')
+            return JSONResponse(content, status_code=status_code, headers=headers)
+        return ORJSONResponse([self.dump(obj) for obj in objs], status_code=status_code, headers=headers)
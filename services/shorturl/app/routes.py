@@ -1,89 +1,241 @@
 import os
-import secrets
-import string
 
-from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import RedirectResponse
+from sqlalchemy import select, insert, func
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import get_db
-from app.models import ShortUrl
-from app.schemas import ShortenRequest, ShortenResponse, ShortUrlStats
+from app import get_db, get_read_db
+from app.bloom import short_id_filter
+from app.clicks import click_aggregator
+from app.http_cache import make_etag, not_modified, not_modified_response, timestamp_us, validator_headers
+from app.models import ShortUrl, ShortUrlClicks, url_digest
+from app.redirects import EXPIRED, cache_short_url, redirect_cache_control, resolve_short_id
+from app.responses import FastSerializer
+from app.schemas import (
+    ShortenRequest, ShortenResponse, ShortenBatchRequest, ShortenBatchItem, ShortenBatchResponse, ShortUrlStats,
+    check_url,
+)
+from app.short_ids import id_strategy
 
-load_dotenv()
 router = APIRouter()
 
-ALPHABET = string.ascii_letters + string.digits
-SHORT_ID_LENGTH = 8
+SHORTEN_DEDUPE = os.getenv('SHORTEN_DEDUPE', 'false').lower() in ('1', 'true', 'yes')
+# Статистика меняется с каждым кликом: хранить можно, но только с перепроверкой
+STATS_CACHE_CONTROL = os.getenv('STATS_CACHE_CONTROL', 'no-cache')
 
+stats_serializer = FastSerializer(ShortUrlStats)
 
-def generate_short_id() -> str:
-    return ''.join(secrets.choice(ALPHABET) for _ in range(SHORT_ID_LENGTH))
+
+async def find_existing_short_ids(db: AsyncSession, urls: list[str]) -> dict[str, str]:
+    # Поиск по индексу url_hash; full_url сравнивается, чтобы исключить коллизии хеша.
+    # Ссылки со сроком действия не переиспользуются
+    result = await db.execute(
+        select(ShortUrl.full_url, ShortUrl.short_id)
+        .where(ShortUrl.url_hash.in_([url_digest(url) for url in set(urls)]), ShortUrl.expires_at.is_(None))
+        .order_by(ShortUrl.id)
+    )
+    existing = {}
+    for full_url, short_id in result.all():
+        if full_url in urls:
+            existing.setdefault(full_url, short_id)
+    return existing
 
 
 @router.post('/shorten', response_model=ShortenResponse, status_code=status.HTTP_201_CREATED)
-def shorten_url(request: ShortenRequest, db: Session = Depends(get_db)):
+async def shorten_url(
+    request: ShortenRequest,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+):
     port = os.getenv('URL_SERVICE_PORT', 8000)
 
     try:
+        if SHORTEN_DEDUPE and request.expires_at is None:
+            existing = await find_existing_short_ids(read_db, [request.url])
+            if request.url in existing:
+                response.status_code = status.HTTP_200_OK
+                return ShortenResponse(
+                    short_id=existing[request.url],
+                    short_url=f'http://127.0.0.1:{port}/{existing[request.url]}',
+                    full_url=request.url,
+                )
+
         max_attempts = 10
         for _ in range(max_attempts):
-            short_id = generate_short_id()
-            existing = db.query(ShortUrl).filter(ShortUrl.short_id == short_id).first()  # noqa
-            if existing is None:
+            [short_id] = await id_strategy.allocate(db)
+            db.add(ShortUrl(
+                short_id=short_id,
+                full_url=request.url,
+                url_hash=url_digest(request.url),
+                expires_at=request.expires_at,
+            ))
+            try:
+                await db.commit()
                 break
+            except IntegrityError:
+                await db.rollback()
+                id_strategy.collided()
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to generate unique short ID"
             )
 
-        short_url = ShortUrl(
-            short_id=short_id,
-            full_url=request.url
-        )
-
-        db.add(short_url)
-        db.commit()
-        db.refresh(short_url)
+        short_id_filter.add(short_id)
+        cache_short_url(short_id, request.url, request.expires_at)
 
         return ShortenResponse(
             short_id=short_id,
             short_url=f'http://127.0.0.1:{port}/{short_id}',
             full_url=request.url,
+            expires_at=request.expires_at,
         )
+    except HTTPException:
+        raise
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create short URL"
         )
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+async def insert_short_urls(db: AsyncSession, urls: list[str]) -> list[str]:
+    max_attempts = 10
+    for _ in range(max_attempts):
+        short_ids = await id_strategy.allocate(db, len(urls))
+        rows = [
+            {'short_id': short_id, 'full_url': url, 'url_hash': url_digest(url)}
+            for short_id, url in zip(short_ids, urls)
+        ]
+        try:
+            await db.execute(insert(ShortUrl), rows)
+            await db.commit()
+            return short_ids
+        except IntegrityError:
+            await db.rollback()
+            id_strategy.collided()
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Failed to generate unique short IDs"
+    )
+
+
+@router.post('/shorten/batch', response_model=ShortenBatchResponse, status_code=status.HTTP_200_OK)
+async def shorten_batch(
+    request: ShortenBatchRequest,
+    db: AsyncSession = Depends(get_db),
+    read_db: AsyncSession = Depends(get_read_db),
+):
+    port = os.getenv('URL_SERVICE_PORT', 8000)
+
+    results = []
+    valid = []
+    for index, url in enumerate(request.urls):
+        try:
+            item = ShortenBatchItem(index=index, url=check_url(url))
+            valid.append(item)
+        except ValueError as e:
+            item = ShortenBatchItem(index=index, url=url, error=str(e))
+        results.append(item)
+
+    urls = [item.url for item in valid]
+    try:
+        existing = await find_existing_short_ids(read_db, urls) if SHORTEN_DEDUPE and urls else {}
+        if SHORTEN_DEDUPE:
+            # Повторы внутри пакета тоже получают один short_id
+            urls = [url for url in dict.fromkeys(urls) if url not in existing]
+        short_ids = await insert_short_urls(db, urls) if urls else []
+    except HTTPException:
+        raise
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to create short URLs"
+        )
+    except SQLAlchemyError as e:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+    for short_id, url in zip(short_ids, urls):
+        short_id_filter.add(short_id)
+        cache_short_url(short_id, url)
+
+    if SHORTEN_DEDUPE:
+        created = dict(zip(urls, short_ids))
+        short_ids = [existing.get(item.url) or created[item.url] for item in valid]
+    for short_id, item in zip(short_ids, valid):
+        item.short_id = short_id
+        item.short_url = f'http://127.0.0.1:{port}/{short_id}'
+
+    return ShortenBatchResponse(
+        created=len(urls),
+        deduplicated=len(valid) - len(urls),
+        failed=len(results) - len(valid),
+        results=results,
+    )
+
 
 @router.get('/stats/{short_id}', response_model=ShortUrlStats, status_code=status.HTTP_200_OK)
-def get_stats(short_id: str, db: Session = Depends(get_db)):
+async def get_stats(short_id: str, request: Request, db: AsyncSession = Depends(get_read_db)):
     try:
-        short_url = db.query(ShortUrl).filter(ShortUrl.short_id == short_id).first()  # noqa
-        if short_url is None:
+        if not short_id_filter.might_contain(short_id):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail='Short URL not found'
             )
-        return short_url
+        result = await db.execute(
+            select(
+                ShortUrl.short_id,
+                ShortUrl.full_url,
+                ShortUrl.created_at,
+                func.coalesce(ShortUrlClicks.clicks, 0).label('clicks'),
+                ShortUrlClicks.last_accessed_at,
+                ShortUrl.expires_at,
+            )
+            .outerjoin(ShortUrlClicks, ShortUrlClicks.short_id == ShortUrl.short_id)
+            .where(ShortUrl.short_id == short_id)
+        )
+        row = result.first()
+        if row is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Short URL not found'
+            )
+        stats = stats_serializer.dump(row)
+        # Клики, еще не сброшенные в БД этим процессом
+        pending = click_aggregator.pending(short_id)
+        if pending is not None:
+            stats['clicks'] += pending[0]
+            stats['last_accessed_at'] = pending[1]
+        # Строка нужна в любом случае (в ней счетчик кликов), при совпадении ETag
+        # экономится только сериализация ответа
+        last_accessed_at = stats['last_accessed_at']
+        last_modified = last_accessed_at or stats['created_at']
+        etag = make_etag(stats['clicks'], timestamp_us(last_accessed_at) if last_accessed_at else 0)
+        headers = validator_headers(etag, last_modified, STATS_CACHE_CONTROL)
+        if not_modified(request, etag, last_modified):
+            return not_modified_response(headers)
+        return stats_serializer.one(stats, headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -94,15 +246,26 @@ def get_stats(short_id: str, db: Session = Depends(get_db)):
 
 
 @router.get('/{short_id}', status_code=status.HTTP_307_TEMPORARY_REDIRECT)
-def redirect_url(short_id: str, db: Session = Depends(get_db)):
+async def redirect_url(short_id: str, db: AsyncSession = Depends(get_read_db)):
     try:
-        short_url = db.query(ShortUrl).filter(ShortUrl.short_id == short_id).first()  # noqa
-        if short_url is None:
+        full_url = await resolve_short_id(db, short_id)
+        if full_url is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail='Short URL not found'
             )
-        return RedirectResponse(url=short_url.full_url, status_code=301)
+        if full_url is EXPIRED:
+            raise HTTPException(
+                status_code=status.HTTP_410_GONE,
+                detail='Short URL has expired'
+            )
+        click_aggregator.record(short_id)
+        cache_control = redirect_cache_control(full_url)
+        return RedirectResponse(
+            url=full_url,
+            status_code=301,
+            headers={'Cache-Control': cache_control} if cache_control else None,
+        )
     except HTTPException:
         raise
     except Exception as e:
@@ -1,37 +1,85 @@
-from datetime import datetime
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
 from urllib.parse import urlparse
 
 from pydantic import BaseModel, Field, ConfigDict, field_validator
 
+from app.models import utcnow
 
-class ShortenRequest(BaseModel):
-    url: str = Field(..., description='Full URL to shorten')
+SHORTEN_BATCH_MAX_SIZE = int(os.getenv('SHORTEN_BATCH_MAX_SIZE', 1000))
 
-    @field_validator('url', mode='before')
-    def validate_url(cls, v):  # noqa
-        print(v)
-        parsed = urlparse(v)
-        print(parsed)
 
-        if not parsed.scheme:
-            raise ValueError('URL must have a scheme (http:// or https://)')
+def check_url(v):
+    if not isinstance(v, str):
+        raise ValueError('URL must be a string')
+
+    parsed = urlparse(v)
+
+    if not parsed.scheme:
+        raise ValueError('URL must have a scheme (http:// or https://)')
+
+    if parsed.scheme not in ('http', 'https'):
+        raise ValueError('URL scheme must be http or https')
+
+    if not parsed.netloc:
+        raise ValueError('URL must have a host/domain')
+
+    if not parsed.netloc.strip():
+        raise ValueError('URL host cannot be empty')
+
+    return v.strip()
+
 
-        if parsed.scheme not in ('http', 'https'):
-            raise ValueError('URL scheme must be http or https')
+def check_expires_at(v: Optional[datetime]) -> Optional[datetime]:
+    # Храним в UTC без часового пояса; время без пояса считается UTC
+    if v is None:
+        return None
+    if v.tzinfo is not None:
+        v = v.astimezone(timezone.utc).replace(tzinfo=None)
+    if v <= utcnow():
+        raise ValueError('expires_at must be in the future')
+    return v
 
-        if not parsed.netloc:
-            raise ValueError('URL must have a host/domain')
 
-        if not parsed.netloc.strip():
-            raise ValueError('URL host cannot be empty')
+class ShortenRequest(BaseModel):
+    url: str = Field(..., description='Full URL to shorten')
+    expires_at: Optional[datetime] = Field(None, description='When the short URL stops redirecting')
+
+    @field_validator('url', mode='before')
+    def validate_url(cls, v):  # noqa
+        return check_url(v)
 
-        return v.strip()
+    @field_validator('expires_at')
+    def validate_expires_at(cls, v):  # noqa
+        return check_expires_at(v)
 
 
 class ShortenResponse(BaseModel):
     short_id: str
     short_url: str
     full_url: str
+    expires_at: Optional[datetime] = None
+
+
+class ShortenBatchRequest(BaseModel):
+    # URL валидируются в обработчике поштучно, чтобы ошибка одного не отклоняла весь пакет
+    urls: List[str] = Field(..., min_length=1, max_length=SHORTEN_BATCH_MAX_SIZE, description='Full URLs to shorten')
+
+
+class ShortenBatchItem(BaseModel):
+    index: int
+    url: str
+    short_id: Optional[str] = None
+    short_url: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ShortenBatchResponse(BaseModel):
+    created: int
+    deduplicated: int = 0
+    failed: int
+    results: List[ShortenBatchItem]
 
 
 class ShortUrlStats(BaseModel):
@@ -40,3 +88,6 @@ class ShortUrlStats(BaseModel):
     short_id: str
     full_url: str
     created_at: datetime
+    clicks: int = 0
+    last_accessed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
@@ -0,0 +1,284 @@
+import asyncio
+import fcntl
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.models import ShortUrl
+
+SHARED_REDIRECT_TABLE = os.getenv('SHARED_REDIRECT_TABLE', 'false').lower() in ('1', 'true', 'yes')
+SHARED_REDIRECT_TABLE_PATH = os.getenv('SHARED_REDIRECT_TABLE_PATH', '/dev/shm/shorturl-redirects')
+SHARED_REDIRECT_TABLE_CAPACITY = int(os.getenv('SHARED_REDIRECT_TABLE_CAPACITY', 1_000_000))
+SHARED_REDIRECT_TABLE_HEAP_BYTES = int(os.getenv('SHARED_REDIRECT_TABLE_HEAP_BYTES', 128 * 1024 * 1024))
+SHARED_REDIRECT_TABLE_SEGMENTS = int(os.getenv('SHARED_REDIRECT_TABLE_SEGMENTS', 256))
+# Задается main.py при каждом запуске сервера и наследуется его воркерами
+SERVER_INSTANCE_ID = os.getenv('SERVER_INSTANCE_ID', '')
+
+# Заголовок: magic, capacity, segments, heap_size, heap_used, count, state, идентификатор БД
+MAGIC = b'SURLTAB1'
+HEADER = struct.Struct('<8sQQQQQQ8s')
+HEADER_SIZE = 64
+LAYOUT_SIZE = 32  # magic, capacity, segments, heap_size: при расхождении файл пересоздается
+HEAP_USED_OFFSET = 32
+COUNT_OFFSET = 40
+STATE_OFFSET = 48
+DATABASE_OFFSET = 56
+DATABASE_ID_SIZE = 8
+COUNTER = struct.Struct('<Q')
+# Слот: хеш short_id (0 - пустой слот), смещение и длина записи в куче
+SLOT = struct.Struct('<QII')
+
+EMPTY, LOADING, READY = 0, 1, 2
+MAX_LOAD_FACTOR = 0.75
+READ_RETRIES = 4
+LOAD_CHUNK_SIZE = 10000
+# Строк за один захват flock при загрузке: add() других воркеров ждет его в event loop
+LOAD_LOCK_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def database_identity(database_url: str, instance_id: str = '') -> bytes:
+    # Файл таблицы привязан к БД (для SQLite - путь к файлу и его inode) и к запуску сервера:
+    # другая база, как и новый запуск после замены или восстановления файла, не получит
+    # чужие ссылки. Перезапущенные воркеры того же запуска подключаются к готовой таблице
+    parsed = make_url(database_url)
+    key = parsed.render_as_string(hide_password=True)
+    if parsed.get_backend_name() == 'sqlite' and parsed.database not in (None, '', ':memory:'):
+        path = os.path.realpath(parsed.database)
+        try:
+            stat = os.stat(path)
+            key = f'{path}:{stat.st_dev}:{stat.st_ino}'
+        except OSError:
+            key = path
+    key = f'{key}|{instance_id}'
+    return hashlib.blake2b(key.encode(), digest_size=DATABASE_ID_SIZE).digest()
+
+
+def key_hash(key: bytes) -> int:
+    # hash() в каждом процессе свой (PYTHONHASHSEED), нужен стабильный хеш
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+class SharedRedirectTable:
+    # Хеш-таблица short_id -> full_url в файле, отображенном в память всеми воркерами:
+    # страницы общие, поэтому память не растет с числом процессов.
+    # Таблица разбита на сегменты с открытой адресацией внутри сегмента. Запись
+    # (из любого воркера) идет под flock и обрамляет изменение слота счетчиком версии
+    # сегмента (seqlock); чтение без блокировок повторяется, если версия нечетная
+    # или изменилась. Записи только добавляются: short_id не меняет full_url
+    def __init__(self, enabled: bool, path: str, capacity: int, heap_size: int, segments: int):
+        if capacity <= 0 or heap_size <= 0 or segments <= 0:
+            raise ValueError('Capacity, heap size and segment count must be positive')
+        self.enabled = enabled
+        self.path = path
+        self.capacity = capacity
+        self.heap_size = heap_size
+        self.segments = segments
+        self.slots_per_segment = math.ceil(capacity / MAX_LOAD_FACTOR / segments)
+        self._slots_offset = HEADER_SIZE + segments * COUNTER.size
+        self._heap_offset = self._slots_offset + segments * self.slots_per_segment * SLOT.size
+        self.size = self._heap_offset + heap_size
+        self._fd = None
+        self._mmap = None
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self._mmap is not None
+
+    @contextmanager
+    def _locked(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def open(self, database_id: bytes = bytes(DATABASE_ID_SIZE)) -> None:
+        # Первый воркер создает файл (разреженный: память занимают только записанные страницы),
+        # остальные подключаются к существующему. Файл с другой разметкой или от другой БД
+        # пересоздается и загружается заново
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._fd = fd
+        header = HEADER.pack(MAGIC, self.capacity, self.segments, self.heap_size, 0, 0, EMPTY, database_id)
+        with self._locked():
+            if (
+                os.fstat(fd).st_size != self.size
+                or os.pread(fd, LAYOUT_SIZE, 0) != header[:LAYOUT_SIZE]
+                or os.pread(fd, DATABASE_ID_SIZE, DATABASE_OFFSET) != database_id
+            ):
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, self.size)
+                os.pwrite(fd, header, 0)
+        self._mmap = mmap.mmap(fd, self.size)
+
+    def close(self) -> None:
+        # Файл не удаляется: им продолжают пользоваться другие воркеры
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        self.hits = self.misses = self.rejected = 0
+
+    def _counter(self, offset: int) -> int:
+        return COUNTER.unpack_from(self._mmap, offset)[0]
+
+    def _set_counter(self, offset: int, value: int) -> None:
+        COUNTER.pack_into(self._mmap, offset, value)
+
+    @property
+    def count(self) -> int:
+        return self._counter(COUNT_OFFSET) if self.is_open else 0
+
+    @property
+    def heap_used(self) -> int:
+        return self._counter(HEAP_USED_OFFSET) if self.is_open else 0
+
+    @property
+    def state(self) -> int:
+        return self._counter(STATE_OFFSET) if self.is_open else EMPTY
+
+    def _probe(self, key: bytes, key_digest: int, segment: int) -> tuple[Optional[int], Optional[str]]:
+        # (позиция слота, full_url): слот с этим ключом или первый пустой; (None, None) - сегмент заполнен
+        mm = self._mmap
+        base = self._slots_offset + segment * self.slots_per_segment * SLOT.size
+        index = (key_digest // self.segments) % self.slots_per_segment
+        for _ in range(self.slots_per_segment):
+            position = base + index * SLOT.size
+            slot_hash, offset, length = SLOT.unpack_from(mm, position)
+            if slot_hash == 0:
+                return position, None
+            # Без блокировки слот может быть прочитан посреди записи: границы проверяются,
+            # а результат отбрасывается по версии сегмента
+            if slot_hash == key_digest and offset + length <= self.heap_size:
+                start = self._heap_offset + offset
+                key_end = start + 1 + mm[start]
+                if mm[start + 1:key_end] == key:
+                    try:
+                        return position, mm[key_end:start + length].decode()
+                    except UnicodeDecodeError:
+                        return None, None
+            index = index + 1 if index + 1 < self.slots_per_segment else 0
+        return None, None
+
+    def get(self, short_id: str) -> Optional[str]:
+        if self._mmap is None:
+            return None
+        key = short_id.encode()
+        key_digest = key_hash(key)
+        segment = key_digest % self.segments
+        version_offset = HEADER_SIZE + segment * COUNTER.size
+        for _ in range(READ_RETRIES):
+            version = self._counter(version_offset)
+            if version & 1:
+                continue
+            _, full_url = self._probe(key, key_digest, segment)
+            if self._counter(version_offset) == version:
+                if full_url is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                return full_url
+        # Сегмент все время меняется: запрос уйдет в кэш процесса или БД
+        self.misses += 1
+        return None
+
+    def _insert(self, short_id: str, full_url: str) -> bool:
+        key = short_id.encode()
+        if len(key) > 255:
+            return False
+        key_digest = key_hash(key)
+        segment = key_digest % self.segments
+        position, existing = self._probe(key, key_digest, segment)
+        if existing is not None:
+            return True
+        entry = bytes((len(key),)) + key + full_url.encode()
+        heap_used = self._counter(HEAP_USED_OFFSET)
+        count = self._counter(COUNT_OFFSET)
+        if position is None or count >= self.capacity or heap_used + len(entry) > self.heap_size:
+            self.rejected += 1
+            return False
+        mm = self._mmap
+        start = self._heap_offset + heap_used
+        mm[start:start + len(entry)] = entry
+        self._set_counter(HEAP_USED_OFFSET, heap_used + len(entry))
+        version_offset = HEADER_SIZE + segment * COUNTER.size
+        version = self._counter(version_offset)
+        self._set_counter(version_offset, version + 1)
+        SLOT.pack_into(mm, position, key_digest, heap_used, len(entry))
+        self._set_counter(version_offset, version + 2)
+        self._set_counter(COUNT_OFFSET, count + 1)
+        return True
+
+    def add(self, short_id: str, full_url: str) -> bool:
+        # False - таблица не подключена или заполнена, ссылку нужно кэшировать иначе
+        if self._mmap is None:
+            return False
+        with self._locked():
+            return self._insert(short_id, full_url)
+
+    def add_many(self, items: Iterable[tuple[str, str]]) -> int:
+        if self._mmap is None:
+            return 0
+        with self._locked():
+            return sum(self._insert(short_id, full_url) for short_id, full_url in items)
+
+    async def load(self, engine: AsyncEngine) -> bool:
+        # Заполняет таблицу только один воркер - тот, что первым застал ее пустой.
+        # Читатели не ждут загрузки: промахи уходят в БД
+        with self._locked():
+            if self.state != EMPTY:
+                return False
+            self._set_counter(STATE_OFFSET, LOADING)
+        try:
+            async with engine.connect() as conn:
+                result = await conn.stream(
+                    select(ShortUrl.short_id, ShortUrl.full_url)
+                    .where(ShortUrl.expires_at.is_(None))
+                    .execution_options(yield_per=LOAD_CHUNK_SIZE)
+                )
+                async for partition in result.partitions():
+                    for start in range(0, len(partition), LOAD_LOCK_BATCH_SIZE):
+                        self.add_many(partition[start:start + LOAD_LOCK_BATCH_SIZE])
+                        # Между пачками блокировка свободна, а event loop обслуживает запросы
+                        await asyncio.sleep(0)
+        except BaseException:
+            with self._locked():
+                self._set_counter(STATE_OFFSET, EMPTY)
+            raise
+        with self._locked():
+            self._set_counter(STATE_OFFSET, READY)
+        logger.info(
+            'Shared redirect table loaded: %d entries, %d heap bytes, %d rejected',
+            self.count, self.heap_used, self.rejected,
+        )
+        return True
+
+    async def run(self, engine: AsyncEngine) -> None:
+        try:
+            await self.load(engine)
+        except Exception:
+            logger.exception('Failed to load shared redirect table')
+
+
+redirect_table = SharedRedirectTable(
+    enabled=SHARED_REDIRECT_TABLE,
+    path=SHARED_REDIRECT_TABLE_PATH,
+    capacity=SHARED_REDIRECT_TABLE_CAPACITY,
+    heap_size=SHARED_REDIRECT_TABLE_HEAP_BYTES,
+    segments=SHARED_REDIRECT_TABLE_SEGMENTS,
+)
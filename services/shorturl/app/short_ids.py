@@ -0,0 +1,205 @@
+import asyncio
+import logging
+import os
+import re
+import secrets
+import string
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.models import IdSequence, ShortUrl
+
+ALPHABET = string.ascii_letters + string.digits
+SHORT_ID_LENGTH = 8
+
+SHORT_ID_STRATEGY = os.getenv('SHORT_ID_STRATEGY', 'pool')
+SHORT_ID_BLOCK_SIZE = int(os.getenv('SHORT_ID_BLOCK_SIZE', 1000))
+SHORT_ID_NODE = os.getenv('SHORT_ID_NODE', '')
+SHORT_ID_POOL_SIZE = int(os.getenv('SHORT_ID_POOL_SIZE', 10000))
+SHORT_ID_POOL_LOW_WATER = int(os.getenv('SHORT_ID_POOL_LOW_WATER', 2500))
+SHORT_ID_POOL_BATCH_SIZE = int(os.getenv('SHORT_ID_POOL_BATCH_SIZE', 1000))
+
+SHORT_ID_PATTERN = re.compile(r'[A-Za-z0-9-]{1,20}')
+
+# Пути, которые обслуживают другие маршруты и не могут быть short_id
+RESERVED_IDS = frozenset({'docs', 'redoc', 'openapi.json', 'shorten', 'stats', 'metrics'})
+
+
+# Байт -> символ алфавита по остатку от деления на 62. Байты от 248 (= 62 * 4)
+# отбрасываются, иначе первые символы алфавита выпадали бы чаще
+RANDOM_BYTE_LIMIT = 256 - 256 % len(ALPHABET)
+RANDOM_BYTE_TABLE = bytes(ord(ALPHABET[byte % len(ALPHABET)]) for byte in range(256))
+RANDOM_BYTE_REJECTED = bytes(range(RANDOM_BYTE_LIMIT, 256))
+
+logger = logging.getLogger(__name__)
+
+
+def generate_short_id() -> str:
+    return ''.join(secrets.choice(ALPHABET) for _ in range(SHORT_ID_LENGTH))
+
+
+def generate_short_ids(count: int) -> list[str]:
+    # Весь пакет из одного буфера os.urandom: перевод байтов в символы делает bytes.translate
+    needed = count * SHORT_ID_LENGTH
+    chars = b''
+    while len(chars) < needed:
+        missing = needed - len(chars)
+        chars += os.urandom(missing + missing // 16 + 8).translate(RANDOM_BYTE_TABLE, RANDOM_BYTE_REJECTED)
+    chars = chars[:needed].decode('ascii')
+    return [chars[start:start + SHORT_ID_LENGTH] for start in range(0, needed, SHORT_ID_LENGTH)]
+
+
+def base62_encode(value: int) -> str:
+    if value == 0:
+        return ALPHABET[0]
+    digits = []
+    while value:
+        value, remainder = divmod(value, len(ALPHABET))
+        digits.append(ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+
+class RandomIdStrategy:
+    # Коллизии возможны, но при 62^8 вариантах крайне редки: вместо SELECT перед
+    # каждой вставкой полагаемся на уникальный индекс и повторяем при IntegrityError
+    async def allocate(self, db: AsyncSession, count: int = 1) -> list[str]:
+        return [generate_short_id() for _ in range(count)]
+
+    def collided(self) -> None:
+        # Повторная попытка и так получит новые случайные id
+        pass
+
+
+class HiLoIdStrategy:
+    # Последовательные id не пересекаются между инстансами, но могут совпасть с id,
+    # загруженными через /admin/import. Такие id перебираемы: по одному short_id
+    # легко угадать соседние
+    def __init__(self, block_size: int, node: str = '', sequence_name: str = 'short_urls'):
+        if block_size <= 0:
+            raise ValueError('Block size must be positive')
+        if '-' in node or len(node) > 8:
+            raise ValueError('Node prefix must be at most 8 characters without "-"')
+        self.block_size = block_size
+        self.prefix = f'{node}-' if node else ''
+        self.sequence_name = sequence_name
+        self._next = 0
+        self._limit = 0
+        self._lock = asyncio.Lock()
+
+    async def _lease(self, db: AsyncSession, blocks: int) -> None:
+        # Блок арендуется в отдельной транзакции: откат запроса не должен вернуть
+        # диапазон в последовательность, иначе другой инстанс получит те же значения
+        async with db.bind.begin() as conn:
+            next_hi = await conn.scalar(
+                update(IdSequence)
+                .where(IdSequence.name == self.sequence_name)
+                .values(next_hi=IdSequence.next_hi + blocks)
+                .returning(IdSequence.next_hi)
+            )
+        if next_hi is None:
+            raise RuntimeError(f'Sequence "{self.sequence_name}" does not exist')
+        self._next = (next_hi - blocks) * self.block_size
+        self._limit = next_hi * self.block_size
+
+    async def allocate(self, db: AsyncSession, count: int = 1) -> list[str]:
+        ids = []
+        async with self._lock:
+            while len(ids) < count:
+                if self._next >= self._limit:
+                    missing = count - len(ids)
+                    await self._lease(db, -(-missing // self.block_size))
+                short_id = self.prefix + base62_encode(self._next)
+                self._next += 1
+                if short_id not in RESERVED_IDS:
+                    ids.append(short_id)
+        return ids
+
+    def collided(self) -> None:
+        # Импортированные id обычно идут подряд: остаток блока отбрасывается,
+        # и повторная попытка берет id из нового блока
+        self._next = self._limit
+
+
+class PooledIdStrategy:
+    # Фоновая задача держит запас случайных id, которых нет в БД на момент проверки;
+    # запрос только забирает id из очереди. Между проверкой и вставкой id может занять
+    # другой воркер, поэтому уникальный индекс и повтор при IntegrityError остаются.
+    # Пока пул пуст (старт, всплеск нагрузки), id генерируются прямо в запросе
+    def __init__(self, size: int, low_water: int, batch_size: int):
+        if not 0 <= low_water < size or batch_size <= 0:
+            raise ValueError('Pool needs 0 <= low water < size and a positive batch size')
+        self.size = size
+        self.low_water = low_water
+        self.batch_size = batch_size
+        self._pool: deque[str] = deque()
+        self._refill: Optional[asyncio.Event] = None
+        self.fallbacks = 0
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    async def allocate(self, db: AsyncSession, count: int = 1) -> list[str]:
+        ids = []
+        pool = self._pool
+        while pool and len(ids) < count:
+            ids.append(pool.popleft())
+        if len(ids) < count:
+            self.fallbacks += count - len(ids)
+            ids.extend(generate_short_id() for _ in range(count - len(ids)))
+        if self._refill is not None and len(pool) < self.low_water:
+            self._refill.set()
+        return ids
+
+    def collided(self) -> None:
+        pass
+
+    async def fill(self, engine: AsyncEngine) -> int:
+        added = 0
+        while len(self._pool) < self.size:
+            candidates = set(generate_short_ids(min(self.batch_size, self.size - len(self._pool)))) - RESERVED_IDS
+            async with engine.connect() as conn:
+                taken = set(await conn.scalars(select(ShortUrl.short_id).where(ShortUrl.short_id.in_(candidates))))
+            fresh = candidates - taken
+            self._pool.extend(fresh)
+            added += len(fresh)
+            # Пачки короткие, между ними цикл событий обслуживает запросы
+            await asyncio.sleep(0)
+        return added
+
+    async def run(self, engine: AsyncEngine) -> None:
+        # Event создается здесь: он привязан к циклу событий, в котором ждет
+        self._refill = asyncio.Event()
+        try:
+            while True:
+                self._refill.clear()
+                try:
+                    await self.fill(engine)
+                except Exception:
+                    logger.exception('Failed to refill the short ID pool')
+                await self._refill.wait()
+        finally:
+            self._refill = None
+
+    def clear(self) -> None:
+        self._pool.clear()
+        self.fallbacks = 0
+
+
+def build_id_strategy(name: str):
+    if name == 'pool':
+        return PooledIdStrategy(
+            size=SHORT_ID_POOL_SIZE,
+            low_water=SHORT_ID_POOL_LOW_WATER,
+            batch_size=SHORT_ID_POOL_BATCH_SIZE,
+        )
+    if name == 'random':
+        return RandomIdStrategy()
+    if name == 'hilo':
+        return HiLoIdStrategy(block_size=SHORT_ID_BLOCK_SIZE, node=SHORT_ID_NODE)
+    raise ValueError(f'Unknown short ID strategy: {name}')
+
+
+id_strategy = build_id_strategy(SHORT_ID_STRATEGY)
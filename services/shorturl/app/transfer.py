@@ -0,0 +1,176 @@
+import csv
+import io
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import AsyncIterable, AsyncIterator, Optional
+
+from sqlalchemy import select, insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.bloom import short_id_filter
+from app.cache import redirect_cache
+from app.models import ShortUrl, url_digest, utcnow
+from app.schemas import check_url
+from app.short_ids import SHORT_ID_PATTERN, RESERVED_IDS
+
+EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', 10000))
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 5000))
+
+FORMATS = ('ndjson', 'csv')
+MEDIA_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+EXPORT_COLUMNS = ('short_id', 'full_url', 'created_at', 'expires_at')
+FULL_URL_MAX_LENGTH = ShortUrl.full_url.type.length
+MAX_REPORTED_ERRORS = 100
+
+
+def encode_rows(rows, fmt: str) -> bytes:
+    if fmt == 'ndjson':
+        return ''.join(
+            json.dumps(
+                {
+                    'short_id': short_id,
+                    'full_url': full_url,
+                    'created_at': created_at.isoformat(),
+                    'expires_at': expires_at.isoformat() if expires_at else None,
+                },
+                separators=(',', ':'),
+            ) + '\n'
+            for short_id, full_url, created_at, expires_at in rows
+        ).encode()
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(
+        (short_id, full_url, created_at.isoformat(), expires_at.isoformat() if expires_at else '')
+        for short_id, full_url, created_at, expires_at in rows
+    )
+    return buffer.getvalue().encode()
+
+
+async def export_short_urls(engine: AsyncEngine, fmt: str) -> AsyncIterator[bytes]:
+    # Серверный курсор с yield_per: в памяти одновременно не больше EXPORT_CHUNK_SIZE строк
+    if fmt == 'csv':
+        yield (','.join(EXPORT_COLUMNS) + '\n').encode()
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            select(ShortUrl.short_id, ShortUrl.full_url, ShortUrl.created_at, ShortUrl.expires_at)
+            .order_by(ShortUrl.id)
+            .execution_options(yield_per=EXPORT_CHUNK_SIZE)
+        )
+        async for partition in result.partitions():
+            yield encode_rows(partition, fmt)
+
+
+async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    buffer = b''
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def parse_timestamp(record: dict, key: str) -> Optional[datetime]:
+    value = record.get(key)
+    if not value:
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'{key} must be an ISO 8601 string')
+    value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_record(record) -> dict:
+    if not isinstance(record, dict):
+        raise ValueError('Row must be an object with short_id and full_url')
+    short_id = record.get('short_id')
+    if not isinstance(short_id, str) or not SHORT_ID_PATTERN.fullmatch(short_id):
+        raise ValueError('short_id must be 1-20 letters, digits or "-"')
+    if short_id in RESERVED_IDS:
+        raise ValueError(f'short_id "{short_id}" is reserved')
+    full_url = check_url(record.get('full_url'))
+    if len(full_url) > FULL_URL_MAX_LENGTH:
+        raise ValueError(f'URL must be at most {FULL_URL_MAX_LENGTH} characters')
+    return {
+        'short_id': short_id,
+        'full_url': full_url,
+        'url_hash': url_digest(full_url),
+        'created_at': parse_timestamp(record, 'created_at') or utcnow(),
+        'expires_at': parse_timestamp(record, 'expires_at'),
+    }
+
+
+async def insert_batch(engine: AsyncEngine, batch: dict[str, dict]) -> list[str]:
+    # Существующие id отсеиваются одним IN-запросом в той же транзакции,
+    # остальное уходит одним executemany
+    async with engine.begin() as conn:
+        existing = set(await conn.scalars(select(ShortUrl.short_id).where(ShortUrl.short_id.in_(list(batch)))))
+        rows = [row for short_id, row in batch.items() if short_id not in existing]
+        if rows:
+            await conn.execute(insert(ShortUrl), rows)
+    inserted = [row['short_id'] for row in rows]
+    for short_id in inserted:
+        short_id_filter.add(short_id)
+        redirect_cache.invalidate(short_id)
+    return inserted
+
+
+async def import_short_urls(
+    engine: AsyncEngine,
+    lines: AsyncIterable[bytes],
+    fmt: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+) -> dict:
+    report = {'rows': 0, 'inserted': 0, 'skipped': 0, 'invalid': 0}
+    errors = []
+    header = None
+    batch = {}
+    start = time.perf_counter()
+
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        line = line.rstrip(b'\r')
+        if not line.strip():
+            continue
+        if fmt == 'csv' and header is None:
+            header = next(csv.reader([line.decode('utf-8-sig')]))
+            if 'short_id' not in header or 'full_url' not in header:
+                raise ValueError('CSV header must contain short_id and full_url columns')
+            continue
+
+        report['rows'] += 1
+        try:
+            text = line.decode()
+            record = json.loads(text) if fmt == 'ndjson' else dict(zip(header, next(csv.reader([text]))))
+            row = parse_record(record)
+        except (ValueError, csv.Error) as e:
+            report['invalid'] += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'line': line_number, 'error': str(e)})
+            continue
+
+        if row['short_id'] in batch:
+            report['skipped'] += 1
+            continue
+        batch[row['short_id']] = row
+        if len(batch) >= batch_size:
+            inserted = await insert_batch(engine, batch)
+            report['inserted'] += len(inserted)
+            report['skipped'] += len(batch) - len(inserted)
+            batch = {}
+
+    if batch:
+        inserted = await insert_batch(engine, batch)
+        report['inserted'] += len(inserted)
+        report['skipped'] += len(batch) - len(inserted)
+
+    elapsed = time.perf_counter() - start
+    report['seconds'] = round(elapsed, 3)
+    report['rows_per_second'] = round(report['rows'] / elapsed) if elapsed else 0
+    report['errors'] = errors
+    return report
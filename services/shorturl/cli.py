@@ -0,0 +1,95 @@
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+
+import click
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:////app/data/shorturl.db')
+
+
+def detect_format(path: str, fmt: str) -> str:
+    if fmt != 'auto':
+        return fmt
+    return 'csv' if Path(path).suffix.lower() == '.csv' else 'ndjson'
+
+
+async def read_lines(stream):
+    # Построчное чтение файла: память не зависит от его размера
+    for line in stream:
+        yield line.rstrip(b'\n')
+
+
+@click.group()
+def cli():
+    pass
+
+
+@cli.command('export')
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'ndjson', 'csv']), default='auto', show_default=True,
+              help='Output format; auto picks by the output file extension.')
+@click.option('--output', '-o', default='-', show_default=True, help='Output file, "-" for stdout.')
+def export_command(fmt, output):
+    """Stream the short_urls table as NDJSON or CSV."""
+    from app import DB_READ_POOL_SIZE, build_engine
+    from app.transfer import export_short_urls
+
+    fmt = detect_format(output, fmt)
+
+    async def run(stream):
+        engine = build_engine(DATABASE_URL, DB_READ_POOL_SIZE, read_only=True)
+        try:
+            async for chunk in export_short_urls(engine, fmt):
+                stream.write(chunk)
+        finally:
+            await engine.dispose()
+
+    if output == '-':
+        asyncio.run(run(sys.stdout.buffer))
+    else:
+        with open(output, 'wb') as stream:
+            asyncio.run(run(stream))
+
+
+@cli.command('import')
+@click.argument('source', type=click.Path(allow_dash=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'ndjson', 'csv']), default='auto', show_default=True,
+              help='Input format; auto picks by the file extension.')
+@click.option('--batch-size', type=click.IntRange(min=1), default=None, help='Rows per INSERT batch.')
+def import_command(source, fmt, batch_size):
+    """Load short URLs from NDJSON or CSV; existing short IDs are skipped."""
+    from app import DB_WRITE_POOL_SIZE, build_engine
+    from app.transfer import IMPORT_BATCH_SIZE, import_short_urls
+
+    fmt = detect_format(source, fmt)
+
+    async def run(stream):
+        engine = build_engine(DATABASE_URL, DB_WRITE_POOL_SIZE, read_only=False)
+        try:
+            return await import_short_urls(engine, read_lines(stream), fmt, batch_size or IMPORT_BATCH_SIZE)
+        finally:
+            await engine.dispose()
+
+    try:
+        if source == '-':
+            report = asyncio.run(run(sys.stdin.buffer))
+        else:
+            with open(source, 'rb') as stream:
+                report = asyncio.run(run(stream))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(json.dumps(report, indent=2), err=True)
+    click.echo(
+        f'Imported {report["inserted"]} of {report["rows"]} rows in {report["seconds"]} s '
+        f'({report["rows_per_second"]} rows/s), skipped {report["skipped"]}, invalid {report["invalid"]}',
+        err=True,
+    )
+
+
+if __name__ == '__main__':
+    cli()
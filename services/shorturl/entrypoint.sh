@@ -1,3 +1,2 @@
 mkdir -p /app/data
-alembic upgrade head
-uvicorn main:app --host=0.0.0.0 --port=8001 --reload
+exec python main.py --migrate --port=8001
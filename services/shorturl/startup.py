@@ -0,0 +1,135 @@
+import math
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import closing
+from pathlib import Path
+from typing import Optional
+
+SERVICE_DIR = Path(__file__).resolve().parent
+VERSIONS_DIR = SERVICE_DIR / 'alembic' / 'versions'
+
+REVISION_PATTERN = re.compile(r'^revision\s*(?::[^=]*)?=\s*[\'"]([^\'"]+)[\'"]', re.MULTILINE)
+DOWN_REVISION_PATTERN = re.compile(r'^down_revision\s*(?::[^=]*)?=(.*)$', re.MULTILINE)
+QUOTED_PATTERN = re.compile(r'[\'"]([^\'"]+)[\'"]')
+
+CGROUP_CPU_MAX = Path('/sys/fs/cgroup/cpu.max')
+MAX_DEFAULT_WORKERS = 8
+
+
+def head_revisions(versions_dir: Path = VERSIONS_DIR) -> set[str]:
+    # Голова - ревизия, на которую не ссылается ни один down_revision. Файлы
+    # миграций читаются как текст, без импорта Alembic и самих миграций
+    revisions, parents = set(), set()
+    for path in versions_dir.glob('*.py'):
+        source = path.read_text(encoding='utf-8')
+        revision = REVISION_PATTERN.search(source)
+        if revision is None:
+            continue
+        revisions.add(revision.group(1))
+        down_revision = DOWN_REVISION_PATTERN.search(source)
+        if down_revision is not None:
+            parents.update(QUOTED_PATTERN.findall(down_revision.group(1)))
+    return revisions - parents
+
+
+def sqlite_path(database_url: str) -> Optional[Path]:
+    prefix, _, path = database_url.partition(':///')
+    if prefix.split('+')[0] != 'sqlite' or path in ('', ':memory:'):
+        return None
+    return Path(path.split('?')[0])
+
+
+def current_revisions(database_url: str) -> Optional[set[str]]:
+    # None, если дешево проверить нельзя (не SQLite) - тогда решает Alembic
+    path = sqlite_path(database_url)
+    if path is None:
+        return None
+    if not path.exists():
+        return set()
+    with closing(sqlite3.connect(f'file:{path}?mode=ro', uri=True)) as conn:
+        try:
+            return {row[0] for row in conn.execute('SELECT version_num FROM alembic_version')}
+        except sqlite3.OperationalError:
+            return set()
+
+
+def migrate(database_url: str) -> bool:
+    if current_revisions(database_url) == head_revisions():
+        return False
+    # Отдельным процессом: локальный пакет alembic/ перекрывает библиотеку в sys.path
+    subprocess.run(
+        [str(Path(sys.executable).with_name('alembic')), 'upgrade', 'head'],
+        cwd=SERVICE_DIR, check=True,
+    )
+    return True
+
+
+def cpu_quota(path: Path = CGROUP_CPU_MAX) -> Optional[int]:
+    # Квота CPU контейнера (cgroup v2): "max 100000" - без ограничения, "150000 100000" - 1.5 CPU
+    try:
+        quota, period = path.read_text().split()[:2]
+        if quota == 'max':
+            return None
+        return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        return None
+
+
+def default_workers(cpu_max_path: Path = CGROUP_CPU_MAX) -> int:
+    # CPU, доступные процессу (taskset, cpuset), но не больше квоты контейнера.
+    # У каждого воркера свои пулы соединений и кэши, поэтому число воркеров ограничено
+    if hasattr(os, 'process_cpu_count'):
+        cpus = os.process_cpu_count()
+    elif hasattr(os, 'sched_getaffinity'):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count()
+    cpus = cpus or 1
+    quota = cpu_quota(cpu_max_path)
+    if quota is not None:
+        cpus = min(cpus, quota)
+    return min(cpus, MAX_DEFAULT_WORKERS)
+
+
+def import_profile(top: int = 15) -> str:
+    # Импорт приложения в чистом процессе с -X importtime; собственное время
+    # модулей суммируется по пакетам верхнего уровня
+    probe = 'import time; start = time.perf_counter(); import main; main.app; print(time.perf_counter() - start)'
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=SERVICE_DIR, capture_output=True, text=True, check=True,
+    )
+    by_package = defaultdict(int)
+    app_modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        by_package[name.split('.')[0]] += int(self_us)
+        if name == 'app' or name.startswith('app.'):
+            app_modules.append((name, int(self_us)))
+
+    total = float(result.stdout.strip().splitlines()[-1])
+    lines = [f'Application import and create_app(): {total * 1000:.1f} ms', '', 'Self import time by package:']
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f'  {package:<32}{self_us / 1000:>9.1f} ms')
+    lines.extend(['', 'Service modules:'])
+    lines.extend(f'  {name:<32}{self_us / 1000:>9.1f} ms' for name, self_us in app_modules)
+    return '\n'.join(lines)
+
+
+def startup_profile(database_url: str) -> str:
+    start = time.perf_counter()
+    current, head = current_revisions(database_url), head_revisions()
+    elapsed = time.perf_counter() - start
+    if current is None:
+        state = 'not SQLite, Alembic will decide'
+    else:
+        state = 'up to date' if current == head else f'{sorted(current) or "empty"} -> {sorted(head)}'
+    return f'{import_profile()}\n\nRevision check: {elapsed * 1000:.1f} ms ({state})'
@@ -0,0 +1,99 @@
+import asyncio
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.admission import AdaptiveLimiter
+
+
+def make_limiter(**overrides):
+    options = {'max_limit': 2, 'min_limit': 1, 'max_queue': 1, 'queue_timeout': 0.05, 'target_latency': 0.1}
+    options.update(overrides)
+    return AdaptiveLimiter('read', **options)
+
+
+def test_limiter_queues_and_sheds():
+    async def run():
+        limiter = make_limiter()
+        assert await limiter.acquire() is None
+        assert await limiter.acquire() is None
+        # Лимит исчерпан: один запрос ждет в очереди, следующий сразу получает отказ
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.queued == 1
+        assert await limiter.acquire() == 'queue_full'
+        limiter.release(0.01)
+        assert await waiter is None
+        assert limiter.in_flight == 2
+        assert limiter.queued == 0
+        # Без освобождения места ожидание заканчивается по таймауту
+        assert await limiter.acquire() == 'timeout'
+        assert limiter.queued == 0
+
+    asyncio.run(run())
+
+
+def test_limiter_adapts_to_latency():
+    async def run():
+        limiter = make_limiter(max_limit=40, min_limit=4, max_queue=10)
+        for _ in range(40):
+            await limiter.acquire()
+        for _ in range(40):
+            limiter.release(0.5)
+        decreased = limiter.limit
+
+        for _ in range(20):
+            for _ in range(int(limiter.limit)):
+                await limiter.acquire()
+            for _ in range(int(limiter.limit)):
+                limiter.release(0.01)
+        return decreased, limiter.limit
+
+    decreased, recovered = asyncio.run(run())
+    assert decreased == pytest.approx(36)
+    assert recovered == 40
+
+
+def test_limiter_invalid_limits():
+    with pytest.raises(ValueError):
+        make_limiter(min_limit=3, max_limit=2)
+
+
+def test_admission_middleware_sheds_writes_separately():
+    app = create_app()
+    client = TestClient(app)
+    write = app.state.admission_limiters['write']
+    write.in_flight = int(write.limit)
+    write.max_queue = 0
+
+    response = client.post('/shorten', json={'url': 'https://example.com'})
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '1'
+    assert response.json()['detail'] == 'Service overloaded, retry later'
+    # Бюджет чтений не затронут
+    assert client.get('/openapi.json').status_code == 200
+    metrics = client.get('/metrics').text
+    assert f'http_requests_shed_total{{pid="{os.getpid()}",class="write",reason="queue_full"}} 1' in metrics
+    assert f'admission_in_flight{{pid="{os.getpid()}",class="write"}}' in metrics
+
+
+def test_limiter_wake_and_timeout_together(monkeypatch):
+    # Место освобождается в той же итерации цикла, где истекает ожидание в очереди
+    async def run():
+        limiter = make_limiter(max_limit=1)
+        assert await limiter.acquire() is None
+
+        async def wake_then_time_out(waiter, timeout):
+            limiter.release(0.01)
+            assert waiter.done()
+            raise asyncio.TimeoutError
+
+        monkeypatch.setattr(asyncio, 'wait_for', wake_then_time_out)
+        assert await limiter.acquire() is None
+        assert limiter.in_flight == 1
+        limiter.release(0.01)
+        assert limiter.in_flight == 0
+
+    asyncio.run(run())
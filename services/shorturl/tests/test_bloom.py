@@ -0,0 +1,86 @@
+import asyncio
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.bloom import BloomFilter, ShortIdFilter
+from app.models import AbstractModel, ShortUrl
+
+
+def test_bloom_filter_membership():
+    bloom = BloomFilter(capacity=1000, fp_rate=0.01, max_bytes=1024 * 1024)
+    keys = [f'key{i}' for i in range(1000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f'other{i}' in bloom for i in range(10000))
+    assert false_positives < 300
+    assert bloom.estimated_fp_rate() < 0.02
+
+
+def test_bloom_filter_memory_budget():
+    bloom = BloomFilter(capacity=1_000_000, fp_rate=0.001, max_bytes=1024)
+    assert bloom.memory_bytes == 1024
+
+
+def test_short_id_filter_load_and_sync():
+    async def run():
+        engine = create_async_engine('sqlite+aiosqlite://')
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+            await conn.execute(insert(ShortUrl), [{'short_id': 'aaa', 'full_url': 'https://a.com'}])
+
+        short_id_filter = ShortIdFilter(
+            enabled=True, capacity=1000, fp_rate=0.01, max_bytes=1024 * 1024, sync_interval=1,
+        )
+        before_load = short_id_filter.might_contain('zzz')
+        await short_id_filter.load(engine)
+        loaded = short_id_filter.might_contain('aaa'), short_id_filter.might_contain('bbb')
+
+        async with engine.begin() as conn:
+            await conn.execute(insert(ShortUrl), [{'short_id': 'bbb', 'full_url': 'https://b.com'}])
+        await short_id_filter.sync(engine)
+        synced = short_id_filter.might_contain('bbb')
+        await engine.dispose()
+        return before_load, loaded, synced, short_id_filter.rejected
+
+    before_load, loaded, synced, rejected = asyncio.run(run())
+    assert before_load is True
+    assert loaded == (True, False)
+    assert synced is True
+    assert rejected == 1
+
+
+def test_short_id_filter_sees_other_worker_inserts(tmp_path):
+    # Два воркера со своими фильтрами и общим счетчиком вставок
+    async def run():
+        engine = create_async_engine(f'sqlite+aiosqlite:///{tmp_path / "shorturl.db"}')
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+        first, second = (
+            ShortIdFilter(
+                enabled=True, capacity=1000, fp_rate=0.01, max_bytes=1024 * 1024, sync_interval=60,
+                generation_path=str(tmp_path / 'generation'),
+            )
+            for _ in range(2)
+        )
+        for short_id_filter in (first, second):
+            short_id_filter.open()
+            await short_id_filter.load(engine)
+
+        # Первый воркер создает ссылку: второй до синхронизации не может ответить "нет"
+        async with engine.begin() as conn:
+            await conn.execute(insert(ShortUrl), [{'short_id': 'new', 'full_url': 'https://n.com'}])
+        first.add('new')
+        results = [first.might_contain('zzz'), second.might_contain('new')]
+        await second.sync(engine)
+        results += [second.might_contain('new'), second.might_contain('zzz')]
+        counters = (first.rejected, second.rejected, second.stale)
+        first.reset()
+        second.reset()
+        await engine.dispose()
+        return results, counters
+
+    results, counters = asyncio.run(run())
+    assert results == [False, True, True, False]
+    assert counters == (1, 1, 1)
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+from app.cache import LRUCache, MISS
+
+
+def test_get_set():
+    cache = LRUCache(max_size=10, ttl=60, negative_ttl=10)
+    assert cache.get('a') is MISS
+    cache.set('a', 'https://example.com')
+    assert cache.get('a') == 'https://example.com'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_negative_entry():
+    cache = LRUCache(max_size=10, ttl=60, negative_ttl=10)
+    cache.set('a', None)
+    assert cache.get('a') is None
+    assert cache.stats()['negative_hits'] == 1
+
+
+def test_lru_eviction():
+    cache = LRUCache(max_size=2, ttl=60, negative_ttl=10)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    cache.get('a')
+    cache.set('c', '3')
+    assert cache.get('b') is MISS
+    assert cache.get('a') == '1'
+    assert cache.get('c') == '3'
+    assert cache.stats()['evictions'] == 1
+
+
+def test_ttl_expiration():
+    cache = LRUCache(max_size=10, ttl=60, negative_ttl=10)
+    with patch('app.cache.time.monotonic', return_value=100.0):
+        cache.set('a', '1')
+        cache.set('b', None)
+    with patch('app.cache.time.monotonic', return_value=120.0):
+        assert cache.get('a') == '1'
+        assert cache.get('b') is MISS
+    with patch('app.cache.time.monotonic', return_value=161.0):
+        assert cache.get('a') is MISS
+    assert cache.stats()['expirations'] == 2
+
+
+def test_disabled():
+    cache = LRUCache(max_size=0, ttl=60, negative_ttl=10)
+    cache.set('a', '1')
+    assert cache.get('a') is MISS
@@ -0,0 +1,77 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.clicks import ClickAggregator
+from app.models import AbstractModel, ShortUrlClicks
+
+
+async def flush_twice(aggregator):
+    engine = create_async_engine('sqlite+aiosqlite://')
+    async with engine.begin() as conn:
+        await conn.run_sync(AbstractModel.metadata.create_all)
+
+    for _ in range(3):
+        aggregator.record('a')
+    aggregator.record('b')
+    first = await aggregator.flush(engine)
+
+    aggregator.record('a')
+    second = await aggregator.flush(engine)
+    empty = await aggregator.flush(engine)
+
+    async with engine.connect() as conn:
+        rows = (await conn.execute(
+            select(ShortUrlClicks.short_id, ShortUrlClicks.clicks).order_by(ShortUrlClicks.short_id)
+        )).all()
+    await engine.dispose()
+    return first, second, empty, rows
+
+
+def test_flush_upserts_deltas():
+    aggregator = ClickAggregator(interval=1, max_events=100)
+    first, second, empty, rows = asyncio.run(flush_twice(aggregator))
+    assert (first, second, empty) == (4, 1, 0)
+    assert [tuple(row) for row in rows] == [('a', 4), ('b', 1)]
+    assert aggregator.pending('a') is None
+
+
+def test_failed_flush_keeps_deltas():
+    async def run():
+        engine = create_async_engine('sqlite+aiosqlite://')  # таблицы нет
+        aggregator = ClickAggregator(interval=1, max_events=100)
+        aggregator.record('a')
+        try:
+            await aggregator.flush(engine)
+        except Exception:
+            pass
+        aggregator.record('a')
+        await engine.dispose()
+        return aggregator
+
+    aggregator = asyncio.run(run())
+    assert aggregator.pending('a')[0] == 2
+    assert aggregator.failed_flushes == 1
+
+
+def test_run_flushes_after_max_events():
+    async def run():
+        engine = create_async_engine('sqlite+aiosqlite://')
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+        aggregator = ClickAggregator(interval=60, max_events=2)
+        task = asyncio.create_task(aggregator.run(engine))
+        await asyncio.sleep(0)
+        aggregator.record('a')
+        aggregator.record('a')
+        for _ in range(100):
+            if aggregator.flushed_events:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await engine.dispose()
+        return aggregator
+
+    assert asyncio.run(run()).flushed_events == 2
@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app import create_app, get_db, get_read_db
+from app.cache import redirect_cache, MISS
+from app.expiry import ExpiryPurger
+from app.models import AbstractModel, ShortUrl, ShortUrlClicks, utcnow
+from app.redirects import EXPIRED, cache_short_url, redirect_cache_control
+
+
+@pytest.fixture
+def client():
+    redirect_cache.clear()
+    app = create_app()
+    session = MagicMock(spec=AsyncSession)
+    session.execute.return_value = MagicMock()
+    app.dependency_overrides[get_db] = lambda: session
+    app.dependency_overrides[get_read_db] = lambda: session
+    yield TestClient(app), session
+    app.dependency_overrides.clear()
+
+
+def test_shorten_rejects_past_expiry(client):
+    client, _ = client
+    response = client.post('/shorten', json={
+        'url': 'https://example.com', 'expires_at': '2020-01-01T00:00:00Z',
+    })
+    assert response.status_code == 422
+
+
+def test_redirect_expired(client):
+    client, session = client
+    session.execute.return_value.first.return_value = SimpleNamespace(
+        full_url='https://example.com', expires_at=utcnow() - timedelta(minutes=1),
+    )
+
+    response = client.get('/abc12345', follow_redirects=False)
+    assert response.status_code == 410
+    # Истекшая ссылка кэшируется как EXPIRED, повторный запрос не идет в БД
+    assert client.get('/abc12345', follow_redirects=False).status_code == 410
+    assert session.execute.await_count == 1
+
+
+def test_cache_ttl_capped_by_expiry():
+    redirect_cache.clear()
+    assert cache_short_url('abc', 'https://example.com', utcnow() + timedelta(seconds=1)) == 'https://example.com'
+    deadline, value = redirect_cache._data['abc']
+    assert value == 'https://example.com'
+    assert deadline <= time.monotonic() + 1
+
+    assert cache_short_url('old', 'https://example.com', utcnow() - timedelta(seconds=1)) is EXPIRED
+    assert redirect_cache.get('old') is EXPIRED
+    redirect_cache.clear()
+
+
+def test_redirect_cache_control_capped_by_expiry():
+    full_url = cache_short_url('abc', 'https://example.com', utcnow() + timedelta(seconds=30))
+    with patch('app.redirects.REDIRECT_CACHE_CONTROL', 'public, max-age=3600, s-maxage=10'):
+        assert redirect_cache_control(full_url) in (
+            'public, max-age=30, s-maxage=10', 'public, max-age=29, s-maxage=10',
+        )
+        assert redirect_cache_control('https://example.com') == 'public, max-age=3600, s-maxage=10'
+    redirect_cache.clear()
+
+
+async def purge(purger: ExpiryPurger):
+    engine = create_async_engine('sqlite+aiosqlite://')
+    now = utcnow()
+    async with engine.begin() as conn:
+        await conn.run_sync(AbstractModel.metadata.create_all)
+        await conn.execute(ShortUrl.__table__.insert(), [
+            {'short_id': f'old{i}', 'full_url': 'https://example.com', 'expires_at': now - timedelta(days=2)}
+            for i in range(5)
+        ] + [
+            {'short_id': 'recent', 'full_url': 'https://example.com', 'expires_at': now - timedelta(minutes=1)},
+            {'short_id': 'future', 'full_url': 'https://example.com', 'expires_at': now + timedelta(days=1)},
+            {'short_id': 'forever', 'full_url': 'https://example.com', 'expires_at': None},
+        ])
+        await conn.execute(ShortUrlClicks.__table__.insert(), [{'short_id': 'old0', 'clicks': 3}])
+
+    redirect_cache.set('old0', EXPIRED)
+    total = await purger.purge(engine)
+    async with engine.connect() as conn:
+        left = set(await conn.scalars(select(ShortUrl.short_id)))
+        clicks = list(await conn.scalars(select(ShortUrlClicks.short_id)))
+    await engine.dispose()
+    return total, left, clicks
+
+
+def test_purge_in_batches():
+    purger = ExpiryPurger(interval=60, batch_size=2, retention=3600)
+    redirect_cache.clear()
+
+    total, left, clicks = asyncio.run(purge(purger))
+
+    assert total == 5
+    assert purger.purged == 5
+    # Истекшие недавно остаются до конца retention и продолжают отвечать 410
+    assert left == {'recent', 'future', 'forever'}
+    assert clicks == []
+    assert redirect_cache.get('old0') is MISS
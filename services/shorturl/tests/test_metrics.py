@@ -0,0 +1,96 @@
+import asyncio
+import os
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import create_app
+from app.metrics import Histogram, MetricsRegistry, RequestStats, current_request, instrument_engine, registry
+from app.models import AbstractModel, ShortUrl
+
+
+def test_histogram_buckets():
+    histogram = Histogram((0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.count == 4
+    assert histogram.sum == 5.65
+
+
+def test_render_prometheus_text():
+    metrics = MetricsRegistry()
+    requests = metrics.counter('requests_total', 'Requests.')
+    requests[(('route', '/a"b'),)] = 2
+    metrics.histogram('latency_seconds', 'Latency.', (0.1, 1.0))
+    metrics.observe('latency_seconds', (('route', '/a'),), 0.5)
+    metrics.add_collector('extra', lambda: [('extra_items', 'gauge', 'Items.', [((), 7)])])
+
+    lines = metrics.render().splitlines()
+    assert '# TYPE requests_total counter' in lines
+    assert 'requests_total{route="/a\\"b"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 0' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1.0"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 1' in lines
+    assert 'latency_seconds_count{route="/a"} 1' in lines
+    assert 'extra_items 7' in lines
+
+
+def test_render_pid_label():
+    metrics = MetricsRegistry(pid_label=True)
+    metrics.counter('requests_total', 'Requests.')[(('route', '/a'),)] = 1
+    metrics.histogram('latency_seconds', 'Latency.', (1.0,))
+    metrics.observe('latency_seconds', (), 0.5)
+    metrics.add_collector('extra', lambda: [('extra_items', 'gauge', 'Items.', [((), 7)])])
+
+    pid = os.getpid()
+    lines = metrics.render().splitlines()
+    assert f'requests_total{{pid="{pid}",route="/a"}} 1' in lines
+    assert f'latency_seconds_bucket{{pid="{pid}",le="1.0"}} 1' in lines
+    assert f'latency_seconds_count{{pid="{pid}"}} 1' in lines
+    assert f'extra_items{{pid="{pid}"}} 7' in lines
+
+
+async def run_instrumented_queries():
+    engine = create_async_engine('sqlite+aiosqlite://')
+    instrument_engine(engine, 'test')
+    async with engine.begin() as conn:
+        await conn.run_sync(AbstractModel.metadata.create_all)
+
+    stats = RequestStats()
+    token = current_request.set(stats)
+    try:
+        async with engine.connect() as conn:
+            await conn.execute(select(ShortUrl.id))
+            await conn.execute(select(ShortUrl.short_id))
+    finally:
+        current_request.reset(token)
+    await engine.dispose()
+    return stats
+
+
+def test_instrument_engine_counts_request_queries():
+    registry.clear()
+    stats = asyncio.run(run_instrumented_queries())
+    assert stats.queries == 2
+    assert stats.query_seconds > 0
+    assert registry._histograms['db_query_duration_seconds'][(('engine', 'test'),)].count >= 2
+    assert registry._histograms['db_pool_checkout_duration_seconds'][(('engine', 'test'),)].count >= 1
+
+
+def test_metrics_endpoint_labels_routes():
+    registry.clear()
+    client = TestClient(create_app())
+    client.post('/stats/abc12345')
+    client.get('/openapi.json')
+    client.get('/a/b/c')
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain; version=0.0.4')
+    pid = os.getpid()
+    assert f'http_requests_total{{pid="{pid}",method="POST",route="/stats/{{short_id}}",status="405"}} 1' in response.text
+    assert f'http_requests_total{{pid="{pid}",method="GET",route="/openapi.json",status="200"}} 1' in response.text
+    assert f'http_requests_total{{pid="{pid}",method="GET",route="<unmatched>",status="404"}} 1' in response.text
+    assert 'redirect_cache_hits_total' in response.text
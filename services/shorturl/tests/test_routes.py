@@ -1,19 +1,27 @@
 import os
+from types import SimpleNamespace
 from datetime import datetime, timezone
 from unittest.mock import MagicMock, patch
 
 import pytest
 from dotenv import load_dotenv
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app import create_app, get_db
-from app.models import ShortUrl
+from app import create_app, get_db, get_read_db
+from app.bloom import BloomFilter, short_id_filter
+from app.cache import redirect_cache
+from app.clicks import click_aggregator
+from app.models import ShortUrl, url_digest
 
 load_dotenv()
 
 
 @pytest.fixture
 def app():
+    redirect_cache.clear()
+    click_aggregator.clear()
     app = create_app()
     return app
 
@@ -34,9 +42,26 @@ def mock_short_url():
     return short_url
 
 
+@pytest.fixture
+def mock_stats_row(mock_short_url):
+    return SimpleNamespace(
+        short_id=mock_short_url.short_id,
+        full_url=mock_short_url.full_url,
+        created_at=mock_short_url.created_at,
+        clicks=3,
+        last_accessed_at=None,
+    )
+
+
+def url_row(full_url, expires_at=None):
+    return SimpleNamespace(full_url=full_url, expires_at=expires_at)
+
+
 @pytest.fixture
 def mock_db_session():
-    return MagicMock()
+    session = MagicMock(spec=AsyncSession)
+    session.execute.return_value = MagicMock()  # Result синхронный
+    return session
 
 
 def test_shorten_url(client, mock_db_session):
@@ -46,32 +71,21 @@ def test_shorten_url(client, mock_db_session):
 
     short_id = 'abc12345'
 
-    mock_short_url = ShortUrl(
-        id=1,
-        short_id=short_id,
-        full_url='https://example.com/very/long/url/path',
-        created_at=datetime.now(timezone.utc)
-    )
-
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.return_value = None  # short_id не существует
-    mock_db_session.query.return_value = mock_query
-
     port = os.getenv('URL_SERVICE_PORT', 8000)
 
-    with patch('app.routes.ShortUrl') as mock_short_url_class:
-        mock_short_url_class.return_value = mock_short_url
-        with patch('app.routes.generate_short_id', return_value='abc12345'):
-            client.app.dependency_overrides[get_db] = lambda: mock_db_session
-            try:
-                response = client.post('/shorten', json=data)
-                assert response.status_code == 201
-                assert response.json()['short_id'] == short_id
-                assert response.json()['short_url'] == f'http://127.0.0.1:{port}/{short_id}'
-                mock_db_session.add.assert_called_once()
-                mock_db_session.commit.assert_called_once()
-            finally:
-                client.app.dependency_overrides.clear()
+    with patch('app.short_ids.generate_short_id', return_value='abc12345'):
+        client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+        try:
+            response = client.post('/shorten', json=data)
+            assert response.status_code == 201
+            assert response.json()['short_id'] == short_id
+            assert response.json()['short_url'] == f'http://127.0.0.1:{port}/{short_id}'
+            mock_db_session.add.assert_called_once()
+            mock_db_session.commit.assert_awaited_once()
+            mock_db_session.scalar.assert_not_awaited()  # без проверки существования
+        finally:
+            client.app.dependency_overrides.clear()
 
 
 def test_shorten_url_validation_error_invalid_url(client):
@@ -91,11 +105,11 @@ def test_shorten_url_validation_error_missing_url(client):
 
 
 def test_redirect_url(client, mock_short_url, mock_db_session):
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.return_value = mock_short_url
-    mock_db_session.query.return_value = mock_query
+    mock_db_session.execute.return_value.first.return_value = url_row(mock_short_url.full_url)
 
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/abc12345', follow_redirects=False)
         assert response.status_code == 301  # Temporary Redirect
@@ -105,11 +119,11 @@ def test_redirect_url(client, mock_short_url, mock_db_session):
 
 
 def test_redirect_url_not_found(client, mock_db_session):
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.return_value = None
-    mock_db_session.query.return_value = mock_query
+    mock_db_session.execute.return_value.first.return_value = None
 
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/nonexistent', follow_redirects=False)
         assert response.status_code == 404
@@ -118,28 +132,45 @@ def test_redirect_url_not_found(client, mock_db_session):
         client.app.dependency_overrides.clear()
 
 
-def test_get_stats(client, mock_short_url, mock_db_session):
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.return_value = mock_short_url
-    mock_db_session.query.return_value = mock_query
+def test_get_stats(client, mock_stats_row, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = mock_stats_row
 
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/stats/abc12345')
         assert response.status_code == 200
         assert response.json()['short_id'] == 'abc12345'
         assert response.json()['full_url'] == 'https://example.com/very/long/url/path'
         assert 'created_at' in response.json()
+        assert response.json()['clicks'] == 3
+        assert response.json()['last_accessed_at'] is None
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_get_stats_fast_response_matches_validated(client, mock_stats_row, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = mock_stats_row
+    click_aggregator.record('abc12345')
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        fast = client.get('/stats/abc12345')
+        with patch('app.routes.stats_serializer.enabled', False):
+            validated = client.get('/stats/abc12345')
+        assert fast.content == validated.content
+        assert fast.json()['clicks'] == 4
     finally:
         client.app.dependency_overrides.clear()
 
 
 def test_get_stats_not_found(client, mock_db_session):
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.return_value = None
-    mock_db_session.query.return_value = mock_query
+    mock_db_session.execute.return_value.first.return_value = None
 
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/stats/nonexistent')
         assert response.status_code == 404
@@ -153,63 +184,36 @@ def test_shorten_url_duplicate_short_id(client, mock_db_session):
         'url': 'https://example.com/another/url'
     }
 
-    existing_short_url = ShortUrl(
-        id=1,
-        short_id='abc12345',
-        full_url='https://example.com/existing',
-        created_at=datetime.now(timezone.utc)
-    )
-
     short_id = 'xyz98765'
 
-    new_short_url = ShortUrl(
-        id=2,
-        short_id=short_id,
-        full_url='https://example.com/another/url',
-        created_at=datetime.now(timezone.utc)
-    )
-
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.side_effect = [existing_short_url, None]
-    mock_db_session.query.return_value = mock_query
+    # Первая вставка упирается в уникальный индекс short_id
+    mock_db_session.commit.side_effect = [IntegrityError('INSERT', {}, Exception('UNIQUE constraint failed')), None]
 
     port = os.environ.get('URL_SERVICE_PORT', 8000)
 
-    with patch('app.routes.ShortUrl') as mock_short_url_class:
-        mock_short_url_class.return_value = new_short_url
-        with patch('app.routes.generate_short_id', side_effect=['abc12345', 'xyz98765']):
-            client.app.dependency_overrides[get_db] = lambda: mock_db_session
-            try:
-                response = client.post('/shorten', json=data)
-                assert response.status_code == 201
-                assert response.json()['short_id'] == short_id
-                assert response.json()['short_url'] == f'http://127.0.0.1:{port}/{short_id}'
-                mock_db_session.add.assert_called_once()
-                mock_db_session.commit.assert_called_once()
-            finally:
-                client.app.dependency_overrides.clear()
+    with patch('app.short_ids.generate_short_id', side_effect=['abc12345', 'xyz98765']):
+        client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+        try:
+            response = client.post('/shorten', json=data)
+            assert response.status_code == 201
+            assert response.json()['short_id'] == short_id
+            assert response.json()['short_url'] == f'http://127.0.0.1:{port}/{short_id}'
+            assert mock_db_session.add.call_count == 2
+            assert mock_db_session.commit.await_count == 2
+            mock_db_session.rollback.assert_awaited_once()
+        finally:
+            client.app.dependency_overrides.clear()
 
 
 def test_redirect_url_different_short_ids(client, mock_db_session):
-    short_url_1 = ShortUrl(
-        id=1,
-        short_id='id1',
-        full_url='https://example.com/url1',
-        created_at=datetime.now(timezone.utc)
-    )
-
-    short_url_2 = ShortUrl(
-        id=2,
-        short_id='id2',
-        full_url='https://example.com/url2',
-        created_at=datetime.now(timezone.utc)
-    )
-
-    mock_query = MagicMock()
-    mock_query.filter.return_value.first.side_effect = [short_url_1, short_url_2]
-    mock_db_session.query.return_value = mock_query
+    mock_db_session.execute.return_value.first.side_effect = [
+        url_row('https://example.com/url1'), url_row('https://example.com/url2'),
+    ]
 
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response1 = client.get('/id1', follow_redirects=False)
         assert response1.status_code == 301
@@ -220,3 +224,254 @@ def test_redirect_url_different_short_ids(client, mock_db_session):
         assert response2.headers['location'] == 'https://example.com/url2'
     finally:
         client.app.dependency_overrides.clear()
+
+
+def test_redirect_url_cached(client, mock_short_url, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = url_row(mock_short_url.full_url)
+
+    client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response1 = client.get('/abc12345', follow_redirects=False)
+        response2 = client.get('/abc12345', follow_redirects=False)
+        assert response1.status_code == 301
+        assert response2.status_code == 301
+        assert response2.headers['location'] == 'https://example.com/very/long/url/path'
+        assert mock_db_session.execute.await_count == 1
+        assert redirect_cache.stats()['hits'] == 1
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_redirect_url_not_found_cached(client, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = None
+
+    client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        assert client.get('/nonexistent', follow_redirects=False).status_code == 404
+        assert client.get('/nonexistent', follow_redirects=False).status_code == 404
+        assert mock_db_session.execute.await_count == 1
+        assert redirect_cache.stats()['negative_hits'] == 1
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_shorten_batch(client, mock_db_session):
+    data = {
+        'urls': ['https://example.com/1', 'not-a-valid-url', 'https://example.com/2']
+    }
+
+    port = os.getenv('URL_SERVICE_PORT', 8000)
+
+    with patch('app.short_ids.generate_short_id', side_effect=['id000001', 'id000002']):
+        client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+        try:
+            response = client.post('/shorten/batch', json=data)
+            assert response.status_code == 200
+            body = response.json()
+            assert body['created'] == 2
+            assert body['failed'] == 1
+            assert [item['index'] for item in body['results']] == [0, 1, 2]
+            assert body['results'][0]['short_id'] == 'id000001'
+            assert body['results'][0]['short_url'] == f'http://127.0.0.1:{port}/id000001'
+            assert body['results'][1]['short_id'] is None
+            assert 'scheme' in body['results'][1]['error']
+            assert body['results'][2]['short_id'] == 'id000002'
+
+            # Одна executemany-вставка и один коммит на весь пакет
+            mock_db_session.execute.assert_awaited_once()
+            rows = mock_db_session.execute.await_args.args[1]
+            assert [(row['short_id'], row['full_url']) for row in rows] == [
+                ('id000001', 'https://example.com/1'),
+                ('id000002', 'https://example.com/2'),
+            ]
+            assert rows[0]['url_hash'] == url_digest('https://example.com/1')
+            mock_db_session.commit.assert_awaited_once()
+        finally:
+            client.app.dependency_overrides.clear()
+
+
+def test_shorten_batch_all_invalid(client, mock_db_session):
+    client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response = client.post('/shorten/batch', json={'urls': ['ftp://example.com']})
+        assert response.status_code == 200
+        assert response.json()['created'] == 0
+        assert response.json()['failed'] == 1
+        mock_db_session.execute.assert_not_awaited()
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_shorten_batch_validation_error_empty(client):
+    response = client.post('/shorten/batch', json={'urls': []})
+    assert response.status_code == 422
+
+
+def test_redirect_url_counts_clicks(client, mock_short_url, mock_stats_row, mock_db_session):
+    mock_db_session.execute.return_value.first.side_effect = [url_row(mock_short_url.full_url), mock_stats_row]
+
+    client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        client.get('/abc12345', follow_redirects=False)
+        client.get('/abc12345', follow_redirects=False)
+        assert click_aggregator.pending('abc12345')[0] == 2
+        mock_db_session.commit.assert_not_awaited()  # запись в БД только фоновым сбросом
+
+        response = client.get('/stats/abc12345')
+        assert response.json()['clicks'] == 5
+        # Время из несброшенных кликов в том же формате, что и из БД: UTC без суффикса Z
+        last_accessed_at = response.json()['last_accessed_at']
+        assert datetime.fromisoformat(last_accessed_at).tzinfo is None
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_redirect_url_rejected_by_filter(client, mock_db_session):
+    short_id_filter.bloom = BloomFilter(capacity=100, fp_rate=0.01, max_bytes=1024)
+    short_id_filter.bloom.add('abc12345')
+    short_id_filter.ready = True
+
+    client.app.dependency_overrides[get_db] = lambda: mock_db_session
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response = client.get('/wp-login.php', follow_redirects=False)
+        assert response.status_code == 404
+        mock_db_session.execute.assert_not_awaited()
+    finally:
+        client.app.dependency_overrides.clear()
+        short_id_filter.reset()
+
+
+def test_shorten_url_dedupe(client, mock_db_session):
+    mock_db_session.execute.return_value.all.return_value = [
+        ('https://example.com/very/long/url/path', 'abc12345'),
+    ]
+
+    with patch('app.routes.SHORTEN_DEDUPE', True):
+        client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+        try:
+            response = client.post('/shorten', json={'url': 'https://example.com/very/long/url/path'})
+            assert response.status_code == 200
+            assert response.json()['short_id'] == 'abc12345'
+            mock_db_session.add.assert_not_called()
+            mock_db_session.commit.assert_not_awaited()
+        finally:
+            client.app.dependency_overrides.clear()
+
+
+def test_shorten_url_dedupe_hash_collision(client, mock_db_session):
+    # Совпал хеш, но не URL: создаем новую запись
+    mock_db_session.execute.return_value.all.return_value = [('https://example.com/other', 'abc12345')]
+
+    with patch('app.routes.SHORTEN_DEDUPE', True), patch('app.short_ids.generate_short_id', return_value='new12345'):
+        client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+        try:
+            response = client.post('/shorten', json={'url': 'https://example.com/very/long/url/path'})
+            assert response.status_code == 201
+            assert response.json()['short_id'] == 'new12345'
+            mock_db_session.add.assert_called_once()
+        finally:
+            client.app.dependency_overrides.clear()
+
+
+def test_shorten_batch_dedupe(client, mock_db_session):
+    lookup = MagicMock()
+    lookup.all.return_value = [('https://example.com/1', 'old00001')]
+    mock_db_session.execute.side_effect = [lookup, MagicMock()]
+    data = {
+        'urls': ['https://example.com/1', 'https://example.com/2', 'https://example.com/2']
+    }
+
+    with patch('app.routes.SHORTEN_DEDUPE', True), patch('app.short_ids.generate_short_id', return_value='new00001'):
+        client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+        try:
+            response = client.post('/shorten/batch', json=data)
+            body = response.json()
+            assert body['created'] == 1
+            assert body['deduplicated'] == 2
+            assert [item['short_id'] for item in body['results']] == ['old00001', 'new00001', 'new00001']
+            rows = mock_db_session.execute.await_args_list[1].args[1]
+            assert [row['full_url'] for row in rows] == ['https://example.com/2']
+        finally:
+            client.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def fast_client(mock_db_session):
+    redirect_cache.clear()
+    click_aggregator.clear()
+    mock_db_session.__aenter__.return_value = mock_db_session
+    with patch('app.redirects.REDIRECT_FAST_PATH', True), patch('app.ReadSessionLocal', return_value=mock_db_session):
+        yield TestClient(create_app())
+
+
+def test_redirect_fast_path(fast_client, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = url_row('https://example.com/path?q=1 2')
+
+    response = fast_client.get('/abc12345', follow_redirects=False)
+    assert response.status_code == 301
+    assert response.headers['location'] == 'https://example.com/path?q=1%202'
+    assert response.headers['cache-control'] == 'public, max-age=60'
+    assert click_aggregator.pending('abc12345')[0] == 1
+
+    # Повторный запрос обслуживается из кэша
+    fast_client.get('/abc12345', follow_redirects=False)
+    assert mock_db_session.execute.await_count == 1
+
+
+def test_redirect_fast_path_falls_through(fast_client, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = None
+
+    fast_client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        assert fast_client.get('/nonexistent', follow_redirects=False).status_code == 404
+        assert fast_client.get('/openapi.json').status_code == 200
+        assert fast_client.get('/stats/abc12345').status_code == 404
+    finally:
+        fast_client.app.dependency_overrides.clear()
+
+
+def test_redirect_cache_control(client, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = url_row('https://example.com')
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response = client.get('/abc12345', follow_redirects=False)
+        assert response.headers['cache-control'] == 'public, max-age=60'
+        with patch('app.redirects.REDIRECT_CACHE_CONTROL', ''):
+            assert 'cache-control' not in client.get('/abc12345', follow_redirects=False).headers
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_get_stats_conditional(client, mock_stats_row, mock_db_session):
+    mock_db_session.execute.return_value.first.return_value = mock_stats_row
+
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response = client.get('/stats/abc12345')
+        etag = response.headers['etag']
+        assert etag == '"3-0"'
+        assert response.headers['cache-control'] == 'no-cache'
+        assert 'last-modified' in response.headers
+
+        assert client.get('/stats/abc12345', headers={'If-None-Match': etag}).status_code == 304
+        # Новый клик меняет ETag
+        click_aggregator.record('abc12345')
+        response = client.get('/stats/abc12345', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['etag'] != etag
+    finally:
+        client.app.dependency_overrides.clear()
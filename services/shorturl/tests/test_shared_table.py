@@ -0,0 +1,157 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.models import AbstractModel, ShortUrl
+from app.redirects import resolve_short_id
+from app.shared_table import LOADING, READY, SharedRedirectTable, database_identity
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+
+def make_table(path, **overrides):
+    options = {'enabled': True, 'path': str(path), 'capacity': 100, 'heap_size': 4096, 'segments': 4}
+    options.update(overrides)
+    table = SharedRedirectTable(**options)
+    table.open()
+    return table
+
+
+def test_shared_table_add_and_get(tmp_path):
+    table = make_table(tmp_path / 'table')
+    assert table.get('abc') is None
+    assert table.add('abc', 'https://example.com/путь')
+    assert table.add('abc', 'https://other.com')
+    assert table.get('abc') == 'https://example.com/путь'
+    assert table.count == 1
+    assert (table.hits, table.misses) == (1, 1)
+    table.close()
+    assert table.get('abc') is None
+    assert not table.add('abc', 'https://example.com')
+
+
+def test_shared_table_visible_to_other_processes(tmp_path):
+    path = tmp_path / 'table'
+    table = make_table(path)
+    table.add('abc', 'https://a.com')
+    script = (
+        'from app.shared_table import SharedRedirectTable\n'
+        f'table = SharedRedirectTable(True, {str(path)!r}, 100, 4096, 4)\n'
+        'table.open()\n'
+        'assert table.get("abc") == "https://a.com"\n'
+        'table.add("def", "https://d.com")\n'
+    )
+    subprocess.run([sys.executable, '-c', script], cwd=SERVICE_DIR, check=True)
+    assert table.get('def') == 'https://d.com'
+    # Второе подключение с той же конфигурацией не пересоздает файл
+    other = make_table(path)
+    assert other.count == 2
+    other.close()
+    table.close()
+
+
+def test_shared_table_layout_change_recreates_file(tmp_path):
+    path = tmp_path / 'table'
+    table = make_table(path)
+    table.add('abc', 'https://a.com')
+    table.close()
+    table = make_table(path, segments=8)
+    assert table.get('abc') is None
+    assert table.count == 0
+    table.close()
+
+
+def test_shared_table_full(tmp_path):
+    table = make_table(tmp_path / 'table', capacity=3, heap_size=64, segments=1)
+    assert table.add_many([('a', 'https://a.com'), ('b', 'https://b.com'), ('c', 'https://c.com')]) == 3
+    assert not table.add('d', 'https://d.com')
+    assert table.rejected == 1
+    table.close()
+
+    table = make_table(tmp_path / 'small', heap_size=20)
+    assert table.add('a', 'https://a.com')
+    assert not table.add('b', 'https://b.com')
+    table.close()
+
+
+def test_shared_table_single_loader(tmp_path):
+    async def run():
+        engine = create_async_engine('sqlite+aiosqlite://')
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+            await conn.execute(insert(ShortUrl), [
+                {'short_id': f'id{i}', 'full_url': f'https://example.com/{i}', 'expires_at': None}
+                for i in range(50)
+            ])
+        first = make_table(tmp_path / 'table')
+        second = make_table(tmp_path / 'table')
+        loaded = await first.load(engine), await second.load(engine)
+        await engine.dispose()
+        return first, second, loaded
+
+    first, second, loaded = asyncio.run(run())
+    assert loaded == (True, False)
+    assert first.state == READY
+    assert second.count == 50
+    assert second.get('id7') == 'https://example.com/7'
+    first.close()
+    second.close()
+
+
+def test_shared_table_failed_load_resets_state(tmp_path):
+    class BrokenEngine:
+        def connect(self):
+            raise RuntimeError('database is unavailable')
+
+    table = make_table(tmp_path / 'table')
+    asyncio.run(table.run(BrokenEngine()))
+    assert table.state not in (LOADING, READY)
+    table.close()
+
+
+def test_resolve_short_id_prefers_shared_table(tmp_path, monkeypatch):
+    table = make_table(tmp_path / 'table')
+    table.add('abc', 'https://example.com')
+    monkeypatch.setattr('app.redirects.redirect_table', table)
+
+    class NoDatabase:
+        async def execute(self, *args, **kwargs):
+            raise AssertionError('shared table hit must not query the database')
+
+    assert asyncio.run(resolve_short_id(NoDatabase(), 'abc')) == 'https://example.com'
+    table.close()
+
+
+def test_shared_table_rebuilt_for_other_database(tmp_path):
+    async def load(database_url, full_url, instance_id=''):
+        engine = create_async_engine(database_url.replace('sqlite://', 'sqlite+aiosqlite://'))
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+            await conn.execute(insert(ShortUrl), [{'short_id': 'a', 'full_url': full_url, 'expires_at': None}])
+        table = SharedRedirectTable(True, str(tmp_path / 'table'), 100, 4096, 4)
+        table.open(database_identity(database_url, instance_id))
+        await table.load(engine)
+        await engine.dispose()
+        return table
+
+    one, two = f'sqlite:///{tmp_path / "one.db"}', f'sqlite:///{tmp_path / "two.db"}'
+    assert database_identity(one) != database_identity(two)
+    table = asyncio.run(load(one, 'https://one.example'))
+    assert table.get('a') == 'https://one.example'
+    table.close()
+
+    # Тот же путь к таблице, другая БД: файл пересоздается и загружается из нее
+    table = asyncio.run(load(two, 'https://two.example'))
+    assert table.get('a') == 'https://two.example'
+    assert table.count == 1
+    table.close()
+
+    # Файл БД заменен новым по тому же пути (inode может совпасть), сервер перезапущен
+    (tmp_path / 'two.db').unlink()
+    table = asyncio.run(load(two, 'https://three.example', instance_id='restarted'))
+    assert table.get('a') == 'https://three.example'
+    table.close()
@@ -0,0 +1,171 @@
+import asyncio
+from collections import Counter
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.pool import NullPool
+
+from app import create_app, get_db, get_read_db
+from app.models import AbstractModel, IdSequence, ShortUrl
+from app.short_ids import (
+    ALPHABET, HiLoIdStrategy, PooledIdStrategy, RandomIdStrategy, base62_encode, generate_short_ids,
+)
+
+
+async def make_session_factory():
+    engine = create_async_engine('sqlite+aiosqlite://')
+    async with engine.begin() as conn:
+        await conn.run_sync(AbstractModel.metadata.create_all)
+        await conn.execute(insert(IdSequence).values(name='short_urls', next_hi=0))
+    return engine, async_sessionmaker(bind=engine)
+
+
+def test_base62_encode():
+    assert base62_encode(0) == 'a'
+    assert base62_encode(61) == '9'
+    assert base62_encode(62) == 'ba'
+
+
+def test_random_strategy():
+    ids = asyncio.run(RandomIdStrategy().allocate(None, 3))
+    assert len(ids) == 3
+    assert all(len(short_id) == 8 for short_id in ids)
+
+
+def test_hilo_strategy_blocks_do_not_overlap():
+    async def run():
+        engine, session_factory = await make_session_factory()
+        first = HiLoIdStrategy(block_size=10)
+        second = HiLoIdStrategy(block_size=10)
+        async with session_factory() as db:
+            ids = await first.allocate(db, 5)
+            ids += await second.allocate(db, 5)
+            ids += await first.allocate(db, 20)
+            next_hi = await db.scalar(IdSequence.__table__.select().with_only_columns(IdSequence.next_hi))
+        await engine.dispose()
+        return ids, next_hi
+
+    ids, next_hi = asyncio.run(run())
+    assert len(ids) == 30
+    assert len(set(ids)) == 30
+    assert next_hi == 4
+
+
+def test_hilo_strategy_node_prefix():
+    async def run():
+        engine, session_factory = await make_session_factory()
+        async with session_factory() as db:
+            ids = await HiLoIdStrategy(block_size=10, node='eu').allocate(db, 2)
+        await engine.dispose()
+        return ids
+
+    assert asyncio.run(run()) == ['eu-a', 'eu-b']
+
+
+def test_hilo_strategy_skips_reserved_ids():
+    docs = sum(ALPHABET.index(char) * 62 ** power for power, char in enumerate(reversed('docs')))
+    strategy = HiLoIdStrategy(block_size=1000)
+    strategy._next = docs  # noqa
+    strategy._limit = docs + 10  # noqa
+
+    ids = asyncio.run(strategy.allocate(None, 2))
+    assert ids == [base62_encode(docs + 1), base62_encode(docs + 2)]
+
+
+def test_hilo_strategy_skips_imported_ids(tmp_path):
+    # id из импорта заняли первые полтора блока: запрос не падает, а берет id из следующего блока
+    url = f'sqlite:///{tmp_path / "shorturl.db"}'
+    sync_engine = create_engine(url)
+    AbstractModel.metadata.create_all(sync_engine)
+    with sync_engine.begin() as conn:
+        conn.execute(insert(IdSequence).values(name='short_urls', next_hi=0))
+        conn.execute(insert(ShortUrl), [
+            {'short_id': base62_encode(value), 'full_url': f'https://example.com/{value}'} for value in range(15)
+        ])
+    engine = create_async_engine(url.replace('sqlite://', 'sqlite+aiosqlite://'), poolclass=NullPool)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+
+    async def get_test_db():
+        async with session_factory() as session:
+            yield session
+
+    app = create_app()
+    app.dependency_overrides[get_db] = get_test_db
+    app.dependency_overrides[get_read_db] = get_test_db
+    with patch('app.routes.id_strategy', HiLoIdStrategy(block_size=10)):
+        client = TestClient(app)
+        response = client.post('/shorten', json={'url': 'https://example.com/new'})
+        assert response.status_code == 201
+        assert response.json()['short_id'] == base62_encode(20)
+        response = client.post('/shorten/batch', json={'urls': ['https://example.com/x', 'https://example.com/y']})
+        assert [item['short_id'] for item in response.json()['results']] == [base62_encode(21), base62_encode(22)]
+    sync_engine.dispose()
+
+
+def test_hilo_strategy_invalid_node():
+    with pytest.raises(ValueError):
+        HiLoIdStrategy(block_size=10, node='a-b')
+
+
+def test_generate_short_ids():
+    ids = generate_short_ids(2000)
+    assert len(ids) == 2000
+    assert all(len(short_id) == 8 and set(short_id) <= set(ALPHABET) for short_id in ids)
+    # Отбрасывание байтов >= 248 дает равномерное распределение символов
+    counts = Counter(''.join(ids))
+    assert len(counts) == len(ALPHABET)
+    assert max(counts.values()) < 2 * min(counts.values())
+
+
+def test_pooled_strategy_falls_back_when_empty():
+    strategy = PooledIdStrategy(size=10, low_water=5, batch_size=4)
+    with patch('app.short_ids.generate_short_id', side_effect=['fallback1', 'fallback2']):
+        assert asyncio.run(strategy.allocate(None, 2)) == ['fallback1', 'fallback2']
+    assert strategy.fallbacks == 2
+
+
+async def wait_for(condition, timeout: float = 2):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+def test_pooled_strategy_refills_with_unused_ids():
+    batches = [
+        ['taken001', 'docs', 'fresh001', 'fresh002'],
+        ['fresh003', 'fresh004', 'fresh005', 'fresh006'],
+        ['fresh007', 'fresh008'],
+    ]
+
+    async def run():
+        engine = create_async_engine('sqlite+aiosqlite://')
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+            await conn.execute(insert(ShortUrl).values(short_id='taken001', full_url='https://example.com'))
+
+        strategy = PooledIdStrategy(size=5, low_water=4, batch_size=4)
+        with patch('app.short_ids.generate_short_ids', side_effect=batches):
+            task = asyncio.create_task(strategy.run(engine))
+            filled = await wait_for(lambda: len(strategy) == 6)
+            ids = await strategy.allocate(None, 3)
+            # Пул опустился ниже low water: фоновая задача добирает его до size
+            refilled = await wait_for(lambda: len(strategy) == 5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await engine.dispose()
+        return filled, ids, refilled, strategy.fallbacks
+
+    filled, ids, refilled, fallbacks = asyncio.run(run())
+    assert filled
+    assert len(ids) == 3 and set(ids) <= {f'fresh00{i}' for i in range(1, 7)}
+    assert refilled
+    assert fallbacks == 0
+
+
+def test_pooled_strategy_invalid_config():
+    with pytest.raises(ValueError):
+        PooledIdStrategy(size=10, low_water=10, batch_size=5)
@@ -0,0 +1,63 @@
+import sqlite3
+
+from startup import MAX_DEFAULT_WORKERS, current_revisions, default_workers, head_revisions, sqlite_path
+
+MIGRATION = '''
+revision: str = "{revision}"
+down_revision: Union[str, Sequence[str], None] = {down_revision}
+'''
+
+
+def write_migration(versions_dir, revision, down_revision):
+    (versions_dir / f'{revision}.py').write_text(MIGRATION.format(revision=revision, down_revision=down_revision))
+
+
+def test_head_revisions(tmp_path):
+    write_migration(tmp_path, '001_initial', None)
+    write_migration(tmp_path, '002_next', '"001_initial"')
+    write_migration(tmp_path, '003_last', "'002_next'")
+    assert head_revisions(tmp_path) == {'003_last'}
+
+
+def test_head_revisions_merge(tmp_path):
+    write_migration(tmp_path, '001_initial', None)
+    write_migration(tmp_path, '002_a', '"001_initial"')
+    write_migration(tmp_path, '002_b', '"001_initial"')
+    assert head_revisions(tmp_path) == {'002_a', '002_b'}
+    write_migration(tmp_path, '003_merge', '("002_a", "002_b")')
+    assert head_revisions(tmp_path) == {'003_merge'}
+
+
+def test_sqlite_path():
+    assert str(sqlite_path('sqlite:////app/data/shorturl.db')) == '/app/data/shorturl.db'
+    assert str(sqlite_path('sqlite+aiosqlite:///data.db')) == 'data.db'
+    assert sqlite_path('sqlite:///:memory:') is None
+    assert sqlite_path('postgresql://user@localhost/shorturl') is None
+
+
+def test_current_revisions(tmp_path):
+    db_path = tmp_path / 'shorturl.db'
+    url = f'sqlite:///{db_path}'
+    assert current_revisions(url) == set()
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE short_urls (id INTEGER)')
+    assert current_revisions(url) == set()
+
+    with sqlite3.connect(db_path) as conn:
+        conn.execute('CREATE TABLE alembic_version (version_num VARCHAR(32) NOT NULL)')
+        conn.execute("INSERT INTO alembic_version VALUES ('004_url_hash')")
+    assert current_revisions(url) == {'004_url_hash'}
+    assert current_revisions('postgresql://user@localhost/shorturl') is None
+
+
+def test_default_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr('os.process_cpu_count', lambda: 16, raising=False)
+    cpu_max = tmp_path / 'cpu.max'
+    cpu_max.write_text('max 100000\n')
+    assert default_workers(cpu_max) == MAX_DEFAULT_WORKERS
+    cpu_max.write_text('150000 100000\n')
+    assert default_workers(cpu_max) == 2
+    assert default_workers(tmp_path / 'missing') == MAX_DEFAULT_WORKERS
+    monkeypatch.setattr('os.process_cpu_count', lambda: 3, raising=False)
+    assert default_workers(tmp_path / 'missing') == 3
@@ -0,0 +1,84 @@
+import asyncio
+import json
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import create_app
+from app.models import AbstractModel, ShortUrl, url_digest
+from app.transfer import export_short_urls, import_short_urls, iter_lines
+
+
+async def chunks(data: bytes, size: int = 7):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def import_and_export(data: bytes, fmt: str, export_format: str, batch_size: int = 2):
+    engine = create_async_engine('sqlite+aiosqlite://')
+    async with engine.begin() as conn:
+        await conn.run_sync(AbstractModel.metadata.create_all)
+        await conn.execute(ShortUrl.__table__.insert(), [{'short_id': 'existing', 'full_url': 'https://example.com/old'}])
+
+    report = await import_short_urls(engine, iter_lines(chunks(data)), fmt, batch_size=batch_size)
+    exported = b''.join([chunk async for chunk in export_short_urls(engine, export_format)])
+    async with engine.connect() as conn:
+        hashes = dict((await conn.execute(select(ShortUrl.short_id, ShortUrl.url_hash))).all())
+    await engine.dispose()
+    return report, exported, hashes
+
+
+def test_import_ndjson():
+    lines = [
+        {'short_id': 'abc', 'full_url': 'https://example.com/a', 'created_at': '2026-01-02T03:04:05+00:00'},
+        {'short_id': 'def', 'full_url': 'https://example.com/d', 'expires_at': '2026-03-01T12:00:00+03:00'},
+        {'short_id': 'abc', 'full_url': 'https://example.com/again'},
+        {'short_id': 'existing', 'full_url': 'https://example.com/new'},
+        {'short_id': 'bad id', 'full_url': 'https://example.com/b'},
+        {'short_id': 'stats', 'full_url': 'https://example.com/s'},
+        {'short_id': 'ghi', 'full_url': 'ftp://example.com/g'},
+    ]
+    data = '\n'.join(json.dumps(line) for line in lines).encode() + b'\n\n{broken\n'
+
+    report, exported, hashes = asyncio.run(import_and_export(data, 'ndjson', 'ndjson'))
+
+    assert {key: report[key] for key in ('rows', 'inserted', 'skipped', 'invalid')} == {
+        'rows': 8, 'inserted': 2, 'skipped': 2, 'invalid': 4,
+    }
+    assert [error['line'] for error in report['errors']] == [5, 6, 7, 9]
+    rows = [json.loads(line) for line in exported.decode().splitlines()]
+    assert [row['short_id'] for row in rows] == ['existing', 'abc', 'def']
+    assert rows[1] == {
+        'short_id': 'abc', 'full_url': 'https://example.com/a', 'created_at': '2026-01-02T03:04:05', 'expires_at': None,
+    }
+    assert rows[2]['expires_at'] == '2026-03-01T09:00:00'
+    assert hashes['abc'] == url_digest('https://example.com/a')
+
+
+def test_import_csv_roundtrip():
+    data = (
+        b'\xef\xbb\xbfshort_id,full_url,created_at\r\n'
+        b'abc,"https://example.com/a?x=1,2",2026-01-02T03:04:05\r\n'
+        b'def,https://example.com/d,\r\n'
+    )
+
+    report, exported, _ = asyncio.run(import_and_export(data, 'csv', 'csv'))
+
+    assert (report['rows'], report['inserted'], report['invalid']) == (2, 2, 0)
+    lines = exported.decode().splitlines()
+    assert lines[0] == 'short_id,full_url,created_at,expires_at'
+    assert lines[2] == 'abc,"https://example.com/a?x=1,2",2026-01-02T03:04:05,'
+    assert lines[3].startswith('def,https://example.com/d,')
+
+
+def test_admin_routes_require_token():
+    client = TestClient(create_app())
+    with patch('app.admin.ADMIN_TOKEN', ''):
+        assert client.get('/admin/export').status_code == 404
+    with patch('app.admin.ADMIN_TOKEN', 'secret'):
+        assert client.get('/admin/export').status_code == 401
+        assert client.get('/admin/export', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+        response = client.post('/admin/import?format=xml', headers={'Authorization': 'Bearer secret'})
+        assert response.status_code == 422
@@ -5,7 +5,7 @@ from alembic import context
 from sqlalchemy import engine_from_config
 from sqlalchemy import pool
 
-from app.models import AbstractModel, TodoItem  # noqa
+from app.models import AbstractModel, TodoItem, CollectionVersion  # noqa
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,48 @@
+"""collection versions
+
+Revision ID: 002_collection_versions
+Revises: 001_initial
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "002_collection_versions"
+down_revision: Union[str, Sequence[str], None] = "001_initial"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def upgrade() -> None:
+    op.create_table(
+        'collection_versions',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+    op.execute(
+        "INSERT INTO collection_versions (name, version, updated_at) "
+        "VALUES ('todo_items', 0, strftime('%Y-%m-%d %H:%M:%f', 'now'))"
+    )
+    for operation in OPERATIONS:
+        op.execute(f"""
+            CREATE TRIGGER todo_items_version_{operation.lower()} AFTER {operation} ON todo_items
+            BEGIN
+                UPDATE collection_versions
+                SET version = version + 1, updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now')
+                WHERE name = 'todo_items';
+            END
+        """)
+
+
+def downgrade() -> None:
+    for operation in OPERATIONS:
+        op.execute(f'DROP TRIGGER IF EXISTS todo_items_version_{operation.lower()}')
+    op.drop_table('collection_versions')
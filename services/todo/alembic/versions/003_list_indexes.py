@@ -0,0 +1,33 @@
+"""todo list indexes
+
+Revision ID: 003_list_indexes
+Revises: 002_collection_versions
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "003_list_indexes"
+down_revision: Union[str, Sequence[str], None] = "002_collection_versions"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_todo_items_created_at_id': ['created_at', 'id'],
+    'ix_todo_items_updated_at_id': ['updated_at', 'id'],
+    'ix_todo_items_completed_created_at_id': ['completed', 'created_at', 'id'],
+    'ix_todo_items_completed_updated_at_id': ['completed', 'updated_at', 'id'],
+}
+
+
+def upgrade() -> None:
+    for name, columns in INDEXES.items():
+        op.create_index(name, 'todo_items', columns)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name='todo_items')
@@ -0,0 +1,27 @@
+"""todo item version
+
+Revision ID: 004_item_version
+Revises: 003_list_indexes
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "004_item_version"
+down_revision: Union[str, Sequence[str], None] = "003_list_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('todo_items', sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    # Пересоздание таблицы в batch-режиме потеряло бы триггеры collection_versions;
+    # SQLite 3.35+ удаляет колонку на месте
+    op.execute('ALTER TABLE todo_items DROP COLUMN version')
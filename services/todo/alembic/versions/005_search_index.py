@@ -0,0 +1,55 @@
+"""todo full-text search index
+
+Revision ID: 005_search_index
+Revises: 004_item_version
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "005_search_index"
+down_revision: Union[str, Sequence[str], None] = "004_item_version"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TRIGGERS = ('todo_items_search_insert', 'todo_items_search_delete', 'todo_items_search_update')
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE VIRTUAL TABLE todo_items_fts USING fts5(
+            title, description, content='todo_items', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER todo_items_search_insert AFTER INSERT ON todo_items
+        BEGIN
+            INSERT INTO todo_items_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER todo_items_search_delete AFTER DELETE ON todo_items
+        BEGIN
+            INSERT INTO todo_items_fts (todo_items_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER todo_items_search_update AFTER UPDATE OF title, description ON todo_items
+        BEGIN
+            INSERT INTO todo_items_fts (todo_items_fts, rowid, title, description)
+            VALUES ('delete', old.id, old.title, old.description);
+            INSERT INTO todo_items_fts (rowid, title, description) VALUES (new.id, new.title, new.description);
+        END
+    """)
+    # Индекс по уже существующим задачам
+    op.execute("INSERT INTO todo_items_fts (todo_items_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    for trigger in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS todo_items_fts')
@@ -0,0 +1,188 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from app.metrics import registry
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+ADMISSION_READ_MAX_CONCURRENCY = int(os.getenv('ADMISSION_READ_MAX_CONCURRENCY', 256))
+ADMISSION_WRITE_MAX_CONCURRENCY = int(os.getenv('ADMISSION_WRITE_MAX_CONCURRENCY', 32))
+ADMISSION_MIN_CONCURRENCY = int(os.getenv('ADMISSION_MIN_CONCURRENCY', 4))
+ADMISSION_READ_QUEUE = int(os.getenv('ADMISSION_READ_QUEUE', 512))
+ADMISSION_WRITE_QUEUE = int(os.getenv('ADMISSION_WRITE_QUEUE', 64))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv('ADMISSION_QUEUE_TIMEOUT', 0.5))
+ADMISSION_READ_TARGET_LATENCY = float(os.getenv('ADMISSION_READ_TARGET_LATENCY', 0.05))
+ADMISSION_WRITE_TARGET_LATENCY = float(os.getenv('ADMISSION_WRITE_TARGET_LATENCY', 0.25))
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', 1))
+
+READ_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS'})
+MIN_WINDOW = 20
+
+OVERLOADED_BODY = b'{"detail":"Service overloaded, retry later"}'
+
+# Ключ scope для ответов, длительность которых задает клиент (потоковые выгрузки):
+# она не учитывается при подстройке лимита
+UNTIMED_KEY = 'admission_untimed'
+
+shed_requests = registry.counter('http_requests_shed_total', 'Requests rejected by admission control.')
+
+
+class AdaptiveLimiter:
+    # Лимит одновременных запросов класса с ограниченной очередью ожидания.
+    # Лимит подстраивается по средней задержке обработки за окно (AIMD): выше цели -
+    # умножается на 0.9, ниже цели при упоре в лимит - растет на 1
+    def __init__(self, name: str, max_limit: int, min_limit: int, max_queue: int,
+                 queue_timeout: float, target_latency: float):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError('Concurrency limits need 1 <= min <= max')
+        self.name = name
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.target_latency = target_latency
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._samples = 0
+        self._latency_sum = 0.0
+        self._saturated = False
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> Optional[str]:
+        # None - запрос допущен, иначе причина отказа
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            return 'queue_full'
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+            return None
+        except asyncio.TimeoutError:
+            self._discard(waiter)
+            # С Python 3.12 wait_for может поднять TimeoutError, когда место уже
+            # передано ожидающему в _wake: такой запрос считается допущенным
+            if waiter.done() and not waiter.cancelled():
+                return None
+            return 'timeout'
+        except asyncio.CancelledError:
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self, latency: Optional[float] = None) -> None:
+        self.in_flight -= 1
+        if latency is not None:
+            self._observe(latency)
+        self._wake()
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self) -> None:
+        # Место в лимите передается следующему в очереди до того, как он проснется
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _observe(self, latency: float) -> None:
+        self._samples += 1
+        self._latency_sum += latency
+        self._saturated = self._saturated or self.in_flight + 1 >= int(self.limit) or bool(self._waiters)
+        if self._samples < max(MIN_WINDOW, int(self.limit)):
+            return
+        if self._latency_sum / self._samples > self.target_latency:
+            self.limit = max(float(self.min_limit), self.limit * 0.9)
+        elif self._saturated:
+            self.limit = min(float(self.max_limit), self.limit + 1)
+        self._samples = 0
+        self._latency_sum = 0.0
+        self._saturated = False
+        self._wake()
+
+
+def build_limiters() -> dict[str, AdaptiveLimiter]:
+    return {
+        'read': AdaptiveLimiter(
+            'read', ADMISSION_READ_MAX_CONCURRENCY, ADMISSION_MIN_CONCURRENCY, ADMISSION_READ_QUEUE,
+            ADMISSION_QUEUE_TIMEOUT, ADMISSION_READ_TARGET_LATENCY,
+        ),
+        'write': AdaptiveLimiter(
+            'write', ADMISSION_WRITE_MAX_CONCURRENCY, ADMISSION_MIN_CONCURRENCY, ADMISSION_WRITE_QUEUE,
+            ADMISSION_QUEUE_TIMEOUT, ADMISSION_WRITE_TARGET_LATENCY,
+        ),
+    }
+
+
+class AdmissionMiddleware:
+    # Чтения и записи получают раздельные бюджеты: очередь на запись (SQLite пишет
+    # в один поток) не задерживает редиректы. Запрос сверх лимита ждет в очереди
+    # не дольше ADMISSION_QUEUE_TIMEOUT, а при полной очереди сразу получает 503
+    def __init__(self, app, limiters: dict[str, AdaptiveLimiter], exempt_prefixes: tuple = ()):
+        self.app = app
+        self.limiters = limiters
+        self.exempt_prefixes = exempt_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiters['read' if scope['method'] in READ_METHODS else 'write']
+        rejected = await limiter.acquire()
+        if rejected is not None:
+            key = (('class', limiter.name), ('reason', rejected))
+            shed_requests[key] = shed_requests.get(key, 0) + 1
+            await send_overloaded(send)
+            return
+
+        start = time.perf_counter()
+        latency = None
+        try:
+            await self.app(scope, receive, send)
+            if not scope.get(UNTIMED_KEY):
+                latency = time.perf_counter() - start
+        finally:
+            # Задержка ответов с ошибкой не учитывается: они не показывают нагрузку
+            limiter.release(latency)
+
+
+async def send_overloaded(send) -> None:
+    await send({
+        'type': 'http.response.start',
+        'status': 503,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(OVERLOADED_BODY)).encode()),
+            (b'retry-after', str(ADMISSION_RETRY_AFTER).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': OVERLOADED_BODY})
+
+
+def admission_collector(limiters: dict[str, AdaptiveLimiter]):
+    def collect():
+        yield 'admission_concurrency_limit', 'gauge', 'Current adaptive concurrency limit.', [
+            ((('class', name),), int(limiter.limit)) for name, limiter in limiters.items()
+        ]
+        yield 'admission_in_flight', 'gauge', 'Requests admitted and in progress.', [
+            ((('class', name),), limiter.in_flight) for name, limiter in limiters.items()
+        ]
+        yield 'admission_queued', 'gauge', 'Requests waiting for admission.', [
+            ((('class', name),), limiter.queued) for name, limiter in limiters.items()
+        ]
+    return collect
@@ -0,0 +1,70 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+def to_utc(value: datetime) -> datetime:
+    # Время в БД хранится без часового пояса, в UTC
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def http_date(value: datetime) -> str:
+    return format_datetime(to_utc(value).replace(microsecond=0), usegmt=True)
+
+
+def timestamp_us(value: datetime) -> int:
+    return int(to_utc(value).timestamp() * 1_000_000)
+
+
+def make_etag(*parts) -> str:
+    return '"' + '-'.join(str(part) for part in parts) + '"'
+
+
+def variant_hash(*parts) -> str:
+    # Для ETag представления: у каждой страницы, набора фильтров и формата свой тег
+    return hashlib.blake2b(repr(parts).encode(), digest_size=8).hexdigest()
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Для If-None-Match сравнение слабое (RFC 9110, 13.1.2): префикс W/ не учитывается
+    if if_none_match.strip() == '*':
+        return True
+    tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return etag.removeprefix('W/') in tags
+
+
+def has_conditions(request: Request) -> bool:
+    return 'if-none-match' in request.headers or 'if-modified-since' in request.headers
+
+
+def not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    # If-Modified-Since учитывается, только если нет If-None-Match (RFC 9110, 13.2.2)
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get('if-modified-since')
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return to_utc(last_modified).replace(microsecond=0) <= to_utc(since)
+
+
+def validator_headers(etag: str, last_modified: Optional[datetime], cache_control: str) -> dict:
+    headers = {'ETag': etag}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    if cache_control:
+        headers['Cache-Control'] = cache_control
+    return headers
+
+
+def not_modified_response(headers: dict) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, DateTime, DDL, Index, event
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -17,4 +17,89 @@ class TodoItem(AbstractModel):
     completed = Column(Boolean, default=False, nullable=False)
     created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+    # Номер версии для оптимистичной блокировки: растет при каждом изменении, входит в ETag
+    version = Column(Integer, default=1, server_default='1', nullable=False)
 
+    # Индексы под keyset-пагинацию списка: (колонка сортировки, id), с completed впереди для фильтра
+    __table_args__ = (
+        Index('ix_todo_items_created_at_id', 'created_at', 'id'),
+        Index('ix_todo_items_updated_at_id', 'updated_at', 'id'),
+        Index('ix_todo_items_completed_created_at_id', 'completed', 'created_at', 'id'),
+        Index('ix_todo_items_completed_updated_at_id', 'completed', 'updated_at', 'id'),
+    )
+
+
+class CollectionVersion(AbstractModel):
+    # Версия коллекции растет при каждом изменении таблицы (триггеры ниже) и служит
+    # ETag для списка: проверка If-None-Match читает одну строку вместо всей таблицы
+    __tablename__ = 'collection_versions'
+
+    name = Column(String(50), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
+
+
+TODO_ITEMS_COLLECTION = 'todo_items'
+SQLITE_NOW = "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+COLLECTION_VERSION_TRIGGERS = [
+    f"""
+    CREATE TRIGGER todo_items_version_{operation.lower()} AFTER {operation} ON todo_items
+    BEGIN
+        UPDATE collection_versions
+        SET version = version + 1, updated_at = {SQLITE_NOW}
+        WHERE name = '{TODO_ITEMS_COLLECTION}';
+    END
+    """
+    for operation in ('INSERT', 'UPDATE', 'DELETE')
+]
+
+# Для metadata.create_all (тесты); в рабочей БД то же создает миграция 002.
+# DDL подставляет параметры через %, поэтому % в strftime экранируются
+event.listen(
+    CollectionVersion.__table__,
+    'after_create',
+    DDL(
+        'INSERT INTO collection_versions (name, version, updated_at) '
+        f"VALUES ('{TODO_ITEMS_COLLECTION}', 0, {SQLITE_NOW})".replace('%', '%%')
+    ).execute_if(dialect='sqlite'),
+)
+for trigger in COLLECTION_VERSION_TRIGGERS:
+    event.listen(TodoItem.__table__, 'after_create', DDL(trigger.replace('%', '%%')).execute_if(dialect='sqlite'))
+
+
+# Полнотекстовый индекс FTS5 по title и description. Таблица external content: тексты
+# не дублируются, индекс поддерживают триггеры. Рабочую БД создает миграция 005
+SEARCH_TABLE = 'todo_items_fts'
+
+SEARCH_INDEX_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(
+        title, description, content='todo_items', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    CREATE TRIGGER todo_items_search_insert AFTER INSERT ON todo_items
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER todo_items_search_delete AFTER DELETE ON todo_items
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER todo_items_search_update AFTER UPDATE OF title, description ON todo_items
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {SEARCH_TABLE} (rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+for statement in SEARCH_INDEX_DDL:
+    event.listen(TodoItem.__table__, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
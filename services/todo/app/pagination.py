@@ -0,0 +1,85 @@
+import base64
+import binascii
+import os
+from datetime import datetime
+from typing import Literal, Optional
+
+import orjson
+from sqlalchemy import Select, select, tuple_
+
+from app.http_cache import to_utc
+from app.models import TodoItem
+
+TODO_PAGE_SIZE = int(os.getenv('TODO_PAGE_SIZE', 100))
+TODO_MAX_PAGE_SIZE = int(os.getenv('TODO_MAX_PAGE_SIZE', 1000))
+
+SortOrder = Literal['created_at', '-created_at', 'updated_at', '-updated_at']
+SORT_COLUMNS = {'created_at': TodoItem.created_at, 'updated_at': TodoItem.updated_at}
+
+
+def to_naive_utc(value: datetime) -> datetime:
+    # В БД время хранится без часового пояса, в UTC
+    return to_utc(value).replace(tzinfo=None)
+
+
+def pack_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps(values)).decode().rstrip('=')
+
+
+def unpack_cursor(cursor: str) -> list:
+    try:
+        values = orjson.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, orjson.JSONDecodeError, ValueError):
+        raise ValueError('Invalid cursor') from None
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def encode_cursor(sort: str, item: TodoItem) -> str:
+    value = getattr(item, sort.lstrip('-'))
+    return pack_cursor([sort, to_naive_utc(value).isoformat(), item.id])
+
+
+def decode_cursor(cursor: str, sort: str) -> tuple[datetime, int]:
+    # Курсор - позиция последнего элемента страницы; действует только для того же sort
+    try:
+        cursor_sort, value, item_id = unpack_cursor(cursor)
+        if cursor_sort != sort or type(item_id) is not int:
+            raise ValueError(cursor)
+        return datetime.fromisoformat(value), item_id
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor') from None
+
+
+def page_query(
+    sort: str,
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+    completed: Optional[bool] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+) -> Select:
+    # Keyset-пагинация по (sort-колонка, id): следующая страница начинается сразу после
+    # курсора в индексе, поэтому стоимость запроса не зависит от номера страницы.
+    # Берется limit + 1 строка, чтобы узнать, есть ли следующая страница
+    descending = sort.startswith('-')
+    column = SORT_COLUMNS[sort.lstrip('-')]
+    query = select(TodoItem)
+    if completed is not None:
+        query = query.where(TodoItem.completed == completed)
+    if updated_after is not None:
+        query = query.where(TodoItem.updated_at >= to_naive_utc(updated_after))
+    if updated_before is not None:
+        query = query.where(TodoItem.updated_at < to_naive_utc(updated_before))
+    if cursor is not None:
+        position = decode_cursor(cursor, sort)
+        key = tuple_(column, TodoItem.id)
+        query = query.where(key < position if descending else key > position)
+    if descending:
+        query = query.order_by(column.desc(), TodoItem.id.desc())
+    else:
+        query = query.order_by(column, TodoItem.id)
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return query
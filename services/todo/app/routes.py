@@ -1,17 +1,77 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from collections import defaultdict
+from datetime import datetime
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
-from typing import List
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from typing import List, Optional
 
-from app import get_db
-from app.models import TodoItem
-from app.schemas import TodoItemCreate, TodoItemUpdate, TodoItemResponse
+from app import get_db, get_read_db
+from app.admission import UNTIMED_KEY
+from app.http_cache import (
+    has_conditions, make_etag, not_modified, not_modified_response, validator_headers, variant_hash,
+)
+from app.models import TodoItem, CollectionVersion, TODO_ITEMS_COLLECTION
+from app.pagination import (
+    TODO_MAX_PAGE_SIZE, TODO_PAGE_SIZE, SortOrder, encode_cursor, page_query, to_naive_utc,
+)
+from app.responses import ORJSON_OPTIONS, FastSerializer
+from app.search import (
+    TODO_SEARCH_PAGE_SIZE, encode_search_cursor, match_expression, search_query, search_result,
+)
+from app.schemas import (
+    BulkCreate, BulkDelete, BulkRequest, BulkResponse, TodoItemCreate, TodoItemPatch, TodoItemUpdate,
+    TodoItemResponse, TodoSearchResult,
+)
 
 router = APIRouter(prefix='/api/todo', tags=['todo'])
 
+# no-cache: клиент и CDN хранят ответ, но перепроверяют его через If-None-Match
+TODO_CACHE_CONTROL = os.getenv('TODO_CACHE_CONTROL', 'no-cache')
+TODO_STREAM_CHUNK_SIZE = int(os.getenv('TODO_STREAM_CHUNK_SIZE', 1000))
+
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+
+todo_item_serializer = FastSerializer(TodoItemResponse)
+bulk_serializer = FastSerializer(BulkResponse)
+search_serializer = FastSerializer(TodoSearchResult)
+# Колонки в порядке полей TodoItemResponse: строки результата сериализуются как кортежи
+ITEM_COLUMNS = tuple(getattr(TodoItem, name) for name in todo_item_serializer.names)
+ITEM_FIELDS = frozenset({'title', 'description', 'completed'})
+
+
+def item_validators(item_id: int, version: int, updated_at) -> dict:
+    return validator_headers(make_etag(item_id, version), updated_at, TODO_CACHE_CONTROL)
+
+
+async def stream_items(engine: AsyncEngine, query, ndjson: bool):
+    # Строки читаются пачками по TODO_STREAM_CHUNK_SIZE (только колонки, без ORM-объектов),
+    # каждая пачка сразу кодируется и отправляется: память не зависит от длины списка
+    names = todo_item_serializer.names
+    query = query.with_only_columns(*ITEM_COLUMNS)
+    separator = b'\n' if ndjson else b','
+    first = True
+    if not ndjson:
+        yield b'['
+    async with engine.connect() as conn:
+        result = await conn.stream(query.execution_options(yield_per=TODO_STREAM_CHUNK_SIZE))
+        async for partition in result.partitions():
+            chunk = separator.join(orjson.dumps(dict(zip(names, row)), option=ORJSON_OPTIONS) for row in partition)
+            if ndjson:
+                yield chunk + b'\n'
+            else:
+                yield chunk if first else b',' + chunk
+            first = False
+    if not ndjson:
+        yield b']'
+
 
 @router.post('', response_model=TodoItemResponse, status_code=status.HTTP_201_CREATED)
-def create_item(item_data: TodoItemCreate, db: Session = Depends(get_db)):
+async def create_item(item_data: TodoItemCreate, db: AsyncSession = Depends(get_db)):
     try:
         item = TodoItem(
             title=item_data.title,
@@ -19,17 +79,98 @@ def create_item(item_data: TodoItemCreate, db: Session = Depends(get_db)):
             completed=item_data.completed
         )
         db.add(item)
-        db.commit()
-        db.refresh(item)
-        return item
+        await db.commit()
+        await db.refresh(item)
+        return todo_item_serializer.one(item, status_code=status.HTTP_201_CREATED)
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+def bulk_result(op: str, item_id, status_code: int, detail=None, row=None) -> dict:
+    item = todo_item_serializer.dump(tuple(row)) if row is not None else None
+    return {'op': op, 'id': item_id, 'status': status_code, 'detail': detail, 'item': item}
+
+
+@router.post('/bulk', response_model=BulkResponse, status_code=status.HTTP_200_OK)
+async def bulk_items(bulk: BulkRequest, response: Response, db: AsyncSession = Depends(get_db)):
+    # Все операции - в одной транзакции и небольшом числе запросов: создания одним
+    # executemany, изменения с одинаковыми значениями одним UPDATE ... WHERE id IN,
+    # удаления одним DELETE ... WHERE id IN. Результаты - в порядке операций запроса
+    operations = bulk.operations
+    results = [None] * len(operations)
+    creates, deletes = [], []
+    updates = defaultdict(list)
+    for index, operation in enumerate(operations):
+        if isinstance(operation, BulkCreate):
+            creates.append(index)
+        elif isinstance(operation, BulkDelete):
+            deletes.append(index)
+        else:
+            values = operation.model_dump(include=ITEM_FIELDS, exclude_none=True)
+            updates[tuple(sorted(values.items()))].append(index)
+
+    try:
+        if creates:
+            rows = (await db.execute(
+                insert(TodoItem).returning(*ITEM_COLUMNS, sort_by_parameter_order=True),
+                [operations[index].model_dump(include=ITEM_FIELDS) for index in creates],
+            )).all()
+            for index, row in zip(creates, rows):
+                results[index] = bulk_result('create', row.id, status.HTTP_201_CREATED, row=row)
+
+        for values, indexes in updates.items():
+            ids = [operations[index].id for index in indexes]
+            if values:
+                statement = (
+                    update(TodoItem)
+                    .where(TodoItem.id.in_(ids))
+                    .values({**dict(values), 'version': TodoItem.version + 1})
+                    .returning(*ITEM_COLUMNS)
+                )
+            else:
+                # Пустое изменение, как и в update_item, возвращает элемент без изменений
+                statement = select(*ITEM_COLUMNS).where(TodoItem.id.in_(ids))
+            found = {row.id: row for row in await db.execute(statement)}
+            for index, item_id in zip(indexes, ids):
+                if item_id in found:
+                    results[index] = bulk_result('update', item_id, status.HTTP_200_OK, row=found[item_id])
+                else:
+                    results[index] = bulk_result('update', item_id, status.HTTP_404_NOT_FOUND, 'Item not found')
+
+        if deletes:
+            ids = [operations[index].id for index in deletes]
+            found = set(await db.scalars(delete(TodoItem).where(TodoItem.id.in_(ids)).returning(TodoItem.id)))
+            for index, item_id in zip(deletes, ids):
+                if item_id in found:
+                    results[index] = bulk_result('delete', item_id, status.HTTP_200_OK)
+                else:
+                    results[index] = bulk_result('delete', item_id, status.HTTP_404_NOT_FOUND, 'Item not found')
+
+        failed = any(result['status'] >= 400 for result in results)
+        if failed and bulk.atomic:
+            await db.rollback()
+            for result in results:
+                if result['status'] < 400:
+                    if result['op'] == 'create':
+                        result['id'] = None
+                    result.update(status=status.HTTP_424_FAILED_DEPENDENCY, detail='Rolled back', item=None)
+            response.status_code = status.HTTP_409_CONFLICT
+            return bulk_serializer.one({'committed': False, 'results': results}, status_code=status.HTTP_409_CONFLICT)
+
+        await db.commit()
+        return bulk_serializer.one({'committed': True, 'results': results})
+    except SQLAlchemyError as e:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -37,10 +178,68 @@ def create_item(item_data: TodoItemCreate, db: Session = Depends(get_db)):
 
 
 @router.get('', response_model=List[TodoItemResponse], status_code=status.HTTP_200_OK)
-def get_items(db: Session = Depends(get_db)):
+async def get_items(
+    request: Request,
+    limit: int = Query(TODO_PAGE_SIZE, ge=1, le=TODO_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: SortOrder = 'created_at',
+    completed: Optional[bool] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+):
     try:
-        items = db.query(TodoItem).all()
-        return items
+        # Потоковый режим отдает все подходящие элементы начиная с cursor, без limit
+        ndjson = NDJSON_MEDIA_TYPE in request.headers.get('accept', '')
+        stream = stream or ndjson
+        try:
+            query = page_query(sort, None if stream else limit, cursor, completed, updated_after, updated_before)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+        # Версия читается до строк: если между запросами успеет пройти запись, ETag
+        # окажется старше содержимого и следующий запрос просто получит 200, а не устаревший 304
+        version = (await db.execute(
+            select(CollectionVersion.version, CollectionVersion.updated_at)
+            .where(CollectionVersion.name == TODO_ITEMS_COLLECTION)
+        )).first()
+        # Формат тела выбирается по Accept, поэтому Vary нужен и в 304
+        headers = {'Vary': 'Accept'}
+        if version is not None:
+            variant = variant_hash(
+                NDJSON_MEDIA_TYPE if ndjson else 'application/json',
+                None if stream else limit,
+                cursor,
+                sort,
+                completed,
+                updated_after and to_naive_utc(updated_after),
+                updated_before and to_naive_utc(updated_before),
+            )
+            etag = make_etag('items', version.version, variant)
+            headers.update(validator_headers(etag, version.updated_at, TODO_CACHE_CONTROL))
+            if not_modified(request, etag, version.updated_at):
+                return not_modified_response(headers)
+        if stream:
+            # Поток читает через собственное соединение движка: сессия зависимости
+            # закрывается раньше, чем будет отдан ответ
+            request.scope[UNTIMED_KEY] = True
+            return StreamingResponse(
+                stream_items(db.bind, query, ndjson),
+                media_type=NDJSON_MEDIA_TYPE if ndjson else 'application/json',
+                headers=headers,
+            )
+        items = (await db.scalars(query)).all()
+        if len(items) > limit:
+            # Следующая страница - в заголовке Link (RFC 8288), тело остается списком
+            items = items[:limit]
+            next_url = request.url.include_query_params(cursor=encode_cursor(sort, items[-1]))
+            headers['Link'] = f'<{next_url}>; rel="next"'
+        return todo_item_serializer.many(items, headers=headers)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -48,16 +247,33 @@ def get_items(db: Session = Depends(get_db)):
         )
 
 
-@router.get('/{item_id}', response_model=TodoItemResponse, status_code=status.HTTP_200_OK)
-def get_item(item_id: int, db: Session = Depends(get_db)):
+# Объявлен до /{item_id}, иначе "search" разбирался бы как item_id
+@router.get('/search', response_model=List[TodoSearchResult], status_code=status.HTTP_200_OK)
+async def search_items(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(TODO_SEARCH_PAGE_SIZE, ge=1, le=TODO_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+):
     try:
-        item = db.get(TodoItem, item_id)
-        if item is None:
+        expression = match_expression(q)
+        if expression is None:
+            return search_serializer.many([])
+        try:
+            query = search_query(expression, limit, cursor)
+        except ValueError as e:
             raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='Item not found'
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
             )
-        return item
+        rows = (await db.execute(query)).all()
+        headers = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_url = request.url.include_query_params(cursor=encode_search_cursor(rows[-1]))
+            headers = {'Link': f'<{next_url}>; rel="next"'}
+        return search_serializer.many([search_result(row) for row in rows], headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -67,68 +283,151 @@ def get_item(item_id: int, db: Session = Depends(get_db)):
         )
 
 
-@router.put('/{item_id}', response_model=TodoItemResponse, status_code=status.HTTP_200_OK)
-def update_item(item_id: int, item_data: TodoItemUpdate, db: Session = Depends(get_db)):
+@router.get('/{item_id}', response_model=TodoItemResponse, status_code=status.HTTP_200_OK)
+async def get_item(item_id: int, request: Request, db: AsyncSession = Depends(get_read_db)):
     try:
-        item = db.get(TodoItem, item_id)
+        if has_conditions(request):
+            # Для условного запроса достаточно версии и updated_at: строка целиком не загружается
+            row = (await db.execute(
+                select(TodoItem.version, TodoItem.updated_at).where(TodoItem.id == item_id)
+            )).first()
+            if row is None:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail='Item not found'
+                )
+            headers = item_validators(item_id, row.version, row.updated_at)
+            if not_modified(request, headers['ETag'], row.updated_at):
+                return not_modified_response(headers)
+        item = await db.get(TodoItem, item_id)
         if item is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail='Item not found'
             )
-        
-        if item_data.title is not None:
-            item.title = item_data.title
-        if item_data.description is not None:
-            item.description = item_data.description
-        if item_data.completed is not None:
-            item.completed = item_data.completed
-        
-        db.commit()
-        db.refresh(item)
-        return item
+        return todo_item_serializer.one(item, headers=item_validators(item.id, item.version, item.updated_at))
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=str(e)
+        )
+
+
+def expected_versions(request: Request, item_id: int) -> Optional[set[int]]:
+    # Версии из If-Match: None - условия нет (или "*"), пустое множество - не совпадет ни одна.
+    # Слабые теги для If-Match не подходят (RFC 9110, 13.1.1)
+    if_match = request.headers.get('if-match')
+    if if_match is None or if_match.strip() == '*':
+        return None
+    prefix = f'"{item_id}-'
+    versions = set()
+    for tag in if_match.split(','):
+        tag = tag.strip()
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            versions.add(int(tag[len(prefix):-1]))
+    return versions
+
+
+def item_conditions(item_id: int, versions: Optional[set[int]]) -> list:
+    conditions = [TodoItem.id == item_id]
+    if versions is not None:
+        conditions.append(TodoItem.version.in_(versions))
+    return conditions
+
+
+async def missing_item(db: AsyncSession, item_id: int, versions: Optional[set[int]]) -> HTTPException:
+    # Запрос не затронул строку: элемента нет (404) или версия не совпала с If-Match (412).
+    # Дополнительный запрос - только на этом пути и только при If-Match
+    if versions is not None and await db.scalar(select(TodoItem.id).where(TodoItem.id == item_id)) is not None:
+        return HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail='Item has been modified'
+        )
+    return HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail='Item not found'
+    )
+
+
+async def write_item(db: AsyncSession, request: Request, item_id: int, values: dict):
+    # Изменение, проверка If-Match и чтение результата - один UPDATE ... RETURNING
+    versions = expected_versions(request, item_id)
+    conditions = item_conditions(item_id, versions)
+    if values:
+        statement = (
+            update(TodoItem)
+            .where(*conditions)
+            .values({**values, 'version': TodoItem.version + 1})
+            .returning(*ITEM_COLUMNS)
+        )
+    else:
+        # Пустое изменение возвращает элемент как есть
+        statement = select(*ITEM_COLUMNS).where(*conditions)
+    try:
+        row = (await db.execute(statement)).first()
+        if row is None:
+            raise await missing_item(db, item_id, versions)
+        await db.commit()
+        return todo_item_serializer.one(row, headers=item_validators(row.id, row.version, row.updated_at))
     except HTTPException:
+        await db.rollback()
         raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
 
+@router.put('/{item_id}', response_model=TodoItemResponse, status_code=status.HTTP_200_OK)
+async def update_item(
+    item_id: int, item_data: TodoItemUpdate, request: Request, db: AsyncSession = Depends(get_db),
+):
+    # Поля со значением null не меняются
+    return await write_item(db, request, item_id, item_data.model_dump(exclude_none=True))
+
+
+@router.patch('/{item_id}', response_model=TodoItemResponse, status_code=status.HTTP_200_OK)
+async def patch_item(
+    item_id: int, item_data: TodoItemPatch, request: Request, db: AsyncSession = Depends(get_db),
+):
+    # Меняются ровно переданные поля, включая description: null
+    return await write_item(db, request, item_id, item_data.model_dump(exclude_unset=True))
+
+
 @router.delete('/{item_id}', status_code=status.HTTP_200_OK)
-def delete_item(item_id: int, db: Session = Depends(get_db)):
+async def delete_item(item_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     try:
-        item = db.get(TodoItem, item_id)
-        if item is None:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail='Item not found'
-            )
-        
-        db.delete(item)
-        db.commit()
+        versions = expected_versions(request, item_id)
+        deleted = await db.scalar(
+            delete(TodoItem).where(*item_conditions(item_id, versions)).returning(TodoItem.id)
+        )
+        if deleted is None:
+            raise await missing_item(db, item_id, versions)
+        await db.commit()
         
         return {'message': 'Item deleted successfully'}
     except HTTPException:
+        await db.rollback()
         raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
-
@@ -1,6 +1,10 @@
-from pydantic import BaseModel, Field, ConfigDict
+import os
+
+from pydantic import BaseModel, Field, ConfigDict, model_validator
 from datetime import datetime
-from typing import Optional
+from typing import Annotated, Literal, Optional, Union
+
+TODO_BULK_MAX_OPERATIONS = int(os.getenv('TODO_BULK_MAX_OPERATIONS', 1000))
 
 
 class TodoItemCreate(BaseModel):
@@ -15,6 +19,20 @@ class TodoItemUpdate(BaseModel):
     completed: Optional[bool] = None
 
 
+class TodoItemPatch(BaseModel):
+    # В отличие от TodoItemUpdate, меняются все переданные поля: description можно сбросить в null
+    title: Optional[str] = Field(None, min_length=1, max_length=200)
+    description: Optional[str] = None
+    completed: Optional[bool] = None
+
+    @model_validator(mode='after')
+    def check_required_fields(self):
+        for name in ('title', 'completed'):
+            if name in self.model_fields_set and getattr(self, name) is None:
+                raise ValueError(f'{name} cannot be null')
+        return self
+
+
 class TodoItemResponse(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
@@ -24,4 +42,55 @@ class TodoItemResponse(BaseModel):
     completed: bool
     created_at: datetime
     updated_at: datetime
+    version: int
+
+
+class TodoSearchResult(TodoItemResponse):
+    # Текст экранирован как HTML, найденные слова выделены <mark>...</mark>
+    title_highlight: str
+    description_snippet: Optional[str]
+    rank: float
+
+
+class BulkCreate(TodoItemCreate):
+    op: Literal['create']
+
+
+class BulkUpdate(TodoItemUpdate):
+    op: Literal['update']
+    id: int
+
+
+class BulkDelete(BaseModel):
+    op: Literal['delete']
+    id: int
+
+
+BulkOperation = Annotated[Union[BulkCreate, BulkUpdate, BulkDelete], Field(discriminator='op')]
+
+
+class BulkRequest(BaseModel):
+    operations: list[BulkOperation] = Field(..., min_length=1, max_length=TODO_BULK_MAX_OPERATIONS)
+    # atomic: при любой ошибке не применяется ничего; иначе применяются все успешные операции
+    atomic: bool = True
+
+    @model_validator(mode='after')
+    def check_unique_ids(self):
+        # Операции группируются по типу, поэтому порядок двух изменений одного элемента не определен
+        ids = [operation.id for operation in self.operations if not isinstance(operation, BulkCreate)]
+        if len(ids) != len(set(ids)):
+            raise ValueError('Each item can be updated or deleted only once per request')
+        return self
+
+
+class BulkResult(BaseModel):
+    op: Literal['create', 'update', 'delete']
+    id: Optional[int] = None
+    status: int
+    detail: Optional[str] = None
+    item: Optional[TodoItemResponse] = None
+
 
+class BulkResponse(BaseModel):
+    committed: bool
+    results: list[BulkResult]
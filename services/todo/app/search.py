@@ -0,0 +1,76 @@
+import html
+import os
+import re
+from typing import Optional
+
+from sqlalchemy import Select, column, func, literal_column, select, table, tuple_
+
+from app.models import SEARCH_TABLE, TodoItem
+from app.pagination import pack_cursor, unpack_cursor
+from app.schemas import TodoItemResponse
+
+TODO_SEARCH_PAGE_SIZE = int(os.getenv('TODO_SEARCH_PAGE_SIZE', 20))
+# Вес совпадения в заголовке относительно описания для bm25
+TODO_SEARCH_TITLE_WEIGHT = float(os.getenv('TODO_SEARCH_TITLE_WEIGHT', 10.0))
+
+# FTS5 отмечает совпадения управляющими символами, а не разметкой: текст задачи
+# экранируется до того, как они заменяются на <mark>
+MATCH_START = '\x02'
+MATCH_END = '\x03'
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+SNIPPET_TOKENS = 16
+TERM_PATTERN = re.compile(r'\w+')
+
+search_table = table(SEARCH_TABLE, column('rowid'))
+
+
+def match_expression(q: str) -> Optional[str]:
+    # Ввод пользователя не попадает в синтаксис запросов FTS5: каждое слово берется
+    # как фраза в кавычках, все слова обязательны. None - в запросе нет ни одного слова
+    terms = TERM_PATTERN.findall(q)
+    if not terms:
+        return None
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def mark_matches(text: Optional[str]) -> Optional[str]:
+    if text is None:
+        return None
+    return html.escape(text).replace(MATCH_START, HIGHLIGHT_START).replace(MATCH_END, HIGHLIGHT_END)
+
+
+def search_result(row) -> tuple:
+    *fields, title_highlight, description_snippet, rank = row
+    return (*fields, mark_matches(title_highlight), mark_matches(description_snippet), rank)
+
+
+def encode_search_cursor(row) -> str:
+    return pack_cursor([row.rank, row.id])
+
+
+def search_query(expression: str, limit: int, cursor: Optional[str] = None) -> Select:
+    # Результаты упорядочены по bm25 (меньше - лучше), при равенстве - по id; страницы - keyset
+    # по той же паре. Берется limit + 1 строка, чтобы узнать, есть ли следующая страница
+    fts = literal_column(SEARCH_TABLE)
+    rank = func.bm25(fts, TODO_SEARCH_TITLE_WEIGHT, 1.0)
+    query = (
+        select(
+            *(getattr(TodoItem, name) for name in TodoItemResponse.model_fields),
+            func.highlight(fts, 0, MATCH_START, MATCH_END).label('title_highlight'),
+            func.snippet(fts, 1, MATCH_START, MATCH_END, '…', SNIPPET_TOKENS).label('description_snippet'),
+            rank.label('rank'),
+        )
+        .select_from(search_table)
+        .join(TodoItem, TodoItem.id == search_table.c.rowid)
+        .where(fts.match(expression))
+    )
+    if cursor is not None:
+        try:
+            cursor_rank, item_id = unpack_cursor(cursor)
+            if type(item_id) is not int or type(cursor_rank) not in (int, float):
+                raise ValueError(cursor)
+        except (TypeError, ValueError):
+            raise ValueError('Invalid cursor') from None
+        query = query.where(tuple_(rank, TodoItem.id) > (cursor_rank, item_id))
+    return query.order_by(rank, TodoItem.id).limit(limit + 1)
@@ -1,8 +1,63 @@
+import os
+
+import click
 import uvicorn
+from dotenv import load_dotenv
+
+import startup
+
+# .env загружается до импорта приложения: модули app читают настройки при импорте
+load_dotenv()
+
+DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:////app/data/todo.db')
+
+
+def __getattr__(name):
+    # main:app создается при первом обращении uvicorn, а не при импорте main:
+    # супервизору воркеров и --startup-profile приложение не нужно
+    if name == 'app':
+        from app import create_app
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
-from app import create_app
+@click.command()
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', default=8000, show_default=True)
+@click.option('--workers', envvar='WEB_CONCURRENCY', default=startup.default_workers(), show_default=True,
+              help='Worker processes, each with its own event loop and database pools.')
+@click.option('--reload', envvar='UVICORN_RELOAD', is_flag=True, help='Restart on code changes (single worker).')
+@click.option('--keep-alive', envvar='KEEP_ALIVE_TIMEOUT', default=15, show_default=True,
+              help='Seconds to keep idle HTTP connections open.')
+@click.option('--backlog', envvar='UVICORN_BACKLOG', default=2048, show_default=True,
+              help='Maximum number of pending connections.')
+@click.option('--access-log/--no-access-log', envvar='UVICORN_ACCESS_LOG', default=False, show_default=True)
+@click.option('--log-level', default='info', show_default=True)
+@click.option('--migrate', envvar='MIGRATE_ON_START', is_flag=True,
+              help='Apply Alembic migrations before start if the database is behind head.')
+@click.option('--startup-profile', is_flag=True, help='Print an import-time breakdown and exit.')
+def main(host, port, workers, reload, keep_alive, backlog, access_log, log_level, migrate, startup_profile):
+    if startup_profile:
+        click.echo(startup.startup_profile(DATABASE_URL))
+        return
+    if migrate and not startup.migrate(DATABASE_URL):
+        click.echo('Database is at head revision, skipping migrations')
+    # loop/http 'auto' выбирают uvloop и httptools, если они установлены
+    uvicorn.run(
+        'main:app',
+        host=host,
+        port=port,
+        workers=1 if reload else workers,
+        reload=reload,
+        loop='auto',
+        http='auto',
+        timeout_keep_alive=keep_alive,
+        backlog=backlog,
+        access_log=access_log,
+        log_level=log_level,
+    )
 
-app = create_app()
 
 if __name__ == '__main__':
-    uvicorn.run('main:app', host='0.0.0.0', port=8000, reload=True)
+    main()
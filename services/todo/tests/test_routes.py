@@ -1,9 +1,19 @@
+import asyncio
+import os
+import orjson
 import pytest
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from fastapi.testclient import TestClient
-from app import create_app, get_db
-from app.models import TodoItem
+from sqlalchemy import create_engine, delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+from app import create_app, get_db, get_read_db
+from app.metrics import registry
+from app.models import AbstractModel, CollectionVersion, TodoItem
+from app.pagination import encode_cursor, page_query
+from app.schemas import TodoItemResponse
 
 
 @pytest.fixture
@@ -25,19 +35,38 @@ def mock_todo_item():
         description='Test Description',
         completed=False,
         created_at=datetime.now(timezone.utc),
-        updated_at=datetime.now(timezone.utc)
+        updated_at=datetime.now(timezone.utc),
+        version=1,
     )
     return item
 
 
+def returned_row(item, **changes):
+    # Строка, которую вернул бы UPDATE ... RETURNING
+    values = {name: getattr(item, name) for name in TodoItemResponse.model_fields}
+    values.update(changes)
+    return TodoItem(**values)
+
+
+def executed_params(session) -> dict:
+    return session.execute.await_args.args[0].compile().params
+
+
 @pytest.fixture
 def mock_db_session():
-    return MagicMock()
+    session = MagicMock(spec=AsyncSession)
+    session.scalars.return_value = MagicMock()  # ScalarResult синхронный
+    session.execute.return_value = MagicMock()
+    session.execute.return_value.first.return_value = SimpleNamespace(
+        version=7, updated_at=datetime(2026, 1, 2, 3, 4, 5, 678000),
+    )
+    return session
 
 
 def test_get_items_empty(client, mock_db_session):
-    mock_db_session.query.return_value.all.return_value = []
+    mock_db_session.scalars.return_value.all.return_value = []
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/api/todo')
         assert response.status_code == 200
@@ -47,8 +76,9 @@ def test_get_items_empty(client, mock_db_session):
 
 
 def test_get_items(client, mock_todo_item, mock_db_session):
-    mock_db_session.query.return_value.all.return_value = [mock_todo_item]
+    mock_db_session.scalars.return_value.all.return_value = [mock_todo_item]
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/api/todo')
         assert response.status_code == 200
@@ -64,6 +94,7 @@ def test_get_items(client, mock_todo_item, mock_db_session):
 def test_get_item(client, mock_todo_item, mock_db_session):
     mock_db_session.get.return_value = mock_todo_item
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/api/todo/1')
         assert response.status_code == 200
@@ -78,6 +109,7 @@ def test_get_item(client, mock_todo_item, mock_db_session):
 def test_get_item_not_found(client, mock_db_session):
     mock_db_session.get.return_value = None
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.get('/api/todo/999')
         assert response.status_code == 404
@@ -105,6 +137,7 @@ def test_create_item(client, mock_db_session):
     with patch('app.routes.TodoItem') as mock_item_class:
         mock_item_class.return_value = mock_item
         client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
         try:
             response = client.post('/api/todo', json=data)
             assert response.status_code == 201
@@ -113,7 +146,7 @@ def test_create_item(client, mock_db_session):
             assert response.json()['completed'] is False
             assert 'id' in response.json()
             mock_db_session.add.assert_called_once()
-            mock_db_session.commit.assert_called_once()
+            mock_db_session.commit.assert_awaited_once()
         finally:
             client.app.dependency_overrides.clear()
 
@@ -134,6 +167,7 @@ def test_create_item_minimal(client, mock_db_session):
     with patch('app.routes.TodoItem') as mock_item_class:
         mock_item_class.return_value = mock_item
         client.app.dependency_overrides[get_db] = lambda: mock_db_session
+        client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
         try:
             response = client.post('/api/todo', json=data)
             assert response.status_code == 201
@@ -169,15 +203,23 @@ def test_update_item(client, mock_todo_item, mock_db_session):
         'description': 'Updated Description',
         'completed': True
     }
-    mock_db_session.get.return_value = mock_todo_item
+    mock_db_session.execute.return_value.first.return_value = returned_row(mock_todo_item, version=2, **data)
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.put('/api/todo/1', json=data)
         assert response.status_code == 200
         assert response.json()['title'] == 'Updated Task'
         assert response.json()['description'] == 'Updated Description'
         assert response.json()['completed'] is True
-        mock_db_session.commit.assert_called_once()
+        assert response.headers['etag'] == '"1-2"'
+        # Один UPDATE ... RETURNING вместо get, commit и refresh
+        assert mock_db_session.execute.await_count == 1
+        mock_db_session.get.assert_not_awaited()
+        mock_db_session.refresh.assert_not_awaited()
+        params = executed_params(mock_db_session)
+        assert {key: params[key] for key in data} == data
+        mock_db_session.commit.assert_awaited_once()
     finally:
         client.app.dependency_overrides.clear()
 
@@ -186,15 +228,19 @@ def test_update_item_partial_title(client, mock_todo_item, mock_db_session):
     data = {
         'title': 'Updated Title Only'
     }
-    mock_db_session.get.return_value = mock_todo_item
+    mock_db_session.execute.return_value.first.return_value = returned_row(mock_todo_item, **data)
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.put('/api/todo/1', json=data)
         assert response.status_code == 200
         assert response.json()['title'] == 'Updated Title Only'
         assert response.json()['description'] == 'Test Description'  # Остается прежним
         assert response.json()['completed'] is False  # Остается прежним
-        mock_db_session.commit.assert_called_once()
+        params = executed_params(mock_db_session)
+        assert params['title'] == 'Updated Title Only'
+        assert 'description' not in params and 'completed' not in params
+        mock_db_session.commit.assert_awaited_once()
     finally:
         client.app.dependency_overrides.clear()
 
@@ -203,14 +249,18 @@ def test_update_item_partial_completed(client, mock_todo_item, mock_db_session):
     data = {
         'completed': True
     }
-    mock_db_session.get.return_value = mock_todo_item
+    mock_db_session.execute.return_value.first.return_value = returned_row(mock_todo_item, **data)
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.put('/api/todo/1', json=data)
         assert response.status_code == 200
         assert response.json()['title'] == 'Test Task'  # Остается прежним
         assert response.json()['completed'] is True
-        mock_db_session.commit.assert_called_once()
+        params = executed_params(mock_db_session)
+        assert params['completed'] is True
+        assert 'title' not in params
+        mock_db_session.commit.assert_awaited_once()
     finally:
         client.app.dependency_overrides.clear()
 
@@ -220,12 +270,14 @@ def test_update_item_not_found(client, mock_db_session):
         'title': 'Updated Task',
         'completed': True
     }
-    mock_db_session.get.return_value = None
+    mock_db_session.execute.return_value.first.return_value = None
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.put('/api/todo/999', json=data)
         assert response.status_code == 404
         assert 'detail' in response.json()
+        mock_db_session.commit.assert_not_awaited()
     finally:
         client.app.dependency_overrides.clear()
 
@@ -237,6 +289,7 @@ def test_update_item_validation_error(client, mock_todo_item, mock_db_session):
     }
     mock_db_session.get.return_value = mock_todo_item
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.put('/api/todo/1', json=data)
         assert response.status_code == 422  # FastAPI returns 422 for validation errors
@@ -245,22 +298,27 @@ def test_update_item_validation_error(client, mock_todo_item, mock_db_session):
         client.app.dependency_overrides.clear()
 
 
-def test_delete_item(client, mock_todo_item, mock_db_session):
-    mock_db_session.get.return_value = mock_todo_item
+def test_delete_item(client, mock_db_session):
+    mock_db_session.scalar.return_value = 1
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.delete('/api/todo/1')
         assert response.status_code == 200
         assert response.json()['message'] == 'Item deleted successfully'
-        mock_db_session.delete.assert_called_once_with(mock_todo_item)
-        mock_db_session.commit.assert_called_once()
+        # DELETE ... RETURNING id без предварительной загрузки строки
+        statement = mock_db_session.scalar.await_args.args[0]
+        assert str(statement).startswith('DELETE FROM todo_items')
+        mock_db_session.get.assert_not_awaited()
+        mock_db_session.commit.assert_awaited_once()
     finally:
         client.app.dependency_overrides.clear()
 
 
 def test_delete_item_not_found(client, mock_db_session):
-    mock_db_session.get.return_value = None
+    mock_db_session.scalar.return_value = None
     client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
     try:
         response = client.delete('/api/todo/999')
         assert response.status_code == 404
@@ -268,3 +326,391 @@ def test_delete_item_not_found(client, mock_db_session):
     finally:
         client.app.dependency_overrides.clear()
 
+
+
+def test_metrics(client, mock_todo_item, mock_db_session):
+    registry.clear()
+    mock_db_session.get.return_value = mock_todo_item
+    client.app.dependency_overrides[get_db] = lambda: mock_db_session
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        client.get('/api/todo/1')
+        client.get('/api/todo/1')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        labels = f'pid="{os.getpid()}",method="GET"'
+        assert f'http_requests_total{{{labels},route="/api/todo/{{item_id}}",status="200"}} 2' in response.text
+        assert f'http_request_duration_seconds_count{{{labels},route="/api/todo/{{item_id}}"}} 2' in response.text
+        assert f'http_requests_in_flight{{{labels}}} 1' in response.text
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_fast_responses_match_validated(client, mock_todo_item, mock_db_session):
+    mock_todo_item.created_at = datetime(2026, 1, 2, 3, 4, 5)
+    mock_db_session.scalars.return_value.all.return_value = [mock_todo_item]
+    mock_db_session.get.return_value = mock_todo_item
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        fast = [client.get('/api/todo'), client.get('/api/todo/1')]
+        with patch('app.routes.todo_item_serializer.enabled', False):
+            validated = [client.get('/api/todo'), client.get('/api/todo/1')]
+        for fast_response, validated_response in zip(fast, validated):
+            assert fast_response.content == validated_response.content
+        assert fast[0].json()[0]['created_at'] == '2026-01-02T03:04:05'
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_get_items_conditional(client, mock_todo_item, mock_db_session):
+    mock_db_session.scalars.return_value.all.return_value = [mock_todo_item]
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response = client.get('/api/todo')
+        etag = response.headers['etag']
+        assert etag.startswith('"items-7-')
+        assert response.headers['last-modified'] == 'Fri, 02 Jan 2026 03:04:05 GMT'
+        assert response.headers['cache-control'] == 'no-cache'
+        assert response.headers['vary'] == 'Accept'
+
+        response = client.get('/api/todo', headers={'If-None-Match': f'W/{etag}'})
+        assert response.status_code == 304
+        assert response.content == b''
+        assert response.headers['etag'] == etag
+        assert response.headers['vary'] == 'Accept'
+        assert mock_db_session.scalars.await_count == 1  # строки не загружались
+
+        assert client.get('/api/todo', headers={'If-None-Match': '"items-6"'}).status_code == 200
+        response = client.get('/api/todo', headers={'If-Modified-Since': 'Fri, 02 Jan 2026 03:04:05 GMT'})
+        assert response.status_code == 304
+
+        # У каждой страницы, фильтра и формата свой ETag; одинаковые параметры - тот же ETag.
+        # If-None-Match: * дает 304 с ETag варианта, не читая строки
+        urls = [
+            '/api/todo?limit=2',
+            '/api/todo?completed=true',
+            '/api/todo?sort=-created_at',
+            '/api/todo?updated_after=2026-01-01T03:00:00%2B03:00',
+            '/api/todo?stream=1',
+        ]
+        variants = [client.get(url, headers={'If-None-Match': '*'}) for url in urls]
+        variants.append(client.get('/api/todo', headers={'If-None-Match': '*', 'Accept': 'application/x-ndjson'}))
+        etags = {etag} | {variant.headers['etag'] for variant in variants}
+        assert len(etags) == len(variants) + 1
+        same = client.get('/api/todo?updated_after=2026-01-01T00:00:00Z', headers={'If-None-Match': '*'})
+        assert same.headers['etag'] == variants[3].headers['etag']
+        response = client.get('/api/todo?limit=2', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_get_item_conditional(client, mock_todo_item, mock_db_session):
+    mock_db_session.get.return_value = mock_todo_item
+    mock_db_session.execute.return_value.first.return_value = SimpleNamespace(
+        version=1, updated_at=mock_todo_item.updated_at,
+    )
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        etag = client.get('/api/todo/1').headers['etag']
+        assert etag == '"1-1"'
+        response = client.get('/api/todo/1', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert mock_db_session.get.await_count == 1  # только первый, безусловный запрос
+
+        mock_db_session.execute.return_value.first.return_value = None
+        assert client.get('/api/todo/2', headers={'If-None-Match': etag}).status_code == 404
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_collection_version_triggers():
+    async def run():
+        engine = create_async_engine('sqlite+aiosqlite://')
+        versions = []
+        async with engine.begin() as conn:
+            await conn.run_sync(AbstractModel.metadata.create_all)
+            for statement in (
+                insert(TodoItem).values(title='Task'),
+                update(TodoItem).values(completed=True),
+                delete(TodoItem),
+            ):
+                await conn.execute(statement)
+                versions.append(await conn.scalar(select(CollectionVersion.version)))
+        await engine.dispose()
+        return versions
+
+    assert asyncio.run(run()) == [1, 2, 3]
+
+
+def test_admission_control_sheds_overload(app, client, mock_db_session):
+    write = app.state.admission_limiters['write']
+    write.in_flight = int(write.limit)
+    write.max_queue = 0
+    mock_db_session.scalars.return_value.all.return_value = []
+    client.app.dependency_overrides[get_read_db] = lambda: mock_db_session
+    try:
+        response = client.post('/api/todo', json={'title': 'Task'})
+        assert response.status_code == 503
+        assert response.headers['retry-after'] == '1'
+        assert client.get('/api/todo').status_code == 200
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    # Настоящая БД для проверки запросов; NullPool - соединения не переживают event loop запроса
+    url = f'sqlite:///{tmp_path / "todo.db"}'
+    sync_engine = create_engine(url)
+    AbstractModel.metadata.create_all(sync_engine)
+    engine = create_async_engine(url.replace('sqlite://', 'sqlite+aiosqlite://'), poolclass=NullPool)
+
+    async def get_test_db():
+        async with AsyncSession(engine, expire_on_commit=False) as session:
+            yield session
+
+    yield sync_engine, get_test_db
+    sync_engine.dispose()
+
+
+def test_get_items_keyset_pagination(client, sqlite_db):
+    sync_engine, get_test_db = sqlite_db
+    start = datetime(2026, 1, 1)
+    with sync_engine.begin() as conn:
+        # Одинаковые created_at у соседних элементов: порядок внутри них задает id
+        conn.execute(insert(TodoItem), [
+            {
+                'title': f'Task {i}',
+                'completed': i % 3 == 0,
+                'created_at': start + timedelta(minutes=i // 2),
+                'updated_at': start + timedelta(hours=i),
+            }
+            for i in range(1, 26)
+        ])
+    client.app.dependency_overrides[get_read_db] = get_test_db
+    try:
+        def collect(url):
+            ids = []
+            while url:
+                response = client.get(url)
+                assert response.status_code == 200
+                ids += [item['id'] for item in response.json()]
+                url = response.links.get('next', {}).get('url')
+            return ids
+
+        assert collect('/api/todo?limit=4') == list(range(1, 26))
+        assert collect('/api/todo?limit=4&sort=-created_at') == list(range(25, 0, -1))
+        assert collect('/api/todo?limit=7&sort=-updated_at&completed=true') == list(range(24, 0, -3))
+        assert collect(
+            '/api/todo?limit=2&sort=updated_at&updated_after=2026-01-01T05:00:00Z&updated_before=2026-01-01T10:00:00'
+        ) == [5, 6, 7, 8, 9]
+
+        response = client.get('/api/todo?limit=25')
+        assert len(response.json()) == 25
+        assert 'link' not in response.headers
+
+        cursor = client.get('/api/todo?limit=2').links['next']['url'].split('cursor=')[1]
+        assert client.get(f'/api/todo?sort=updated_at&cursor={cursor}').status_code == 400
+        assert client.get('/api/todo?cursor=garbage').status_code == 400
+        assert client.get('/api/todo?sort=title').status_code == 422
+        assert client.get('/api/todo?limit=0').status_code == 422
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_get_items_page_uses_index(sqlite_db):
+    sync_engine, _ = sqlite_db
+    queries = [
+        page_query('created_at', 100),
+        page_query('-updated_at', 100, completed=False),
+        page_query('created_at', 100, cursor=encode_cursor('created_at', TodoItem(id=5, created_at=datetime(2026, 1, 1)))),
+        page_query('updated_at', 100, updated_after=datetime(2026, 1, 1)),
+    ]
+    with sync_engine.connect() as conn:
+        for query in queries:
+            compiled = query.compile(sync_engine, compile_kwargs={'literal_binds': True})
+            plan = ' '.join(row[-1] for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}'))
+            # Строки читаются из индекса в нужном порядке, без сортировки всей таблицы
+            assert 'USING INDEX ix_todo_items_' in plan
+            assert 'TEMP B-TREE' not in plan
+
+
+def test_get_items_stream(client, sqlite_db):
+    sync_engine, get_test_db = sqlite_db
+    with sync_engine.begin() as conn:
+        conn.execute(insert(TodoItem), [
+            {'title': f'Task {i}', 'completed': i % 2 == 0, 'created_at': datetime(2026, 1, 1, 0, i)}
+            for i in range(1, 11)
+        ])
+    client.app.dependency_overrides[get_read_db] = get_test_db
+    try:
+        paged = client.get('/api/todo?limit=100&completed=false')
+        with patch('app.routes.TODO_STREAM_CHUNK_SIZE', 3):
+            streamed = client.get('/api/todo?stream=1&limit=1&completed=false')
+            ndjson = client.get('/api/todo?sort=-created_at', headers={'Accept': 'application/x-ndjson'})
+            empty = client.get('/api/todo?stream=true&updated_before=2000-01-01T00:00:00')
+
+        # Тот же JSON, что у постраничного ответа; limit в потоковом режиме не действует
+        assert streamed.headers['content-type'] == 'application/json'
+        assert streamed.content == paged.content
+        assert streamed.headers['etag'] != paged.headers['etag']
+        assert ndjson.headers['vary'] == 'Accept'
+        assert 'link' not in streamed.headers
+
+        assert ndjson.headers['content-type'] == 'application/x-ndjson'
+        lines = ndjson.content.splitlines()
+        assert [orjson.loads(line)['id'] for line in lines] == list(range(10, 0, -1))
+        assert ndjson.content.endswith(b'\n')
+
+        assert empty.json() == []
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_bulk_items(client, sqlite_db):
+    sync_engine, get_test_db = sqlite_db
+    with sync_engine.begin() as conn:
+        conn.execute(insert(TodoItem), [{'title': f'Task {i}'} for i in range(1, 6)])
+    client.app.dependency_overrides[get_db] = get_test_db
+    client.app.dependency_overrides[get_read_db] = get_test_db
+    try:
+        response = client.post('/api/todo/bulk', json={'operations': [
+            {'op': 'create', 'title': 'New'},
+            {'op': 'update', 'id': 1, 'completed': True},
+            {'op': 'delete', 'id': 3},
+            {'op': 'update', 'id': 2, 'completed': True},
+            {'op': 'create', 'title': 'Other', 'description': 'Text', 'completed': True},
+            {'op': 'update', 'id': 4, 'title': 'Renamed'},
+            {'op': 'update', 'id': 5},
+        ]})
+        assert response.status_code == 200
+        body = response.json()
+        assert body['committed'] is True
+        assert [(result['op'], result['id'], result['status']) for result in body['results']] == [
+            ('create', 6, 201), ('update', 1, 200), ('delete', 3, 200), ('update', 2, 200),
+            ('create', 7, 201), ('update', 4, 200), ('update', 5, 200),
+        ]
+        assert body['results'][4]['item']['description'] == 'Text'
+        assert body['results'][5]['item']['title'] == 'Renamed'
+        assert body['results'][2]['item'] is None
+        with sync_engine.connect() as conn:
+            assert conn.execute(select(TodoItem.id).where(TodoItem.completed).order_by(TodoItem.id)).scalars().all() == [1, 2, 7]
+            assert conn.scalar(select(func.count()).select_from(TodoItem)) == 6
+
+        operations = [{'op': 'create', 'title': 'Lost'}, {'op': 'delete', 'id': 1}, {'op': 'update', 'id': 3, 'title': 'X'}]
+        with patch('app.routes.bulk_serializer.enabled', False):
+            response = client.post('/api/todo/bulk', json={'operations': operations})
+        assert response.status_code == 409
+        body = response.json()
+        assert body['committed'] is False
+        assert [(result['id'], result['status']) for result in body['results']] == [(None, 424), (1, 424), (3, 404)]
+        with sync_engine.connect() as conn:
+            assert conn.scalar(select(func.count()).select_from(TodoItem)) == 6
+
+        response = client.post('/api/todo/bulk', json={'operations': operations, 'atomic': False})
+        assert response.status_code == 200
+        assert [result['status'] for result in response.json()['results']] == [201, 200, 404]
+        with sync_engine.connect() as conn:
+            assert conn.execute(select(TodoItem.title).where(TodoItem.id == 1)).first() is None
+            assert conn.scalar(select(TodoItem.title).where(TodoItem.id == 8)) == 'Lost'
+
+        duplicate = [{'op': 'update', 'id': 2, 'completed': False}, {'op': 'delete', 'id': 2}]
+        assert client.post('/api/todo/bulk', json={'operations': duplicate}).status_code == 422
+        assert client.post('/api/todo/bulk', json={'operations': []}).status_code == 422
+        assert client.post('/api/todo/bulk', json={'operations': [{'op': 'create', 'title': ''}]}).status_code == 422
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_optimistic_concurrency(client, sqlite_db):
+    sync_engine, get_test_db = sqlite_db
+    with sync_engine.begin() as conn:
+        conn.execute(insert(TodoItem), [
+            {'title': 'Task', 'description': 'Text', 'updated_at': datetime(2026, 1, 1)},
+            {'title': 'Other', 'description': None, 'updated_at': datetime(2026, 1, 1)},
+        ])
+    client.app.dependency_overrides[get_db] = get_test_db
+    client.app.dependency_overrides[get_read_db] = get_test_db
+    try:
+        etag = client.get('/api/todo/1').headers['etag']
+        assert etag == '"1-1"'
+
+        response = client.patch('/api/todo/1', json={'description': None}, headers={'If-Match': etag})
+        assert response.status_code == 200
+        assert response.json()['description'] is None
+        assert response.json()['version'] == 2
+        assert response.json()['updated_at'] > '2026-01-01T00:00:00'
+        assert response.headers['etag'] == '"1-2"'
+
+        # Устаревшая версия: изменение не применяется
+        response = client.put('/api/todo/1', json={'title': 'Lost update'}, headers={'If-Match': etag})
+        assert response.status_code == 412
+        assert client.delete('/api/todo/1', headers={'If-Match': f'W/{etag}'}).status_code == 412
+        assert client.get('/api/todo/1').json()['title'] == 'Task'
+
+        assert client.put('/api/todo/1', json={'title': 'Renamed'}, headers={'If-Match': '"1-1", "1-2"'}).status_code == 200
+        assert client.patch('/api/todo/1', json={'completed': True}, headers={'If-Match': '*'}).json()['version'] == 4
+        assert client.patch('/api/todo/3', json={'completed': True}, headers={'If-Match': '"3-1"'}).status_code == 404
+        assert client.patch('/api/todo/1', json={'title': None}).status_code == 422
+
+        response = client.post('/api/todo/bulk', json={'operations': [{'op': 'update', 'id': 2, 'completed': True}]})
+        assert response.json()['results'][0]['item']['version'] == 2
+
+        assert client.delete('/api/todo/1', headers={'If-Match': '"1-4"'}).status_code == 200
+        assert client.delete('/api/todo/1').status_code == 404
+    finally:
+        client.app.dependency_overrides.clear()
+
+
+def test_search_items(client, sqlite_db):
+    sync_engine, get_test_db = sqlite_db
+    with sync_engine.begin() as conn:
+        conn.execute(insert(TodoItem), [
+            {'title': 'Позвонить маме', 'description': 'Спросить про молоко и хлеб'},
+            {'title': 'Купить молоко', 'description': 'В магазине у дома'},
+            {'title': 'Починить велосипед', 'description': None},
+            {'title': 'Молоко для кофе', 'description': 'Овсяное молоко'},
+        ])
+    client.app.dependency_overrides[get_db] = get_test_db
+    client.app.dependency_overrides[get_read_db] = get_test_db
+    try:
+        response = client.get('/api/todo/search', params={'q': 'МОЛОКО'})
+        assert response.status_code == 200
+        results = response.json()
+        # Совпадения в заголовке выше совпадений только в описании
+        assert [result['id'] for result in results] == [4, 2, 1]
+        assert results[1]['title_highlight'] == 'Купить <mark>молоко</mark>'
+        assert results[2]['description_snippet'] == 'Спросить про <mark>молоко</mark> и хлеб'
+        assert results[0]['rank'] < results[1]['rank'] < results[2]['rank']
+        assert results[1]['version'] == 1
+
+        ids, url = [], '/api/todo/search?q=молоко&limit=2'
+        while url:
+            page = client.get(url)
+            ids += [result['id'] for result in page.json()]
+            url = page.links.get('next', {}).get('url')
+        assert ids == [4, 2, 1]
+
+        # Индекс следует за изменениями через триггеры
+        client.patch('/api/todo/3', json={'description': 'и купить молоко'})
+        client.delete('/api/todo/4')
+        client.put('/api/todo/2', json={'title': 'Купить сыр'})
+        results = client.get('/api/todo/search', params={'q': 'молоко'}).json()
+        assert sorted(result['id'] for result in results) == [1, 3]
+        assert [result['id'] for result in client.get('/api/todo/search?q=купить сыр').json()] == [2]
+
+        # Синтаксис FTS5 из ввода не интерпретируется
+        assert client.get('/api/todo/search', params={'q': 'молоко" OR (хлеб'}).json() == []
+        assert client.get('/api/todo/search', params={'q': '***'}).json() == []
+        assert client.get('/api/todo/search').status_code == 422
+        assert client.get('/api/todo/search?q=молоко&cursor=garbage').status_code == 400
+
+        # Текст задачи экранируется, разметкой остаются только отметки совпадений
+        client.post('/api/todo', json={'title': '<b>Кефир</b>', 'description': '<script>x</script> & кефир'})
+        result = client.get('/api/todo/search', params={'q': 'кефир'}).json()[0]
+        assert result['title_highlight'] == '&lt;b&gt;<mark>Кефир</mark>&lt;/b&gt;'
+        assert result['description_snippet'] == '&lt;script&gt;x&lt;/script&gt; &amp; <mark>кефир</mark>'
+        assert result['title'] == '<b>Кефир</b>'
+    finally:
+        client.app.dependency_overrides.clear()